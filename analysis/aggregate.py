@@ -0,0 +1,252 @@
+import argparse
+import hashlib
+import logging
+import os
+from collections import namedtuple
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from scrape.util import DATA_DIR, LIST_SEPARATOR, POSTS_FILENAME
+
+LOGGER = logging.getLogger(__name__)
+
+AGGREGATES_FILENAME = "aggregates.npz"
+# Language of the entries without language
+OTHER = "Other"
+
+# Tables of the dashboard, and hash of the posts file they were built from
+Aggregates = namedtuple(
+    "Aggregates", ["version", "date_language", "counts_by_date", "entries"]
+)
+
+
+def data_version(path: Path) -> str:
+    """Hash of the content of the file :param path:."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def explode(data: pd.DataFrame, column: str, name: str) -> pd.DataFrame:
+    """One row of :param data: per element of the list :param column:,
+    renamed to :param name:."""
+    return (
+        data.assign(**{column: data[column].str.split(LIST_SEPARATOR)})
+        .explode(column)
+        .rename(columns={column: name})
+    )
+
+
+def aggregate(path: Path) -> Aggregates:
+    """Build the tables of the dashboard from the posts file :param path:,
+    as computed by the dashboard at startup before:
+
+    - entries: entries, one row per language and country, indexed by date,
+    - date_language: number of these rows per language (columns) per date,
+    - counts_by_date: number of these rows per country per date, with the
+      month of the date, and a count of 0 for each country and month.
+    """
+    cols = ["id", "title", "date", "languages", "countries"]
+    entries = pd.read_csv(
+        path, usecols=cols, dtype={c: "string" for c in cols}
+    ).fillna("")
+    entries["date"] = pd.to_datetime(entries["date"])
+    entries = explode(entries, "languages", "language")
+    entries = explode(entries, "countries", "country")
+
+    date_language = pd.pivot_table(
+        entries[["date", "language"]],
+        index=["date"],
+        columns=["language"],
+        aggfunc=len,
+    )
+    date_language.rename(columns={"": OTHER}, inplace=True)
+    date_language.index.rename("date", inplace=True)
+    date_language.fillna(0, inplace=True)
+
+    entries.index = entries["date"]
+
+    counts_by_date = (
+        entries[["date", "country"]]
+        .reset_index(drop=True)
+        .value_counts()
+        .reset_index()
+        .rename(columns={0: "count"})
+    )
+    counts_by_date["month"] = counts_by_date["date"].dt.strftime("%Y-%m")
+    counts_by_date = counts_by_date.drop(columns=["date"]).sort_values(
+        by="month"
+    )
+    months = (
+        pd.date_range(
+            counts_by_date["month"].min(),
+            counts_by_date["month"].max(),
+            freq=pd.offsets.MonthEnd(),
+        )
+        .strftime("%Y-%m")
+        .to_frame(index=False, name="month")
+    )
+    countries = pd.Series(
+        counts_by_date["country"].unique(), name="country"
+    ).to_frame()
+    fill_vals = pd.merge(months, countries, how="cross")
+    fill_vals["count"] = 0
+    counts_by_date = (
+        pd.concat([counts_by_date, fill_vals])
+        .drop_duplicates(keep="first")
+        .sort_values(by="month")
+    )
+
+    return Aggregates(
+        data_version(path), date_language, counts_by_date, entries
+    )
+
+
+def pack_strings(strings: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """Concatenation of the UTF-8 encoded :param strings:, and the offset of
+    the end of each string."""
+    encoded = [s.encode("utf-8") for s in strings]
+    ends = np.cumsum([len(b) for b in encoded], dtype=np.int64)
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8), ends
+
+
+def unpack_strings(data: np.ndarray, ends: np.ndarray) -> List[str]:
+    blob = data.tobytes()
+    starts = [0, *ends[:-1].tolist()]
+    return [blob[s:e].decode("utf-8") for s, e in zip(starts, ends.tolist())]
+
+
+def save(aggregates: Aggregates, path: Path):
+    """Write :param aggregates: to :param path: as NumPy arrays, replacing
+    the file atomically."""
+    date_language = aggregates.date_language
+    counts_by_date = aggregates.counts_by_date
+    month_codes, months = pd.factorize(counts_by_date["month"])
+    country_codes, countries = pd.factorize(counts_by_date["country"])
+    entries = aggregates.entries
+    # Titles of each entry once, entries have a row per language and country
+    entry_codes, ids = pd.factorize(entries["id"])
+    titles = entries["title"].groupby(entry_codes, sort=True).first()
+    entry_countries, countries_ = pd.factorize(entries["country"])
+    entry_languages, languages = pd.factorize(entries["language"])
+    ids, id_ends = pack_strings(list(ids))
+    titles, title_ends = pack_strings(titles.tolist())
+    arrays = dict(
+        version=np.array(aggregates.version),
+        dates=date_language.index.to_numpy().astype("datetime64[D]"),
+        languages=np.array(date_language.columns, dtype=str),
+        date_language=date_language.to_numpy(),
+        months=np.array(months, dtype=str),
+        countries=np.array(countries, dtype=str),
+        month_codes=month_codes.astype(np.int32),
+        country_codes=country_codes.astype(np.int32),
+        counts=counts_by_date["count"].to_numpy(np.int64),
+        entry_dates=entries["date"].to_numpy().astype("datetime64[D]"),
+        entry_codes=entry_codes.astype(np.int32),
+        ids=ids,
+        id_ends=id_ends,
+        titles=titles,
+        title_ends=title_ends,
+        entry_countries=entry_countries.astype(np.int32),
+        entry_country_names=np.array(countries_, dtype=str),
+        entry_languages=entry_languages.astype(np.int32),
+        entry_language_names=np.array(languages, dtype=str),
+    )
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as file:
+        np.savez_compressed(file, **arrays)
+    os.replace(tmp_path, path)
+
+
+def load(path: Path, version: Optional[str] = None) -> Aggregates:
+    """Read the aggregates saved at :param path: with :func:`save`.
+    Raise ValueError if they were not built from the data :param version:
+    (unless None)."""
+    with np.load(path, allow_pickle=False) as arrays:
+        if version is not None and str(arrays["version"]) != version:
+            raise ValueError(f"{path} was built from other data")
+        date_language = pd.DataFrame(
+            arrays["date_language"],
+            index=pd.DatetimeIndex(
+                arrays["dates"].astype("datetime64[ns]"), name="date"
+            ),
+            columns=pd.Index(arrays["languages"].tolist(), name="language"),
+        )
+        counts_by_date = pd.DataFrame(
+            {
+                "country": arrays["countries"][arrays["country_codes"]],
+                "count": arrays["counts"],
+                "month": arrays["months"][arrays["month_codes"]],
+            }
+        ).astype({"country": object, "month": object})
+        entry_dates = pd.DatetimeIndex(
+            arrays["entry_dates"].astype("datetime64[ns]"), name="date"
+        )
+        codes = arrays["entry_codes"]
+        ids = unpack_strings(arrays["ids"], arrays["id_ends"])
+        titles = unpack_strings(arrays["titles"], arrays["title_ends"])
+        entries = pd.DataFrame(
+            {
+                "date": entry_dates,
+                "id": pd.array(ids, dtype="string")[codes],
+                "title": pd.array(titles, dtype="string")[codes],
+                "country": arrays["entry_country_names"][
+                    arrays["entry_countries"]
+                ].tolist(),
+                "language": arrays["entry_language_names"][
+                    arrays["entry_languages"]
+                ].tolist(),
+            },
+            index=entry_dates,
+        )
+        return Aggregates(
+            str(arrays["version"]), date_language, counts_by_date, entries
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build the tables of the database dashboard (apps/database) from "
+        f"DIR/{POSTS_FILENAME} into DIR/{AGGREGATES_FILENAME}, loaded by the "
+        "dashboard at startup. Run after each scrape."
+    )
+    parser.add_argument(
+        "dir",
+        metavar="DIR",
+        help=f"directory of {POSTS_FILENAME} (default: {DATA_DIR})",
+        type=Path,
+        default=DATA_DIR,
+        nargs="?",
+    )
+    parser.add_argument(
+        "-f",
+        "--force",
+        help="rebuild the aggregates even if they are up to date",
+        action="store_true",
+        default=False,
+    )
+    args = parser.parse_args()
+    posts_path = args.dir / POSTS_FILENAME
+    aggregates_path = args.dir / AGGREGATES_FILENAME
+    if not posts_path.exists():
+        parser.error(f"{posts_path} does not exist")
+
+    if not args.force and aggregates_path.exists():
+        try:
+            load(aggregates_path, data_version(posts_path))
+        except (OSError, ValueError, KeyError):
+            pass
+        else:
+            print(f"{aggregates_path} is up to date")
+            parser.exit()
+    aggregates = aggregate(posts_path)
+    save(aggregates, aggregates_path)
+    print(
+        f"Aggregated {aggregates.entries['id'].nunique()} entries into "
+        f"{aggregates_path} ({aggregates_path.stat().st_size / 1e3:.0f} kB)"
+    )
@@ -1,3 +1,14 @@
+from .archive import *
+from .cache import *
+from .fetch import *
+from .journal import *
+from .links import *
+from .metrics import *
+from .parsers import *
 from .report import *
 from .scraping import *
+from .sitemap import *
+from .store import *
+from .throttle import *
 from .util import *
+from .writer import *
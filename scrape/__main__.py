@@ -1,25 +1,73 @@
 import argparse
 import logging
+import math
+from contextlib import nullcontext
 from pathlib import Path
 
 import requests
-from tqdm import tqdm
+from tqdm.asyncio import tqdm
 
+from scrape import columnar
+from scrape.archive import HtmlArchive
+from scrape.cache import LinkCache, ReportIndex
+from scrape.fetch import Fetcher
+from scrape.journal import Journal
+from scrape.links import LinkResolver
+from scrape.metrics import Metrics, MetricsWriter, memory_summary
+from scrape.parsers import DEFAULT_PARSER, PARSERS, get_parser
 from scrape.report import Report
 from scrape.scraping import (
+    Failed,
     all_rows,
     extract,
+    found_all,
+    from_archive,
     get_len_total_entries,
+    get_newest_date,
     get_scraped_ids,
+    in_shard,
+    known_rows,
+    read_entries,
+    seen_before,
+    shard_rows,
     write,
 )
-from scrape.util import DATA_DIR, LIST_SEPARATOR, check_non_negative
+from scrape.sitemap import queued_ids, sitemap_entries
+from scrape.store import Database
+from scrape.util import (
+    ARCHIVE_FILENAME,
+    CACHE_DIR,
+    DATA_DIR,
+    DATABASE_FILENAME,
+    DATABASE_JOURNAL_FILENAME,
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_CONCURRENCY,
+    DEFAULT_FLUSH_INTERVAL,
+    DEFAULT_PER_HOST,
+    DEFAULT_PREFETCH,
+    DEFAULT_RATE,
+    JOURNAL_FILENAME,
+    LINK_CACHE_FILENAME,
+    LIST_SEPARATOR,
+    METRICS_INTERVAL,
+    OUTPUT_FILENAMES,
+    REPORT_INDEX_FILENAME,
+    SITEMAP_URL,
+    check_fields,
+    check_non_negative,
+    check_non_negative_float,
+    check_positive,
+    check_shard,
+)
+from scrape.writer import finish_replace
 
 logger = logging.getLogger("scrape")  # use package root logger
 
 # Ensure lists of links can be encoded correctly
 assert Report.url_encode(LIST_SEPARATOR) != LIST_SEPARATOR
 
+DEFAULT_ARCHIVE = CACHE_DIR / ARCHIVE_FILENAME
+
 parser = argparse.ArgumentParser(
     description="Scrape entries listed in the euvsdisinfo.eu database. "
 )
@@ -36,11 +84,35 @@ parser.add_argument(
 parser.add_argument(
     "-f",
     "--fresh",
-    help="overwrite existing files",
+    help="overwrite existing files, once all entries are scraped; an interrupted run is resumed by running with --fresh again, and discarded by any other run",
+    action="store_true",
+    default=False,
+)
+
+parser.add_argument(
+    "-i",
+    "--incremental",
+    help="stop at the first listing page of entries already scraped, or older than the newest entry scraped",
+    action="store_true",
+    default=False,
+)
+
+parser.add_argument(
+    "--refresh-changed",
+    help="fetch the entries already scraped again, conditionally if possible, and only update those whose report content changed; the first refresh updates all entries scraped before content hashes were recorded",
     action="store_true",
     default=False,
 )
 
+parser.add_argument(
+    "--sitemap",
+    metavar="URL",
+    help=f"only scrape the entries that are new or modified since last scraped according to the sitemap at URL (default: {SITEMAP_URL}), updating the modified ones as with --refresh-changed",
+    nargs="?",
+    const=SITEMAP_URL,
+    default=None,
+)
+
 parser.add_argument(
     "-n",
     "--lines",
@@ -50,6 +122,166 @@ parser.add_argument(
     default=None,
 )
 
+parser.add_argument(
+    "-c",
+    "--concurrency",
+    metavar="N",
+    help=f"maximum number of requests in flight (default: {DEFAULT_CONCURRENCY})",
+    type=check_positive,
+    default=DEFAULT_CONCURRENCY,
+)
+
+parser.add_argument(
+    "-p",
+    "--prefetch",
+    metavar="N",
+    help=f"maximum number of listing pages fetched ahead (default: {DEFAULT_PREFETCH})",
+    type=check_positive,
+    default=DEFAULT_PREFETCH,
+)
+
+parser.add_argument(
+    "-w",
+    "--workers",
+    metavar="N",
+    help="number of processes parsing pages (default: number of CPUs)",
+    type=check_positive,
+    default=None,
+)
+
+parser.add_argument(
+    "--max-pending",
+    metavar="N",
+    help="maximum number of rows or reports waiting between two stages of the scraper (default: concurrency)",
+    type=check_positive,
+    default=None,
+)
+
+parser.add_argument(
+    "--rate",
+    metavar="R",
+    help=f"maximum number of requests per second to the same host, 0 for no limit (default: {DEFAULT_RATE:g})",
+    type=check_non_negative_float,
+    default=DEFAULT_RATE,
+)
+
+parser.add_argument(
+    "--per-host",
+    metavar="N",
+    help=f"maximum number of requests in flight to the same host when resolving links (default: {DEFAULT_PER_HOST})",
+    type=check_positive,
+    default=DEFAULT_PER_HOST,
+)
+
+parser.add_argument(
+    "--shard",
+    metavar="i/N",
+    help="only scrape the i-th of N disjoint shards of the entries, assigned by a hash of their id, each shard to its own DIR; combine the shards with python -m scrape.merge",
+    type=check_shard,
+    default=None,
+)
+
+parser.add_argument(
+    "--fields",
+    metavar="F,...",
+    help="only fill in these fields, leaving the others empty, and skip fetching the reports if all are in the listing (date, id, title, countries, outlets), or resolving links if no resolved link is requested; date and id are always filled in, and entries count as scraped, so use a separate DIR",
+    type=check_fields,
+    default=None,
+)
+
+parser.add_argument(
+    "--parser",
+    help="HTML parser backend (default: %(default)s)",
+    choices=list(PARSERS),
+    default=DEFAULT_PARSER,
+)
+
+group = parser.add_argument_group("output arguments")
+
+group.add_argument(
+    "--parquet",
+    help="also convert the output files to Parquet, with list and date columns (requires pyarrow)",
+    action="store_true",
+    default=False,
+)
+
+group.add_argument(
+    "--batch-size",
+    metavar="N",
+    help=f"number of entries written to the output files at once (default: {DEFAULT_BATCH_SIZE})",
+    type=check_positive,
+    default=DEFAULT_BATCH_SIZE,
+)
+
+group.add_argument(
+    "--flush-interval",
+    metavar="S",
+    help=f"maximum number of seconds between two writes to the output files (default: {DEFAULT_FLUSH_INTERVAL:g})",
+    type=check_non_negative_float,
+    default=DEFAULT_FLUSH_INTERVAL,
+)
+
+group.add_argument(
+    "--sqlite",
+    help=f"upsert entries into the SQLite database DIR/{DATABASE_FILENAME} instead of writing the CSV files",
+    action="store_true",
+    default=False,
+)
+
+group.add_argument(
+    "--export-csv",
+    help=f"regenerate the CSV files in DIR from the SQLite database DIR/{DATABASE_FILENAME}, without network access",
+    action="store_true",
+    default=False,
+)
+
+group = parser.add_argument_group("link cache arguments")
+
+group.add_argument(
+    "--link-cache",
+    metavar="FILE",
+    help="cache of resolved links, shared across runs (default: %(default)s)",
+    type=lambda p: Path(p).absolute(),
+    default=CACHE_DIR / LINK_CACHE_FILENAME,
+)
+
+group.add_argument(
+    "--no-link-cache",
+    dest="read_link_cache",
+    help="resolve all links again, only updating the cache",
+    action="store_false",
+    default=True,
+)
+
+group.add_argument(
+    "--prune-link-cache",
+    help="delete expired entries from the cache before scraping",
+    action="store_true",
+    default=False,
+)
+
+group = parser.add_argument_group("archive arguments")
+
+group.add_argument(
+    "--archive",
+    metavar="FILE",
+    help=f"store fetched pages in an archive (default: {DEFAULT_ARCHIVE})",
+    type=lambda p: Path(p).absolute(),
+    nargs="?",
+    const=DEFAULT_ARCHIVE,
+    default=None,
+)
+
+group.add_argument(
+    "--from-archive",
+    metavar="FILE",
+    help=f"rebuild all files from an archive, without network access (default: {DEFAULT_ARCHIVE})",
+    type=lambda p: Path(p).absolute(),
+    nargs="?",
+    const=DEFAULT_ARCHIVE,
+    default=None,
+)
+
 group = parser.add_argument_group("verbosity arguments")
 
 group.add_argument(
@@ -61,6 +293,14 @@ group.add_argument(
     default=True,
 )
 
+group.add_argument(
+    "--metrics-out",
+    metavar="FILE",
+    help=f"write the metrics of each stage to FILE every {METRICS_INTERVAL:g} seconds and at exit, in the Prometheus text format if FILE ends with .prom or .txt, as JSON otherwise",
+    type=lambda p: Path(p).absolute(),
+    default=None,
+)
+
 group.add_argument(
     "-np",
     "--no-progress",
@@ -71,66 +311,361 @@ group.add_argument(
 )
 
 args = parser.parse_args()
+try:
+    html_parser = get_parser(args.parser)
+except ValueError as error:
+    parser.error(str(error))
 
 if not args.show_warnings:
     logger.setLevel(logging.ERROR)
 
+if args.parquet:
+    try:
+        columnar.check_available()
+    except ImportError as error:
+        parser.error(str(error))
+
+if args.sqlite:
+    if args.parquet:
+        parser.error("argument --parquet: not allowed with --sqlite")
+    if args.export_csv:
+        parser.error("argument --export-csv: not allowed with --sqlite")
+    database = args.dir / DATABASE_FILENAME
+    journal_path = args.dir / DATABASE_JOURNAL_FILENAME
+else:
+    database = None
+    journal_path = args.dir / JOURNAL_FILENAME
+
+if args.shard is not None:
+    if args.export_csv:
+        parser.error("argument --shard: not allowed with --export-csv")
+    if args.from_archive is not None:
+        parser.error("argument --shard: not allowed with --from-archive")
+
+# Whether entries already scraped are updated in place
+updating = args.refresh_changed or args.sitemap is not None
+if updating:
+    for flag, name in [
+        (args.fresh, "-f/--fresh"),
+        (args.incremental, "-i/--incremental"),
+        (args.lines is not None, "-n/--lines"),
+        (args.export_csv, "--export-csv"),
+        (args.from_archive is not None, "--from-archive"),
+    ]:
+        if flag:
+            other = (
+                "--refresh-changed" if args.refresh_changed else "--sitemap"
+            )
+            parser.error(f"argument {name}: not allowed with {other}")
+
+if args.fields is not None:
+    for flag, name in [
+        (updating, "--refresh-changed/--sitemap"),
+        (args.export_csv, "--export-csv"),
+        (args.from_archive is not None, "--from-archive"),
+    ]:
+        if flag:
+            parser.error(f"argument --fields: not allowed with {name}")
+
 if args.fresh:
     logger.info("Overwriting existing files")
+    if args.incremental:
+        parser.error("argument -i/--incremental: not allowed with -f/--fresh")
+
 
-ignore_ids = [] if args.fresh else get_scraped_ids(args.dir)
+def metrics_writer(metrics: Metrics):
+    if args.metrics_out is None:
+        return nullcontext()
+    return MetricsWriter(metrics, args.metrics_out)
 
-with requests.Session() as session:
-    len_all_entries = get_len_total_entries(session)
-    total_entries = len_all_entries if args.lines is None else args.lines
 
-    def progress(**kwargs):
-        chars_needed = str(len(str(total_entries)))
-        bar_format = (
-            "{l_bar}{bar}|{n_fmt:>"
-            + chars_needed
-            + "}/{total_fmt:>"
-            + chars_needed
-            + "} "
+def export():
+    if not (args.dir / DATABASE_FILENAME).exists():
+        parser.error(f"database {args.dir / DATABASE_FILENAME} does not exist")
+    finish_replace(args.dir, journal_path)
+    metrics = Metrics()
+    with Database(args.dir / DATABASE_FILENAME) as store, Journal(
+        journal_path, fresh=True
+    ) as journal, metrics_writer(metrics):
+        write(
+            out_dir=args.dir,
+            overwrite=True,
+            num_entries=args.lines,
+            gen=store.entries(),
+            journal=journal,
+            batch_size=args.batch_size,
+            flush_interval=args.flush_interval,
+            metrics=metrics,
         )
-        return lambda iterator: tqdm(
-            iterable=iterator,
-            disable=not args.show_progress,
-            bar_format=bar_format,
-            **kwargs,
+    if args.parquet:
+        columnar.convert(args.dir)
+    print(metrics.summary())
+
+
+def rebuild():
+    if not args.from_archive.exists():
+        parser.error(f"archive {args.from_archive} does not exist")
+    finish_replace(args.dir, journal_path)
+    metrics = Metrics()
+    with LinkCache(args.link_cache) as cache, Journal(
+        journal_path, fresh=True
+    ) as journal, metrics_writer(metrics):
+        write(
+            out_dir=args.dir,
+            overwrite=True,
+            num_entries=args.lines,
+            gen=from_archive(
+                args.from_archive, cache, args.workers, html_parser
+            ),
+            journal=journal,
+            batch_size=args.batch_size,
+            flush_interval=args.flush_interval,
+            database=database,
+            metrics=metrics,
         )
+        if args.parquet:
+            columnar.convert(args.dir)
+        print(cache.summary())
+        print(metrics.summary())
+    print(memory_summary())
+
+
+def replace_changed(
+    out_dir: Path,
+    changed: list,
+    new: list,
+    journal: Journal,
+    batch_size: int,
+    flush_interval: float,
+    metrics: Metrics,
+):
+    """Replace the entries of the CSV output files in :param out_dir: by
+    the :param changed: entries with the same id, keeping their order, and
+    append the :param new: entries, see :func:`write`. :param journal: is
+    rewritten along, keeping the failed entries."""
+    updated = {entry[0].id: entry for entry in changed}
+    entries = [updated.get(e[0].id, e) for e in read_entries(out_dir)]
+    journal.restart()
+    write(
+        out_dir=out_dir,
+        overwrite=True,
+        num_entries=None,
+        gen=iter(entries + new),
+        journal=journal,
+        batch_size=batch_size,
+        flush_interval=flush_interval,
+        metrics=metrics,
+    )
 
-    if args.fresh:
-        rows_total = total_entries
-        reports_initial = 0
-        reports_total = total_entries
+
+def update(extracted, journal: Journal, metrics: Metrics):
+    """Write the :param extracted: entries, updating the entries already
+    scraped in place."""
+    changed, new = [], []
+    for item in extracted:
+        if isinstance(item, Failed):
+            # Entries scraped before are kept as they are
+            if item.id not in journal.done:
+                new.append(item)
+        elif item[0].id in journal.done:
+            changed.append(item)
+        else:
+            new.append(item)
+    logger.info(f"Updating {len(changed)} changed entries")
+    if changed and database is None:
+        replace_changed(
+            args.dir,
+            changed,
+            new,
+            journal,
+            args.batch_size,
+            args.flush_interval,
+            metrics,
+        )
     else:
-        rows_total = len_all_entries
-        reports_initial = len(ignore_ids)
-        reports_total = (
-            len_all_entries
-            if args.lines is None
-            else len(ignore_ids) + args.lines
+        write(
+            out_dir=args.dir,
+            overwrite=False,
+            num_entries=None,
+            gen=iter(changed + new),
+            journal=journal,
+            batch_size=args.batch_size,
+            flush_interval=args.flush_interval,
+            database=database,
+            metrics=metrics,
         )
+    added = sum(not isinstance(item, Failed) for item in new)
+    print(f"Updated {len(changed)} changed entries, added {added} new entries")
+
 
-    extracted = extract(
+def run():
+    finish_replace(args.dir, journal_path, resume=args.fresh)
+    with ReportIndex(
+        args.dir / REPORT_INDEX_FILENAME,
+        # Versions of refreshed entries only count once their update is
+        # written
+        commit_every=None if updating else 100,
+    ) as index, Journal(
+        journal_path, fresh=args.fresh, resume=args.fresh
+    ) as journal, requests.Session() as session, (
+        nullcontext() if args.archive is None else HtmlArchive(args.archive)
+    ) as archive, LinkCache(
+        args.link_cache, read=args.read_link_cache
+    ) as cache, Fetcher(
+        # Closed first, finishing link resolutions that use the cache
         session,
-        all_rows(session),
-        ignore_ids=ignore_ids,
-        progress_rows=progress(
-            desc="Parsing rows    ", colour="yellow", total=rows_total
-        ),
-        progress_reports=progress(
-            desc="Scraping reports",
-            colour="green",
-            initial=reports_initial,
-            total=reports_total,
-        ),
-    )
+        args.concurrency,
+        archive,
+        args.workers,
+        args.rate,
+    ) as fetcher:
+        if not args.fresh and journal.sizes is None and database is not None:
+            # Database written without a journal, or not yet created
+            with Database(database) as store:
+                journal.adopt(store.ids(), [], store.newest())
+        elif not args.fresh and journal.sizes is None:
+            # Files written without a journal, read them once
+            journal.adopt(
+                get_scraped_ids(args.dir),
+                [args.dir / name for name in OUTPUT_FILENAMES],
+                get_newest_date(args.dir),
+            )
+        ignore_ids = journal.ignored_ids()
+        retried = sum(journal.is_due(id_) for id_ in journal.failed)
+        if retried > 0:
+            logger.info(f"Retrying {retried} failed entries")
 
-    write(
-        out_dir=args.dir,
-        overwrite=args.fresh,
-        num_entries=args.lines,
-        gen=extracted,
-    )
+        if args.prune_link_cache:
+            logger.info(f"Pruned {cache.prune()} expired links from cache")
+
+        len_all_entries = get_len_total_entries(session)
+        if args.shard is not None:
+            # Expected number of entries in the shard
+            len_all_entries = math.ceil(len_all_entries / args.shard[1])
+        total_entries = len_all_entries if args.lines is None else args.lines
+
+        def progress(**kwargs):
+            chars_needed = str(len(str(total_entries)))
+            bar_format = (
+                "{l_bar}{bar}|{n_fmt:>"
+                + chars_needed
+                + "}/{total_fmt:>"
+                + chars_needed
+                + "} "
+            )
+            return lambda iterator: tqdm(
+                iterable=iterator,
+                disable=not args.show_progress,
+                bar_format=bar_format,
+                **kwargs,
+            )
+
+        stop = None
+        if args.sitemap is not None:
+            new, edited = queued_ids(
+                fetcher.run(sitemap_entries(fetcher, args.sitemap)),
+                journal.done,
+                index.checked(),
+            )
+            wanted = {
+                id_
+                for id_ in (new - ignore_ids) | edited
+                if in_shard(id_, args.shard)
+            }
+            logger.info(
+                f"Sitemap lists {len(new)} new and {len(edited)} modified "
+                "entries"
+            )
+            stop = found_all(wanted)
+        elif args.incremental:
+            stop = seen_before(journal.done, journal.newest, args.shard)
+
+        if args.sitemap is not None:
+            rows_total = len_all_entries
+            reports_initial = 0
+            reports_total = len(wanted)
+        elif args.refresh_changed:
+            rows_total = len_all_entries
+            reports_initial = 0
+            reports_total = len(journal.done)
+        elif args.fresh:
+            # Entries done by the interrupted run resumed, if any
+            rows_total = total_entries
+            reports_initial = len(journal.done)
+            reports_total = (
+                total_entries
+                if args.lines is None
+                else len(journal.done) + args.lines
+            )
+        else:
+            rows_total = len_all_entries
+            reports_initial = len(journal.done)
+            reports_total = (
+                len_all_entries
+                if args.lines is None
+                else len(journal.done) + args.lines
+            )
+
+        rows = shard_rows(
+            all_rows(fetcher, args.prefetch, html_parser, stop), args.shard
+        )
+        if args.sitemap is not None:
+            rows = known_rows(rows, wanted)
+            ignore_ids = set()
+        elif args.refresh_changed:
+            rows = known_rows(rows, journal.done)
+            ignore_ids = set()
+
+        resolver = LinkResolver(fetcher, args.per_host, cache)
+        extracted = extract(
+            fetcher,
+            rows,
+            ignore_ids=ignore_ids,
+            progress_rows=progress(
+                desc="Parsing rows    ", colour="yellow", total=rows_total
+            ),
+            progress_reports=progress(
+                desc="Scraping reports",
+                colour="green",
+                initial=reports_initial,
+                total=reports_total,
+            ),
+            resolver=resolver,
+            parser=html_parser,
+            max_pending=args.max_pending,
+            index=index,
+            refresh=journal.done if updating else (),
+            fields=args.fields,
+        )
+
+        with metrics_writer(fetcher.metrics):
+            if updating:
+                update(extracted, journal, fetcher.metrics)
+                index.commit()
+            else:
+                write(
+                    out_dir=args.dir,
+                    overwrite=args.fresh,
+                    num_entries=args.lines,
+                    gen=extracted,
+                    journal=journal,
+                    batch_size=args.batch_size,
+                    flush_interval=args.flush_interval,
+                    database=database,
+                    metrics=fetcher.metrics,
+                )
+        if args.parquet:
+            columnar.convert(args.dir)
+        resolver.log_summary()
+        print(cache.summary())
+        print(fetcher.throttle.summary())
+        print(fetcher.metrics.summary())
+    print(memory_summary())
+
+
+if args.export_csv:
+    export()
+elif args.from_archive is not None:
+    rebuild()
+else:
+    run()
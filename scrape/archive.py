@@ -0,0 +1,95 @@
+import logging
+import struct
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from scrape.parsers import Parser
+from scrape.report import Report, Row
+from scrape.util import URL
+
+logger = logging.getLogger(__name__)
+
+# Length of the URL, fetch timestamp, length of the compressed page
+HEADER = struct.Struct(">HdI")
+
+
+class HtmlArchive:
+    """Append-only archive of fetched pages, keyed by URL.
+
+    Each record consists of a header, the URL and the zlib-compressed page,
+    so that the archive can be indexed without decompressing the pages.
+    """
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = open(path, "ab")
+
+    def add(self, url: str, html: str, fetched_at: Optional[float] = None):
+        url_bytes = url.encode("utf-8")
+        page = zlib.compress(html.encode("utf-8"))
+        if fetched_at is None:
+            fetched_at = time.time()
+        self.file.write(HEADER.pack(len(url_bytes), fetched_at, len(page)))
+        self.file.write(url_bytes)
+        self.file.write(page)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_archive(path: Path) -> Iterator[Tuple[str, float, bytes]]:
+    """Generator, yields (url, fetch timestamp, compressed page) for each
+    record of the archive at :param path:, in order of writing."""
+    with open(path, "rb") as file:
+        while True:
+            header = file.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return
+            url_len, fetched_at, page_len = HEADER.unpack(header)
+            url = file.read(url_len).decode("utf-8")
+            page = file.read(page_len)
+            if len(page) < page_len:
+                logger.warning(f"Truncated record for {url}")
+                return
+            yield url, fetched_at, page
+
+
+def latest_pages(path: Path) -> Dict[str, bytes]:
+    """Map each URL of the archive at :param path: to its most recently
+    fetched (compressed) page."""
+    pages: Dict[str, Tuple[float, bytes]] = {}
+    for url, fetched_at, page in read_archive(path):
+        if url not in pages or pages[url][0] <= fetched_at:
+            pages[url] = fetched_at, page
+    return {url: page for url, (_, page) in pages.items()}
+
+
+def is_listing(url: str, listing_url: str = URL) -> bool:
+    return url.startswith(listing_url)
+
+
+def listing_offset(url: str) -> int:
+    return int(parse_qs(urlparse(url).query).get("offset", ["0"])[0])
+
+
+def parse_listing(parser: Parser, page: bytes) -> List[Row]:
+    """Parse all rows of a compressed listing page with :param parser:.
+    Defined here to be picklable.
+    """
+    return parser.rows(zlib.decompress(page).decode("utf-8"))
+
+
+def parse_archived_report(parser: Parser, id_: str, page: bytes) -> Report:
+    """Parse a compressed report page with :param parser:, without
+    resolving links. Defined here to be picklable.
+    """
+    return parser.report(id_, zlib.decompress(page).decode("utf-8"))
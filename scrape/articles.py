@@ -0,0 +1,398 @@
+import argparse
+import asyncio
+import logging
+import os
+import re
+from collections import defaultdict, namedtuple
+from csv import DictWriter
+from pathlib import Path
+from typing import AsyncGenerator, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import requests
+from bs4 import BeautifulSoup, SoupStrainer
+from tqdm import tqdm
+
+from scrape.fetch import Fetcher
+from scrape.journal import Journal
+from scrape.metrics import Metrics, memory_summary
+from scrape.parsers import DEFAULT_PARSER, PARSERS
+from scrape.scraping import Failed, read_csv, run_stage
+from scrape.util import (
+    ARTICLE_TIMEOUT,
+    ARTICLES_FILENAME,
+    ARTICLES_JOURNAL_FILENAME,
+    DATA_DIR,
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_CONCURRENCY,
+    DEFAULT_FLUSH_INTERVAL,
+    DEFAULT_PER_HOST,
+    DEFAULT_RATE,
+    PUBLICATIONS_FILENAME,
+    Article,
+    check_non_negative,
+    check_non_negative_float,
+    check_positive,
+    stringify,
+)
+from scrape.writer import BUFFER_SIZE, BatchWriter
+
+try:
+    import newspaper
+except ImportError:  # optional dependency
+    newspaper = None
+
+logger = logging.getLogger(__name__)
+
+# Published article, and the reports listing it
+Target = namedtuple("Target", ["id", "report_ids"])
+
+SOCIAL_STRAINER = SoupStrainer(["meta", "a"])
+TWITTER_PROFILE = re.compile(
+    r"^https?://(?:www\.|mobile\.)?(?:twitter|x)\.com/@?(\w{1,15})/?(?:\?|$)"
+)
+FACEBOOK_PROFILE = re.compile(
+    r"^https?://(?:www\.|m\.)?facebook\.com/([\w.\-]+)/?(?:\?|$)"
+)
+# Paths of the sites that are not profiles
+NOT_PROFILES = {
+    "home",
+    "intent",
+    "share",
+    "sharer",
+    "sharer.php",
+    "search",
+    "hashtag",
+    "i",
+    "dialog",
+    "plugins",
+    "tr",
+    "login",
+    "profile.php",
+}
+
+
+def check_available():
+    if newspaper is None:
+        raise ImportError("Crawling articles requires newspaper3k")
+
+
+def social_links(html) -> Tuple[str, str]:
+    """Twitter and Facebook profiles of the publisher of the page
+    :param html:, from its metadata or else its first profile link, empty
+    if not found."""
+    soup = BeautifulSoup(
+        html, PARSERS[DEFAULT_PARSER].features, parse_only=SOCIAL_STRAINER
+    )
+    try:
+        twitter = facebook = ""
+        for meta in soup.find_all("meta"):
+            name = meta.get("name") or meta.get("property") or ""
+            content = meta.get("content", "").strip()
+            if not twitter and name == "twitter:site" and content:
+                twitter = content.lstrip("@")
+            elif not facebook and name == "article:publisher":
+                match = FACEBOOK_PROFILE.match(content)
+                if match is not None and match[1] not in NOT_PROFILES:
+                    facebook = match[1]
+        for a in soup.find_all("a", href=True):
+            if twitter and facebook:
+                break
+            href = a["href"].strip()
+            match = TWITTER_PROFILE.match(href)
+            if not twitter and match and match[1].lower() not in NOT_PROFILES:
+                twitter = match[1]
+            match = FACEBOOK_PROFILE.match(href)
+            if not facebook and match and match[1] not in NOT_PROFILES:
+                facebook = match[1]
+    finally:
+        soup.decompose()
+    return (
+        f"https://twitter.com/{twitter}" if twitter else "",
+        f"https://www.facebook.com/{facebook}" if facebook else "",
+    )
+
+
+def parse_article(target: Target, html) -> List[Article]:
+    """Extract the metadata of the article :param html: of
+    :param target:, one row per report listing it."""
+    # Without downloading the images, as workers should not do I/O
+    article = newspaper.Article(
+        target.id, fetch_images=False, memoize_articles=False
+    )
+    article.download(input_html=html)
+    article.parse()
+    date = article.publish_date
+    twitter, facebook = social_links(html)
+    return [
+        Article(
+            url=target.id,
+            title=article.title,
+            date=date.date().isoformat() if date else "",
+            language=article.meta_lang,
+            authors=", ".join(article.authors),
+            twitter=twitter,
+            facebook=facebook,
+            id=report_id,
+        )
+        for report_id in target.report_ids
+    ]
+
+
+def read_targets(data_dir: Path) -> List[Target]:
+    """Articles in the publications file in :param data_dir:, each with the
+    reports listing it, in order of first appearance."""
+    report_ids: Dict[str, List[str]] = defaultdict(list)
+    for row in read_csv(data_dir / PUBLICATIONS_FILENAME):
+        url = row["publication"].strip()
+        if urlparse(url).scheme in ("http", "https"):
+            if row["id"] not in report_ids[url]:
+                report_ids[url].append(row["id"])
+    return [Target(url, ids) for url, ids in report_ids.items()]
+
+
+async def crawl_async(
+    fetcher: Fetcher,
+    targets: Iterable[Target],
+    per_host: int = DEFAULT_PER_HOST,
+    max_pending: Optional[int] = None,
+) -> AsyncGenerator:
+    """Asynchronous generator, yields (target, articles) pairs in order of
+    completion, or :class:`Failed` for articles that could not be crawled.
+
+    Articles are fetched with :attr:`Fetcher.concurrency` workers, at most
+    :param per_host: per host, and parsed with
+    :attr:`Fetcher.parse_workers` workers in the process pool; the stages
+    are connected by queues of at most :param max_pending: items.
+    """
+    if max_pending is None:
+        max_pending = fetcher.concurrency
+    hosts: Dict[str, asyncio.Semaphore] = defaultdict(
+        lambda: asyncio.Semaphore(per_host)
+    )
+    pending: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+    fetched: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+    done: asyncio.Queue = asyncio.Queue()
+
+    async def produce():
+        for target in targets:
+            await pending.put((target,))
+        await pending.put(None)
+
+    async def fetch(target: Target):
+        async with hosts[urlparse(target.id).netloc]:
+            with fetcher.metrics.stage("fetch").measure() as stage:
+                # Streamed, so that other documents are not downloaded
+                response = await fetcher.get(
+                    target.id, timeout=ARTICLE_TIMEOUT, stream=True
+                )
+                try:
+                    response.raise_for_status()
+                    content_type = response.headers.get("Content-Type", "")
+                    if "html" not in content_type:
+                        return target, None
+                    html = await fetcher.submit(getattr, response, "text")
+                finally:
+                    response.close()
+                stage.add_bytes(len(html))
+                return target, html
+
+    async def parse(target: Target, html: Optional[str]):
+        if html is None:
+            # Not an article, e.g. a video or a document
+            return target, [
+                Article(target.id, "", "", "", "", "", "", id_)
+                for id_ in target.report_ids
+            ]
+        with fetcher.metrics.stage("parse").measure() as stage:
+            stage.add_bytes(len(html))
+            return target, await fetcher.parse(parse_article, target, html)
+
+    tasks = [
+        asyncio.ensure_future(produce()),
+        asyncio.ensure_future(
+            run_stage(fetch, pending, fetched, done, fetcher.concurrency)
+        ),
+        asyncio.ensure_future(
+            run_stage(parse, fetched, done, done, fetcher.parse_workers)
+        ),
+    ]
+    try:
+        while True:
+            o = await done.get()
+            if o is None:
+                break
+            yield o
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class ArticleWriter(BatchWriter):
+    """Appends the metadata of articles to :attr:`path` with group commits,
+    see :class:`BatchWriter`. Entries are (target, articles) pairs."""
+
+    def __init__(
+        self,
+        path: Path,
+        journal: Optional[Journal] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        metrics: Optional[Metrics] = None,
+    ):
+        super().__init__(journal, batch_size, flush_interval, metrics)
+        if journal is not None:
+            journal.recover(path.parent)
+        self.file = open(path, "a", encoding="utf-8", buffering=BUFFER_SIZE)
+        self.writer = DictWriter(self.file, Article._fields)
+        self.size = os.fstat(self.file.fileno()).st_size
+        if self.size == 0:
+            self.writer.writeheader()
+
+    def key(self, target: Target, articles: List[Article]):
+        return target.id, None
+
+    def write_entry(self, target: Target, articles: List[Article]):
+        for article in articles:
+            self.writer.writerow(stringify(article._asdict()))
+
+    def flush(self) -> Dict[str, int]:
+        self.file.flush()
+        if self.journal is not None:
+            os.fsync(self.file.fileno())
+        size = os.fstat(self.file.fileno()).st_size
+        self.stage.add_bytes(size - self.size)
+        self.size = size
+        return {Path(self.file.name).name: size}
+
+    def close(self, commit: bool = True, replace: bool = True):
+        super().close(commit, replace)
+        self.file.close()
+
+
+def crawl(
+    fetcher: Fetcher,
+    targets: List[Target],
+    path: Path,
+    journal: Journal,
+    num_entries: Optional[int] = None,
+    per_host: int = DEFAULT_PER_HOST,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+    show_progress: bool = True,
+):
+    """Crawl the first :param num_entries: (all if None) :param targets:
+    not yet done in :param journal: (nor failed recently), appending their
+    metadata to :param path:."""
+    ignore_ids = journal.ignored_ids()
+    targets = [t for t in targets if t.id not in ignore_ids][:num_entries]
+    writer = ArticleWriter(
+        path, journal, batch_size, flush_interval, fetcher.metrics
+    )
+    complete = True  # no entry partially written
+    try:
+        for item in tqdm(
+            fetcher.iterate(crawl_async(fetcher, targets, per_host)),
+            total=len(targets),
+            disable=not show_progress,
+        ):
+            if isinstance(item, Failed):
+                writer.fail(item.id, item.reason)
+                continue
+            complete = False
+            writer.add(*item)
+            complete = True
+    except BaseException:
+        writer.close(commit=complete, replace=False)
+        raise
+    writer.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Crawl the articles in the publications file for their "
+        f"metadata and the social profiles of their publisher, into "
+        f"{ARTICLES_FILENAME}. Interrupted crawls resume where they stopped, "
+        "and articles that failed are retried with a growing delay."
+    )
+    parser.add_argument(
+        "dir",
+        metavar="DIR",
+        help=f"directory of {PUBLICATIONS_FILENAME}, and of the output file",
+        type=lambda p: Path(p).absolute(),
+        default=DATA_DIR,
+        nargs="?",
+    )
+    parser.add_argument(
+        "-n",
+        "--lines",
+        metavar="N",
+        help="number of articles to crawl",
+        type=check_non_negative,
+        default=None,
+    )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        metavar="N",
+        help=f"maximum number of requests in flight (default: {DEFAULT_CONCURRENCY})",
+        type=check_positive,
+        default=DEFAULT_CONCURRENCY,
+    )
+    parser.add_argument(
+        "--per-host",
+        metavar="N",
+        help=f"maximum number of requests in flight to the same host (default: {DEFAULT_PER_HOST})",
+        type=check_positive,
+        default=DEFAULT_PER_HOST,
+    )
+    parser.add_argument(
+        "--rate",
+        metavar="R",
+        help=f"maximum number of requests per second to the same host, 0 for no limit (default: {DEFAULT_RATE:g})",
+        type=check_non_negative_float,
+        default=DEFAULT_RATE,
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        metavar="N",
+        help="number of processes parsing articles (default: number of CPUs)",
+        type=check_positive,
+        default=None,
+    )
+    parser.add_argument(
+        "-np",
+        "--no-progress",
+        dest="show_progress",
+        help="hide progress bar",
+        action="store_false",
+        default=True,
+    )
+    args = parser.parse_args()
+    if not (args.dir / PUBLICATIONS_FILENAME).exists():
+        parser.error(f"{args.dir / PUBLICATIONS_FILENAME} does not exist")
+    try:
+        check_available()
+    except ImportError as error:
+        parser.error(str(error))
+
+    targets = read_targets(args.dir)
+    with Journal(
+        args.dir / ARTICLES_JOURNAL_FILENAME
+    ) as journal, requests.Session() as session, Fetcher(
+        session, args.concurrency, None, args.workers, args.rate
+    ) as fetcher:
+        crawl(
+            fetcher,
+            targets,
+            args.dir / ARTICLES_FILENAME,
+            journal,
+            args.lines,
+            args.per_host,
+            show_progress=args.show_progress,
+        )
+        print(fetcher.throttle.summary())
+        print(fetcher.metrics.summary())
+    print(memory_summary())
@@ -0,0 +1,191 @@
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import requests
+
+from scrape import mock
+from scrape.fetch import Fetcher
+from scrape.links import LinkResolver
+from scrape.metrics import peak_rss
+from scrape.parsers import DEFAULT_PARSER, PARSERS, get_parser
+from scrape.scraping import Failed, all_rows, extract, write
+from scrape.util import (
+    DEFAULT_CONCURRENCY,
+    DEFAULT_PER_HOST,
+    DEFAULT_PREFETCH,
+    check_non_negative_float,
+    check_positive,
+)
+
+
+def start_server(args: argparse.Namespace) -> subprocess.Popen:
+    """Start the mock server in a separate process, so that it does not
+    compete with the scraper for the interpreter lock."""
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "scrape.mock",
+            f"--entries={args.entries}",
+            f"--links={args.links}",
+            f"--latency={args.latency}",
+            f"--jitter={args.jitter}",
+            f"--error-rate={args.error_rate}",
+        ],
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+
+
+def benchmark(listing_url: str, args: argparse.Namespace) -> dict:
+    """Scrape all entries listed at :param listing_url: into a temporary
+    directory, return the throughput, latency and memory measurements."""
+    parser = get_parser(args.parser)
+    counts = {"rows": 0, "reports": 0, "failed": 0}
+
+    async def count_rows(rows):
+        async for row in rows:
+            counts["rows"] += 1
+            yield row
+
+    def count_reports(items):
+        for item in items:
+            counts["failed" if isinstance(item, Failed) else "reports"] += 1
+            yield item
+
+    with tempfile.TemporaryDirectory() as out_dir, requests.Session() as s:
+        with Fetcher(
+            s, args.concurrency, None, args.workers, args.rate
+        ) as fetcher:
+            resolver = LinkResolver(fetcher, args.per_host)
+            start = time.perf_counter()
+            write(
+                out_dir=Path(out_dir),
+                overwrite=True,
+                num_entries=None,
+                gen=extract(
+                    fetcher,
+                    all_rows(fetcher, args.prefetch, parser, url=listing_url),
+                    ignore_ids=set(),
+                    progress_rows=count_rows,
+                    progress_reports=count_reports,
+                    resolver=resolver,
+                    parser=parser,
+                ),
+            )
+            seconds = time.perf_counter() - start
+        # Parse workers have exited, the server has not
+        workers_rss = peak_rss(children=True)
+    rss = peak_rss()
+
+    latency_ms = {}
+    for name in ("listing", "fetch", "link"):
+        stage = fetcher.metrics.stages.get(name)
+        if stage is not None:
+            latency_ms[name] = {
+                "p50": stage.percentile(50) * 1e3,
+                "p99": stage.percentile(99) * 1e3,
+            }
+    links = fetcher.metrics.stages.get("link")
+    return {
+        "seconds": seconds,
+        "rows": counts["rows"],
+        "reports": counts["reports"],
+        "failed": counts["failed"],
+        "links": 0 if links is None else links.count,
+        "retries": fetcher.throttle.retries,
+        "rows_per_second": counts["rows"] / seconds,
+        "reports_per_second": counts["reports"] / seconds,
+        "links_per_second": (0 if links is None else links.count) / seconds,
+        "latency_ms": latency_ms,
+        "peak_rss_mb": None if rss is None else rss / 1e6,
+        "peak_worker_rss_mb": (
+            None if workers_rss is None else workers_rss / 1e6
+        ),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the scraper against a local mock server, "
+        "print the results as JSON."
+    )
+    mock.add_arguments(parser)
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        metavar="N",
+        help=f"maximum number of requests in flight (default: {DEFAULT_CONCURRENCY})",
+        type=check_positive,
+        default=DEFAULT_CONCURRENCY,
+    )
+    parser.add_argument(
+        "-p",
+        "--prefetch",
+        metavar="N",
+        help=f"maximum number of listing pages fetched ahead (default: {DEFAULT_PREFETCH})",
+        type=check_positive,
+        default=DEFAULT_PREFETCH,
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        metavar="N",
+        help="number of processes parsing pages (default: number of CPUs)",
+        type=check_positive,
+        default=None,
+    )
+    parser.add_argument(
+        "--rate",
+        metavar="R",
+        help="maximum number of requests per second, 0 for no limit (default: %(default)s)",
+        type=check_non_negative_float,
+        default=0.0,
+    )
+    parser.add_argument(
+        "--per-host",
+        metavar="N",
+        help=f"maximum number of requests in flight to the same host when resolving links (default: {DEFAULT_PER_HOST})",
+        type=check_positive,
+        default=DEFAULT_PER_HOST,
+    )
+    parser.add_argument(
+        "--parser",
+        help="HTML parser backend (default: %(default)s)",
+        choices=list(PARSERS),
+        default=DEFAULT_PARSER,
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        metavar="FILE",
+        help="write the results to FILE instead of the standard output",
+        type=Path,
+        default=None,
+    )
+    args = parser.parse_args()
+    try:
+        get_parser(args.parser)
+    except ValueError as error:
+        parser.error(str(error))
+
+    server = start_server(args)
+    try:
+        listing_url = server.stdout.readline().strip()
+        if not listing_url:
+            parser.error("mock server failed to start")
+        config = {k: v for k, v in vars(args).items() if k != "output"}
+        results = {"config": config, **benchmark(listing_url, args)}
+    finally:
+        server.terminate()
+        server.wait()
+    output = json.dumps(results, indent=2)
+    if args.output is None:
+        print(output)
+    else:
+        args.output.write_text(output + "\n", encoding="utf-8")
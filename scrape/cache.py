@@ -0,0 +1,236 @@
+import logging
+import sqlite3
+import time
+from collections import namedtuple
+from pathlib import Path
+from typing import Dict, Optional
+
+from scrape.util import LINK_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+
+def outcome(result: str) -> str:
+    """Classify the result of :meth:`Report.resolve_link` as "ok" (final
+    URL), "status" (HTTP status code) or "error" (exception name)."""
+    if result.isdigit():
+        return "status"
+    elif "://" in result:
+        return "ok"
+    else:
+        return "error"
+
+
+class SqliteTable:
+    """Table of an SQLite database, whose changes are committed in groups of
+    :attr:`commit_every` changes, or only by :meth:`commit` if None."""
+
+    def __init__(
+        self, path: Path, schema: str, commit_every: Optional[int] = 100
+    ):
+        """Open or create the database at :param path:, creating the table
+        with the statement :param schema: if missing."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.commit_every = commit_every
+        self.uncommitted = 0
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(schema)
+
+    def changed(self):
+        """Count a change, committing once :attr:`commit_every` changes are
+        uncommitted."""
+        self.uncommitted += 1
+        if (
+            self.commit_every is not None
+            and self.uncommitted >= self.commit_every
+        ):
+            self.commit()
+
+    def commit(self):
+        self.connection.commit()
+        self.uncommitted = 0
+
+    def close(self):
+        if self.commit_every is not None:
+            self.commit()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class LinkCache(SqliteTable):
+    """Persistent cache of resolved links, shared across runs.
+    Entries expire after a time-to-live depending on their :func:`outcome`.
+    """
+
+    hits: int = 0
+    misses: int = 0
+
+    def __init__(
+        self,
+        path: Path,
+        ttl: Optional[Dict[str, float]] = None,
+        read: bool = True,
+        commit_every: int = 100,
+    ):
+        """Open or create the cache at :param path:. If :param read: is
+        False, the cache is bypassed for lookups but still updated."""
+        super().__init__(
+            path,
+            "CREATE TABLE IF NOT EXISTS links ("
+            " url TEXT PRIMARY KEY,"
+            " result TEXT NOT NULL,"
+            " outcome TEXT NOT NULL,"
+            " resolved_at REAL NOT NULL"
+            ")",
+            commit_every,
+        )
+        self.ttl = dict(LINK_CACHE_TTL, **(ttl or {}))
+        self.read = read
+
+    def get(self, url: str, expire: bool = True) -> Optional[str]:
+        """Look up :param url:, ignoring expiry if :param expire: is False."""
+        if self.read:
+            row = self.connection.execute(
+                "SELECT result, outcome, resolved_at FROM links WHERE url = ?",
+                (url,),
+            ).fetchone()
+            if row is not None:
+                result, outcome_, resolved_at = row
+                if (
+                    not expire
+                    or time.time() - resolved_at < self.ttl[outcome_]
+                ):
+                    self.hits += 1
+                    return result
+        self.misses += 1
+        return None
+
+    def put(self, url: str, result: str):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO links VALUES (?, ?, ?, ?)",
+            (url, result, outcome(result), time.time()),
+        )
+        self.changed()
+
+    def prune(self) -> int:
+        """Delete expired entries, return the number of entries deleted."""
+        now = time.time()
+        deleted = 0
+        for outcome_, ttl in self.ttl.items():
+            deleted += self.connection.execute(
+                "DELETE FROM links WHERE outcome = ? AND resolved_at <= ?",
+                (outcome_, now - ttl),
+            ).rowcount
+        self.commit()
+        self.connection.execute("VACUUM")
+        return deleted
+
+    def summary(self) -> str:
+        lookups = self.hits + self.misses
+        ratio = self.hits / lookups if lookups > 0 else 0
+        return (
+            f"Link cache: {self.hits} hits, {self.misses} misses "
+            f"({ratio:.1%} hit rate)"
+        )
+
+
+# Content hash of a report page (see parsers.content_hash), and its HTTP
+# validators, None if not sent by the server
+ReportVersion = namedtuple("ReportVersion", ["hash", "etag", "last_modified"])
+
+
+class ReportIndex(SqliteTable):
+    """Persistent index of the :class:`ReportVersion` of each report
+    scraped, to detect reports edited since."""
+
+    def __init__(self, path: Path, commit_every: Optional[int] = 100):
+        """Open or create the index at :param path:. If :param commit_every:
+        is None, changes are only committed by :meth:`commit`."""
+        super().__init__(
+            path,
+            "CREATE TABLE IF NOT EXISTS reports ("
+            " id TEXT PRIMARY KEY,"
+            " hash TEXT NOT NULL,"
+            " etag TEXT,"
+            " last_modified TEXT,"
+            " checked_at REAL NOT NULL"
+            ")",
+            commit_every,
+        )
+
+    def get(self, id_: str) -> Optional[ReportVersion]:
+        row = self.connection.execute(
+            "SELECT hash, etag, last_modified FROM reports WHERE id = ?",
+            (id_,),
+        ).fetchone()
+        return None if row is None else ReportVersion(*row)
+
+    def checked(self) -> Dict[str, float]:
+        """Time each report was last checked, by id."""
+        return dict(
+            self.connection.execute("SELECT id, checked_at FROM reports")
+        )
+
+    def put(self, id_: str, version: ReportVersion):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO reports VALUES (?, ?, ?, ?, ?)",
+            (id_, *version, time.time()),
+        )
+        self.changed()
+
+
+# Result of the last check of a link: HTTP status code or exception name,
+# URL after redirects (empty on error), and time of the check
+LinkStatus = namedtuple("LinkStatus", ["status", "final_url", "checked_at"])
+
+
+class LivenessTable(SqliteTable):
+    """Persistent table of the :class:`LinkStatus` of each link checked, to
+    re-check only the links checked long ago."""
+
+    def __init__(self, path: Path, commit_every: int = 1000):
+        # Without rowid, the URLs are only stored in the primary key
+        super().__init__(
+            path,
+            "CREATE TABLE IF NOT EXISTS links ("
+            " url TEXT PRIMARY KEY,"
+            " status TEXT NOT NULL,"
+            " final_url TEXT NOT NULL,"
+            " checked_at REAL NOT NULL"
+            ") WITHOUT ROWID",
+            commit_every,
+        )
+
+    def get(self, url: str) -> Optional[LinkStatus]:
+        row = self.connection.execute(
+            "SELECT status, final_url, checked_at FROM links WHERE url = ?",
+            (url,),
+        ).fetchone()
+        return None if row is None else LinkStatus(*row)
+
+    def checked(self) -> Dict[str, float]:
+        """Time each link was last checked, by URL."""
+        return dict(
+            self.connection.execute("SELECT url, checked_at FROM links")
+        )
+
+    def counts(self) -> Dict[str, int]:
+        """Number of links by status."""
+        return dict(
+            self.connection.execute(
+                "SELECT status, COUNT(*) FROM links GROUP BY status"
+                " ORDER BY COUNT(*) DESC"
+            )
+        )
+
+    def put(self, url: str, status: str, final_url: str):
+        self.connection.execute(
+            "INSERT OR REPLACE INTO links VALUES (?, ?, ?, ?)",
+            (url, status, final_url, time.time()),
+        )
+        self.changed()
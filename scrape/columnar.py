@@ -0,0 +1,138 @@
+import argparse
+import json
+import logging
+from csv import DictReader
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import pandas as pd
+
+from scrape.util import (
+    DATA_DIR,
+    LIST_FIELDS,
+    PARQUET_SCHEMA_FILENAME,
+    SCHEMA_FILENAME,
+    str2list,
+    tmp_path,
+)
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency
+    pa = pq = None
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION = "zstd"
+
+
+def check_available():
+    if pa is None:
+        raise ImportError("Parquet output requires pyarrow")
+
+
+def field_type(name: str, field: dict) -> "pa.DataType":
+    """Arrow type of the :param field: of the table schema of resource
+    :param name:, with lists of strings as native lists."""
+    if field["name"] in LIST_FIELDS.get(name, ()):
+        return pa.list_(pa.string())
+    elif field["type"] == "date":
+        return pa.date32()
+    return pa.string()
+
+
+def convert_value(value: str, type_: "pa.DataType"):
+    if pa.types.is_list(type_):
+        return str2list(value) if value else []
+    elif pa.types.is_date(type_):
+        return date.fromisoformat(value) if value else None
+    return value if value else None
+
+
+def csv_to_parquet(csv_path: Path, parquet_path: Path, name: str, schema):
+    """Convert the CSV file of resource :param name:, described by the
+    table :param schema:, to a Parquet file."""
+    arrow_schema = pa.schema(
+        [(f["name"], field_type(name, f)) for f in schema["fields"]]
+    )
+    columns: Dict[str, List] = {f.name: [] for f in arrow_schema}
+    with open(csv_path, encoding="utf-8", newline="") as file:
+        for row in DictReader(file):
+            for field in arrow_schema:
+                columns[field.name].append(
+                    convert_value(row[field.name], field.type)
+                )
+    table = pa.table(columns, schema=arrow_schema)
+    # Write next to the target, so that readers never see a partial file
+    pq.write_table(table, tmp_path(parquet_path), compression=COMPRESSION)
+    tmp_path(parquet_path).replace(parquet_path)
+
+
+def parquet_descriptor(descriptor: dict) -> dict:
+    """Descriptor of the Parquet files, derived from the :param descriptor:
+    of the CSV files."""
+    descriptor = json.loads(json.dumps(descriptor))  # deep copy
+    for resource in descriptor["resources"]:
+        resource["path"] = str(Path(resource["path"]).with_suffix(".parquet"))
+        resource["format"] = "parquet"
+        for field in resource["schema"]["fields"]:
+            if field["name"] in LIST_FIELDS.get(resource["name"], ()):
+                field["type"] = "array"
+                field["arrayItem"] = {"type": "string"}
+    return descriptor
+
+
+def convert(data_dir: Path, schema_dir: Path = DATA_DIR):
+    """Convert the CSV files in :param data_dir: to Parquet, along with
+    their descriptor in :param schema_dir:."""
+    check_available()
+    with open(schema_dir / SCHEMA_FILENAME, encoding="utf-8") as file:
+        descriptor = json.load(file)
+    for resource in descriptor["resources"]:
+        csv_path = data_dir / resource["path"]
+        if not csv_path.exists():
+            logger.warning(f"Skipping missing {csv_path}")
+            continue
+        csv_to_parquet(
+            csv_path,
+            csv_path.with_suffix(".parquet"),
+            resource["name"],
+            resource["schema"],
+        )
+    with open(
+        data_dir / PARQUET_SCHEMA_FILENAME, "w", encoding="utf-8"
+    ) as file:
+        json.dump(parquet_descriptor(descriptor), file, indent=2)
+        file.write("\n")
+
+
+def read_table(
+    data_dir: Path, name: str, columns: Optional[Sequence[str]] = None
+) -> pd.DataFrame:
+    """Read only :param columns: (all if None) of the Parquet file of
+    resource :param name:, with lists as lists and dates as dates."""
+    check_available()
+    return pq.read_table(
+        data_dir / f"{name}.parquet", columns=columns
+    ).to_pandas()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Convert the CSV files of the data package to Parquet."
+    )
+    parser.add_argument(
+        "dir",
+        metavar="DIR",
+        help="data directory (default: %(default)s)",
+        type=lambda p: Path(p).absolute(),
+        default=DATA_DIR,
+        nargs="?",
+    )
+    args = parser.parse_args()
+    try:
+        convert(args.dir)
+    except ImportError as error:
+        parser.error(str(error))
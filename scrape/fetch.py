@@ -0,0 +1,224 @@
+import asyncio
+import functools
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import count
+from typing import AsyncIterator, Awaitable, Iterator, Optional, TypeVar
+from weakref import WeakSet
+
+import requests
+
+from scrape.archive import HtmlArchive
+from scrape.metrics import Metrics
+from scrape.throttle import HostThrottle, Throttle, ThrottledAdapter
+from scrape.util import DEFAULT_CONCURRENCY, DEFAULT_RATE
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Fetcher:
+    """Asynchronous front-end for a :class:`requests.Session`.
+
+    Requests are issued from a thread pool and awaited on an event loop owned
+    by the fetcher, with at most :attr:`concurrency` requests in flight.
+    Pages are parsed in a separate pool of :attr:`parse_workers` processes.
+    Requests to each host adapt their concurrency to the host's response,
+    see :class:`HostThrottle`; requests submitted with
+    :meth:`submit_request` wait for their host on the event loop.
+    """
+
+    concurrency: int
+    parse_workers: int
+    retries: int
+
+    def __init__(
+        self,
+        session: requests.Session,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        archive: Optional[HtmlArchive] = None,
+        parse_workers: Optional[int] = None,
+        rate: Optional[float] = DEFAULT_RATE,
+    ):
+        """If :param archive: is given, pages fetched with :meth:`get` are
+        stored in it. :param parse_workers: defaults to the number of CPUs,
+        no process pool is started if 0.
+        All requests of :param session: are throttled per host, to at most
+        :param rate: requests per second (no limit if None or 0)."""
+        self.session = session
+        self.archive = archive
+        self.concurrency = concurrency
+        if parse_workers is None:
+            parse_workers = os.cpu_count() or 1
+        self.parse_workers = parse_workers
+        self.metrics = Metrics()
+        self.parse_executor: Optional[ProcessPoolExecutor] = None
+        if parse_workers > 0:
+            # Start the processes before any thread, forking a
+            # multi-threaded process may deadlock
+            self.parse_executor = ProcessPoolExecutor(parse_workers)
+            self.parse_executor.submit(int).result()
+        self.throttle = Throttle(concurrency, rate)
+        # Default adapters only keep 10 connections per host
+        adapter = ThrottledAdapter(
+            self.throttle,
+            pool_connections=concurrency,
+            pool_maxsize=concurrency,
+        )
+        self.retries = adapter.retries
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        self.loop = asyncio.new_event_loop()
+        self._iterating: WeakSet = WeakSet()
+        self.executor = ThreadPoolExecutor(concurrency)
+        self.semaphore = self.run(self._make_semaphore())
+
+    async def _make_semaphore(self) -> asyncio.Semaphore:
+        # Create inside the loop, so that the semaphore is bound to it
+        return asyncio.Semaphore(self.concurrency)
+
+    async def submit(self, func, *args, **kwargs):
+        """Run :param func:, which performs network I/O, in the thread pool,
+        counting it towards the in-flight limit."""
+        async with self.semaphore:
+            return await self.loop.run_in_executor(
+                self.executor, functools.partial(func, *args, **kwargs)
+            )
+
+    async def submit_request(self, url: str, func, *args, **kwargs):
+        """Run :param func:, which requests :param url: with
+        :attr:`session`, as with :meth:`submit`. The request waits for the
+        host of :param url: on the event loop, before counting towards the
+        in-flight limit, so that a paused host does not hold up the
+        requests to other hosts. :param func: is run again on overload
+        statuses, up to :attr:`retries` times once the host is no longer
+        paused; requests to other hosts (e.g. redirects) wait in the thread.
+        """
+        host = self.throttle.host(url)
+        for attempt in count():
+            await self._acquire(host)
+            try:
+                await self.semaphore.acquire()
+            except BaseException:
+                host.cancel()
+                raise
+            try:
+                result, overloaded = await self.loop.run_in_executor(
+                    self.executor,
+                    functools.partial(
+                        self._run_acquired, host, func, *args, **kwargs
+                    ),
+                )
+            finally:
+                self.semaphore.release()
+            if overloaded is None or attempt >= self.retries:
+                return result
+            if isinstance(result, requests.Response):
+                result.close()
+            with self.throttle.lock:
+                self.throttle.retries += 1
+            logger.debug(f"Retrying {url} (overloaded {overloaded})")
+            await asyncio.sleep(overloaded.paused_until - time.monotonic())
+
+    async def _acquire(self, host: HostThrottle):
+        while True:
+            released = asyncio.Event()
+            delay = host.try_acquire(functools.partial(self._wake, released))
+            if delay == 0:
+                return
+            elif delay is None:
+                await released.wait()
+            else:
+                await asyncio.sleep(delay)
+
+    def _wake(self, event: asyncio.Event):
+        # Called from the thread releasing a request
+        try:
+            self.loop.call_soon_threadsafe(event.set)
+        except RuntimeError:
+            pass  # loop closed
+
+    def _run_acquired(self, host: HostThrottle, func, *args, **kwargs):
+        # Run in the thread pool, the adapter sends the first request to
+        # :param host: without acquiring it, and leaves overload statuses
+        # to the caller
+        local = self.throttle.local
+        local.acquired, local.deferred, local.overloaded = host, True, None
+        try:
+            return func(*args, **kwargs), local.overloaded
+        finally:
+            if local.acquired is not None:
+                host.cancel()
+            local.acquired, local.deferred = None, False
+
+    async def request(self, method: str, url: str, **kwargs):
+        return await self.submit_request(
+            url, self.session.request, method, url, **kwargs
+        )
+
+    async def get(self, url: str, **kwargs) -> requests.Response:
+        response = await self.request("GET", url, **kwargs)
+        if self.archive is not None and response.status_code == 200:
+            # Key by requested URL, regardless of redirects
+            first = response.history[0] if response.history else response
+            self.archive.add(first.url, response.text)
+        return response
+
+    async def head(self, url: str, **kwargs) -> requests.Response:
+        return await self.request("HEAD", url, **kwargs)
+
+    async def parse(self, func, *args):
+        """Run CPU-bound :param func: in the process pool, without counting
+        it towards the in-flight limit. :param func: and its arguments must
+        be picklable."""
+        if self.parse_executor is None:
+            raise RuntimeError("Fetcher created without parse workers")
+        return await self.loop.run_in_executor(
+            self.parse_executor, functools.partial(func, *args)
+        )
+
+    def run(self, coroutine: Awaitable[T]) -> T:
+        return self.loop.run_until_complete(coroutine)
+
+    def iterate(self, agen: AsyncIterator[T]) -> Iterator[T]:
+        """Drive the asynchronous generator :param agen: from synchronous
+        code; the event loop only runs while the next item is awaited."""
+        gen = self._iterate(agen)
+        self._iterating.add(gen)
+        return gen
+
+    def _iterate(self, agen: AsyncIterator[T]) -> Iterator[T]:
+        try:
+            while True:
+                try:
+                    yield self.run(agen.__anext__())
+                except StopAsyncIteration:
+                    return
+        finally:
+            self.run(agen.aclose())
+
+    def close(self):
+        # Finish generators that were not exhausted, then any leftover work
+        for gen in list(self._iterating):
+            gen.close()
+        self.run(self._cancel_pending())
+        self.run(self.loop.shutdown_asyncgens())
+        self.executor.shutdown(wait=False)
+        if self.parse_executor is not None:
+            self.parse_executor.shutdown()
+        self.loop.close()
+
+    async def _cancel_pending(self):
+        pending = asyncio.all_tasks() - {asyncio.current_task()}
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,203 @@
+import json
+import logging
+import os
+import time
+from datetime import date
+from pathlib import Path
+from typing import Collection, Dict, Iterable, Optional, Set, Tuple
+
+from scrape.util import MAX_RETRY_FAILED_AFTER, RETRY_FAILED_AFTER, tmp_path
+
+logger = logging.getLogger(__name__)
+
+
+class Journal:
+    """Append-only journal of the entries written to the output files.
+
+    Each batch of entries is committed by recording their ids and the sizes
+    of the output files once the batch is written and synced; rows beyond
+    these sizes belong to an interrupted batch, and are truncated by
+    :meth:`recover`. Entries that failed are recorded with the reason, and
+    retried after a delay doubling with each attempt.
+    """
+
+    def __init__(self, path: Path, fresh: bool = False, resume: bool = False):
+        """Open or create the journal at :param path:. If :param fresh:, a
+        new journal is written next to it, replacing it on :meth:`publish`;
+        if :param resume: too, the fresh journal left by an interrupted run
+        is continued.
+        """
+        self.path = path
+        self.done: Set[str] = set()
+        # Number of attempts, time of the last attempt, reason
+        self.failed: Dict[str, Tuple[int, float, str]] = {}
+        self.sizes: Optional[Dict[str, int]] = None
+        self.newest: Optional[date] = None  # date of the newest entry done
+        resume = resume and fresh and tmp_path(path).exists()
+        if resume:
+            self._replay(tmp_path(path))
+        elif not fresh and path.exists():
+            self._replay(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.fresh = fresh
+        self.file = open(
+            tmp_path(path) if fresh else path,
+            "w" if fresh and not resume else "a",
+            encoding="utf-8",
+        )
+
+    def _replay(self, path: Path):
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Ignoring truncated record in {path}")
+                    break
+                if "sealed" in record:
+                    continue
+                elif "done" in record:
+                    self.done.update(record["done"])
+                    for id_ in record["done"]:
+                        self.failed.pop(id_, None)
+                    self.sizes = record["sizes"]
+                    self._update_newest(record.get("newest"))
+                else:
+                    id_ = record["failed"]
+                    # Carried over with their count by :meth:`restart`
+                    attempts = record.get(
+                        "attempts", self.failed.get(id_, (0,))[0] + 1
+                    )
+                    self.failed[id_] = attempts, record["at"], record["reason"]
+
+    def _append(self, record: dict):
+        self.file.write(json.dumps(record) + "\n")
+
+    def commit(
+        self,
+        ids: Collection[str],
+        sizes: Dict[str, int],
+        newest: Optional[date] = None,
+    ):
+        """Commit the entries :param ids:, once written and synced to the
+        output files, of :param sizes: (by name); the newest entry dates
+        from :param newest:."""
+        record = {"done": list(ids), "sizes": sizes, "at": time.time()}
+        if newest is not None:
+            record["newest"] = newest.isoformat()
+        self._append(record)
+        self._sync()
+        self.done.update(ids)
+        for id_ in ids:
+            self.failed.pop(id_, None)
+        self.sizes = sizes
+        self._update_newest(record.get("newest"))
+
+    def adopt(
+        self,
+        ids: Collection[str],
+        paths: Iterable[Path],
+        newest: Optional[date] = None,
+    ):
+        """Commit the entries :param ids:, written to :param paths: before
+        the journal existed."""
+        self.commit(
+            ids, {path.name: path.stat().st_size for path in paths}, newest
+        )
+
+    def _sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def _update_newest(self, newest: Optional[str]):
+        if newest is not None:
+            newest_date = date.fromisoformat(newest)
+            if self.newest is None or self.newest < newest_date:
+                self.newest = newest_date
+
+    def fail(self, id_: str, reason: str):
+        now = time.time()
+        self._append({"failed": id_, "reason": reason, "at": now})
+        attempts = self.failed.get(id_, (0,))[0] + 1
+        self.failed[id_] = attempts, now, reason
+
+    def recover(self, out_dir: Path):
+        """Truncate the output files in :param out_dir: (their temporary
+        files if the journal is fresh) to their size at the last commit,
+        dropping rows of interrupted batches."""
+        for name, size in (self.sizes or {}).items():
+            path = out_dir / name
+            if self.fresh:
+                path = tmp_path(path)
+            actual = path.stat().st_size if path.exists() else 0
+            if actual > size:
+                logger.warning(
+                    f"Dropping {actual - size} uncommitted bytes from {path}"
+                )
+                os.truncate(path, size)
+            elif actual < size:
+                logger.warning(f"{path} is shorter than when committed")
+
+    def is_due(self, id_: str, now: Optional[float] = None) -> bool:
+        """Whether the failed entry :param id_: should be retried."""
+        attempts, at, _ = self.failed[id_]
+        delay = min(
+            RETRY_FAILED_AFTER * 2 ** (attempts - 1), MAX_RETRY_FAILED_AFTER
+        )
+        return (time.time() if now is None else now) >= at + delay
+
+    def ignored_ids(self) -> Set[str]:
+        """Ids of entries done, or failed and not due for a retry."""
+        now = time.time()
+        return self.done | {
+            id_ for id_ in self.failed if not self.is_due(id_, now)
+        }
+
+    def restart(self):
+        """Continue in a fresh journal, replacing this one on
+        :meth:`publish`, as if opened with ``fresh=True``. The failed
+        entries are carried over, keeping their retry delays."""
+        self.file.close()
+        self.file = open(tmp_path(self.path), "w", encoding="utf-8")
+        self.fresh = True
+        self.done = set()
+        self.sizes = None
+        self.newest = None
+        for id_, (attempts, at, reason) in self.failed.items():
+            self._append(
+                {
+                    "failed": id_,
+                    "reason": reason,
+                    "at": at,
+                    "attempts": attempts,
+                }
+            )
+
+    def seal(self):
+        """Mark a fresh journal as complete, before the output files are
+        replaced, see :func:`finish_replace`."""
+        self._append({"sealed": True})
+        self._sync()
+
+    def publish(self):
+        """Replace the journal by the fresh journal, once sealed, and
+        continue appending to it."""
+        self.file.close()
+        os.replace(tmp_path(self.path), self.path)
+        self.fresh = False
+        self.file = open(self.path, "a", encoding="utf-8")
+
+    @staticmethod
+    def is_sealed(path: Path) -> bool:
+        with open(path, encoding="utf-8") as file:
+            lines = file.read().splitlines()
+        return len(lines) > 0 and lines[-1] == json.dumps({"sealed": True})
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
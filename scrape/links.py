@@ -0,0 +1,87 @@
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+from scrape.cache import LinkCache
+from scrape.fetch import Fetcher
+from scrape.report import Report
+from scrape.util import DEFAULT_PER_HOST
+
+logger = logging.getLogger(__name__)
+
+
+class LinkResolver:
+    """Resolves links with :meth:`Report.resolve_link`, each distinct link
+    at most once per run, with at most :attr:`per_host` requests in flight
+    to the same host."""
+
+    per_host: int
+    requested: int = 0
+
+    def __init__(
+        self,
+        fetcher: Fetcher,
+        per_host: int = DEFAULT_PER_HOST,
+        cache: Optional[LinkCache] = None,
+    ):
+        self.fetcher = fetcher
+        self.per_host = per_host
+        self.cache = cache
+        self.results: Dict[str, asyncio.Future] = {}
+        self.hosts: Dict[str, asyncio.Semaphore] = defaultdict(
+            lambda: asyncio.Semaphore(self.per_host)
+        )
+
+    @property
+    def resolved(self) -> int:
+        """Number of distinct links resolved (or being resolved)."""
+        return len(self.results)
+
+    async def resolve(self, url: str) -> str:
+        self.requested += 1
+        if url not in self.results:
+            self.results[url] = asyncio.ensure_future(self._resolve(url))
+        return await asyncio.shield(self.results[url])
+
+    async def _resolve(self, url: str) -> str:
+        if self.cache is not None:
+            result = self.cache.get(url)
+            if result is not None:
+                return result
+        async with self.hosts[urlparse(url).netloc]:
+            with self.fetcher.metrics.stage("link").measure() as stage:
+                result = await self.fetcher.submit_request(
+                    url, Report.resolve_link, self.fetcher.session, url
+                )
+                if not urlparse(result).scheme:
+                    stage.error(result)  # status code or exception name
+        if self.cache is not None:
+            self.cache.put(url, result)
+        return result
+
+    async def resolve_reports(self, reports: Iterable[Report]):
+        """Resolve the links of all :param reports: concurrently, and fill
+        in their resolved links."""
+        reports = list(reports)
+        links = list(dict.fromkeys(link for r in reports for link in r.links))
+        resolved = await asyncio.gather(*map(self.resolve, links))
+        resolved = dict(zip(links, resolved))
+        for report in reports:
+            report.set_resolved(resolved)
+
+    def cancel(self) -> List[asyncio.Future]:
+        """Cancel the resolutions in progress, once no report awaits them,
+        and return them; they are started again if requested later."""
+        cancelled = [f for f in self.results.values() if not f.done()]
+        for future in cancelled:
+            future.cancel()
+        self.results = {url: f for url, f in self.results.items() if f.done()}
+        return cancelled
+
+    def log_summary(self):
+        logger.info(
+            f"Resolved {self.resolved} distinct links "
+            f"for {self.requested} links requested"
+        )
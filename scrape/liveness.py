@@ -0,0 +1,267 @@
+import argparse
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import (
+    AsyncGenerator,
+    Dict,
+    Iterable,
+    Iterator,
+    Optional,
+    Set,
+    Tuple,
+)
+from urllib.parse import urlparse
+
+import requests
+import urllib3
+from tqdm import tqdm
+
+from scrape.cache import LivenessTable
+from scrape.fetch import Fetcher
+from scrape.metrics import memory_summary
+from scrape.scraping import read_csv
+from scrape.util import (
+    DATA_DIR,
+    DEFAULT_PER_HOST,
+    DEFAULT_RATE,
+    HEAD_REFUSED_STATUSES,
+    LIVENESS_CONCURRENCY,
+    LIVENESS_FILENAME,
+    LIVENESS_MAX_AGE,
+    LIVENESS_PENDING,
+    LIVENESS_TIMEOUT,
+    PUBLICATIONS_FILENAME,
+    check_non_negative,
+    check_non_negative_float,
+    check_positive,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def check_link(session, url: str) -> Tuple[str, str]:
+    """Status of :param url: (HTTP status code, or exception name) and its
+    URL after redirects, empty on error."""
+    try:
+        response = session.head(
+            url, allow_redirects=True, timeout=LIVENESS_TIMEOUT
+        )
+        if response.status_code in HEAD_REFUSED_STATUSES:
+            # Streamed, the body is not downloaded
+            response = session.get(
+                url,
+                allow_redirects=True,
+                timeout=LIVENESS_TIMEOUT,
+                stream=True,
+            )
+            response.close()
+        return str(response.status_code), response.url
+    except (
+        urllib3.exceptions.HTTPError,
+        requests.exceptions.RequestException,
+        ValueError,  # e.g. invalid international domain names
+    ) as e:
+        return type(e).__name__, ""
+
+
+def read_links(path: Path) -> Iterator[str]:
+    """Distinct links (publication and archive) of the publications file
+    :param path:, streamed in order of first appearance."""
+    seen = set()
+    for row in read_csv(path):
+        for url in (row["publication"].strip(), row["archive"].strip()):
+            if url not in seen and urlparse(url).scheme in ("http", "https"):
+                seen.add(url)
+                yield url
+
+
+def stale_links(
+    urls: Iterable[str], checked: Dict[str, float], max_age: float
+) -> Iterator[str]:
+    """Links of :param urls: never checked, or checked at least
+    :param max_age: seconds ago according to :param checked:."""
+    now = time.time()
+    for url in urls:
+        if url not in checked or now - checked[url] >= max_age:
+            yield url
+
+
+async def check_async(
+    fetcher: Fetcher,
+    urls: Iterable[str],
+    per_host: int = DEFAULT_PER_HOST,
+    max_pending: int = LIVENESS_PENDING,
+) -> AsyncGenerator[Tuple[str, str, str], None]:
+    """Asynchronous generator, yields (url, status, final URL) triples in
+    order of completion, see :func:`check_link`.
+
+    Links are checked with :attr:`Fetcher.concurrency` requests in flight,
+    at most :param per_host: per host. :param urls: is consumed as links
+    are checked, with at most :param max_pending: links waiting for their
+    host, so that links to a busy host do not hold back the others.
+    """
+    hosts: Dict[str, asyncio.Semaphore] = defaultdict(
+        lambda: asyncio.Semaphore(per_host)
+    )
+    slots = asyncio.Semaphore(max_pending)
+    checks: Set[asyncio.Future] = set()
+    done: asyncio.Queue = asyncio.Queue()
+
+    async def check_one(url: str):
+        try:
+            async with hosts[urlparse(url).netloc]:
+                with fetcher.metrics.stage("check").measure() as stage:
+                    status, final_url = await fetcher.submit_request(
+                        url, check_link, fetcher.session, url
+                    )
+                    if not status.isdigit() or int(status) >= 400:
+                        stage.error(status)
+            await done.put((url, status, final_url))
+        except Exception as exception:
+            done.put_nowait(exception)  # re-raised below
+        finally:
+            slots.release()
+
+    async def produce():
+        try:
+            for url in urls:
+                await slots.acquire()
+                task = asyncio.ensure_future(check_one(url))
+                checks.add(task)
+                task.add_done_callback(checks.discard)
+            await asyncio.gather(*checks)
+        except Exception as exception:
+            done.put_nowait(exception)  # re-raised below
+        finally:
+            done.put_nowait(None)
+
+    producer = asyncio.ensure_future(produce())
+    try:
+        while True:
+            o = await done.get()
+            if o is None:
+                break
+            elif isinstance(o, Exception):
+                raise o
+            yield o
+    finally:
+        tasks = [producer, *checks]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def check(
+    fetcher: Fetcher,
+    urls: Iterable[str],
+    table: LivenessTable,
+    num_links: Optional[int] = None,
+    max_age: float = LIVENESS_MAX_AGE,
+    per_host: int = DEFAULT_PER_HOST,
+    show_progress: bool = True,
+) -> int:
+    """Check the first :param num_links: (all if None) links of
+    :param urls: that are stale in :param table:, and record their status.
+    Return the number of links checked."""
+    stale = stale_links(urls, table.checked(), max_age)
+    if num_links is not None:
+        stale = (url for _, url in zip(range(num_links), stale))
+    checked = 0
+    for url, status, final_url in tqdm(
+        fetcher.iterate(check_async(fetcher, stale, per_host)),
+        unit="link",
+        disable=not show_progress,
+    ):
+        table.put(url, status, final_url)
+        checked += 1
+    return checked
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Check whether the publication and archive links of the "
+        f"publications file are alive, recording their status in "
+        f"{LIVENESS_FILENAME}. Only the links not checked recently are "
+        "checked."
+    )
+    parser.add_argument(
+        "dir",
+        metavar="DIR",
+        help=f"directory of {PUBLICATIONS_FILENAME}, and of the status table",
+        type=lambda p: Path(p).absolute(),
+        default=DATA_DIR,
+        nargs="?",
+    )
+    parser.add_argument(
+        "-n",
+        "--lines",
+        metavar="N",
+        help="number of links to check",
+        type=check_non_negative,
+        default=None,
+    )
+    parser.add_argument(
+        "--max-age",
+        metavar="DAYS",
+        help="re-check the links checked at least DAYS days ago, 0 for all "
+        f"(default: {LIVENESS_MAX_AGE / 24 / 3600:g})",
+        type=check_non_negative_float,
+        default=LIVENESS_MAX_AGE / 24 / 3600,
+    )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        metavar="N",
+        help=f"maximum number of requests in flight (default: {LIVENESS_CONCURRENCY})",
+        type=check_positive,
+        default=LIVENESS_CONCURRENCY,
+    )
+    parser.add_argument(
+        "--per-host",
+        metavar="N",
+        help=f"maximum number of requests in flight to the same host (default: {DEFAULT_PER_HOST})",
+        type=check_positive,
+        default=DEFAULT_PER_HOST,
+    )
+    parser.add_argument(
+        "--rate",
+        metavar="R",
+        help=f"maximum number of requests per second to the same host, 0 for no limit (default: {DEFAULT_RATE:g})",
+        type=check_non_negative_float,
+        default=DEFAULT_RATE,
+    )
+    parser.add_argument(
+        "-np",
+        "--no-progress",
+        dest="show_progress",
+        help="hide progress bar",
+        action="store_false",
+        default=True,
+    )
+    args = parser.parse_args()
+    if not (args.dir / PUBLICATIONS_FILENAME).exists():
+        parser.error(f"{args.dir / PUBLICATIONS_FILENAME} does not exist")
+
+    with LivenessTable(
+        args.dir / LIVENESS_FILENAME
+    ) as table, requests.Session() as session, Fetcher(
+        session, args.concurrency, rate=args.rate, parse_workers=0
+    ) as fetcher:
+        checked = check(
+            fetcher,
+            read_links(args.dir / PUBLICATIONS_FILENAME),
+            table,
+            args.lines,
+            args.max_age * 24 * 3600,
+            args.per_host,
+            args.show_progress,
+        )
+        print(f"Checked {checked} links")
+        for status, count in table.counts().items():
+            print(f"{status:>24} {count:>8}")
+        print(fetcher.throttle.summary())
+        print(fetcher.metrics.summary())
+    print(memory_summary())
@@ -0,0 +1,91 @@
+import argparse
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+from scrape import columnar
+from scrape.journal import Journal
+from scrape.scraping import read_entries, write
+from scrape.util import (
+    DEFAULT_BATCH_SIZE,
+    JOURNAL_FILENAME,
+    POSTS_FILENAME,
+    Annotation,
+    Post,
+    Publication,
+)
+from scrape.writer import finish_replace
+
+logger = logging.getLogger(__name__)
+
+
+def merge(
+    dirs: Iterable[Path],
+) -> List[Tuple[Post, Annotation, List[Publication]]]:
+    """Entries of the output files in :param dirs:, each entry once (from
+    the first directory), newest first. Entries of the same date keep their
+    order within each directory."""
+    entries: Dict[str, Tuple[Post, Annotation, List[Publication]]] = {}
+    for out_dir in dirs:
+        duplicates = 0
+        for entry in read_entries(out_dir):
+            if entry[0].id in entries:
+                duplicates += 1
+            else:
+                entries[entry[0].id] = entry
+        if duplicates > 0:
+            logger.warning(f"Skipped {duplicates} duplicates in {out_dir}")
+    # Stable sort, the listing is ordered newest first
+    return sorted(entries.values(), key=lambda e: e[0].date, reverse=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Merge the output files of shards scraped with --shard "
+        "into one data package."
+    )
+    parser.add_argument(
+        "out_dir",
+        metavar="OUT",
+        help="output directory, whose files are replaced",
+        type=lambda p: Path(p).absolute(),
+    )
+    parser.add_argument(
+        "dirs",
+        metavar="DIR",
+        help="output directory of a shard",
+        type=lambda p: Path(p).absolute(),
+        nargs="+",
+    )
+    parser.add_argument(
+        "--parquet",
+        help="also convert the merged files to Parquet (requires pyarrow)",
+        action="store_true",
+        default=False,
+    )
+    args = parser.parse_args()
+    for out_dir in args.dirs:
+        if not (out_dir / POSTS_FILENAME).exists():
+            parser.error(f"{out_dir / POSTS_FILENAME} does not exist")
+    if args.parquet:
+        try:
+            columnar.check_available()
+        except ImportError as error:
+            parser.error(str(error))
+
+    entries = merge(args.dirs)
+    args.out_dir.mkdir(parents=True, exist_ok=True)
+    finish_replace(args.out_dir, args.out_dir / JOURNAL_FILENAME)
+    # Journal the merged entries, so that later runs resume from them
+    with Journal(args.out_dir / JOURNAL_FILENAME, fresh=True) as journal:
+        write(
+            out_dir=args.out_dir,
+            overwrite=True,
+            num_entries=None,
+            gen=iter(entries),
+            journal=journal,
+            batch_size=max(len(entries), DEFAULT_BATCH_SIZE),
+        )
+    if args.parquet:
+        columnar.convert(args.out_dir)
+    print(f"Merged {len(entries)} entries from {len(args.dirs)} directories")
@@ -0,0 +1,289 @@
+import json
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from scrape.util import LATENCY_BUCKETS, METRICS_INTERVAL, tmp_path
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+class Stage:
+    """Counts the items, bytes, errors and time spent in a stage of the
+    pipeline, with a histogram of the time per item."""
+
+    name: str
+    count: int = 0
+    bytes: int = 0
+    seconds: float = 0.0
+    max: float = 0.0
+    first: Optional[float] = None
+    last: Optional[float] = None
+
+    def __init__(self, name: str):
+        self.name = name
+        # Items per bucket of LATENCY_BUCKETS, the last one for larger times
+        self.buckets: List[int] = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    @contextmanager
+    def measure(self):
+        """Context manager measuring the processing of one item, counting
+        exceptions as errors."""
+        start = time.perf_counter()
+        if self.first is None:
+            self.first = start
+        try:
+            yield self
+        except Exception as exception:
+            self.error(type(exception).__name__)
+            raise
+        finally:
+            self.last = time.perf_counter()
+            self.observe(self.last - start)
+
+    def observe(self, seconds: float):
+        self.count += 1
+        self.seconds += seconds
+        self.max = max(self.max, seconds)
+        self.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+
+    def add_bytes(self, num_bytes: int):
+        self.bytes += num_bytes
+
+    def error(self, kind: str):
+        """Count an error of type :param kind: (exception or status)."""
+        self.errors[kind] += 1
+
+    @property
+    def elapsed(self) -> float:
+        """Wall-clock time between the first and last item."""
+        if self.first is None or self.last is None:
+            return 0.0
+        return self.last - self.first
+
+    @property
+    def throughput(self) -> float:
+        """Items per second of wall-clock time."""
+        return self.count / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def mean(self) -> float:
+        """Mean time per item, in seconds."""
+        return self.seconds / self.count if self.count > 0 else 0.0
+
+    def percentile(self, q: float) -> float:
+        """Time per item below which :param q: percent of items fall, in
+        seconds, interpolated within its histogram bucket."""
+        if self.count == 0:
+            return 0.0
+        rank = q / 100 * self.count
+        below = 0
+        for i, count in enumerate(self.buckets):
+            if count > 0 and below + count >= rank:
+                lower = LATENCY_BUCKETS[i - 1] if i > 0 else 0.0
+                upper = (
+                    LATENCY_BUCKETS[i]
+                    if i < len(LATENCY_BUCKETS)
+                    else self.max
+                )
+                upper = min(upper, self.max)
+                return lower + (upper - lower) * (rank - below) / count
+            below += count
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "bytes": self.bytes,
+            "seconds": self.seconds,
+            "throughput": self.throughput,
+            "mean": self.mean,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max,
+            "errors": dict(self.errors),
+            "buckets": dict(
+                zip([*map(str, LATENCY_BUCKETS), "+Inf"], self.buckets)
+            ),
+        }
+
+
+class Metrics:
+    """Collection of named :class:`Stage`, in order of creation."""
+
+    def __init__(self):
+        self.stages: Dict[str, Stage] = {}
+
+    def stage(self, name: str) -> Stage:
+        if name not in self.stages:
+            self.stages[name] = Stage(name)
+        return self.stages[name]
+
+    def summary(self) -> str:
+        lines = [
+            f"{'stage':<10} {'items':>8} {'MB':>8} {'items/s':>9} "
+            f"{'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}"
+        ]
+        errors = []
+        for stage in list(self.stages.values()):
+            lines.append(
+                f"{stage.name:<10} {stage.count:>8} "
+                f"{stage.bytes / 1e6:>8.1f} {stage.throughput:>9.1f} "
+                f"{stage.mean * 1e3:>9.1f} "
+                f"{stage.percentile(50) * 1e3:>9.1f} "
+                f"{stage.percentile(99) * 1e3:>9.1f} "
+                f"{sum(stage.errors.values()):>7}"
+            )
+            errors.extend(
+                f"  {stage.name}: {count} {kind}"
+                for kind, count in sorted(stage.errors.items())
+            )
+        if errors:
+            lines.append("errors:")
+            lines.extend(errors)
+        return "\n".join(lines)
+
+    def to_dict(self) -> dict:
+        return {
+            "time": time.time(),
+            "peak_rss_bytes": peak_rss(),
+            "stages": {
+                stage.name: stage.to_dict()
+                for stage in list(self.stages.values())
+            },
+        }
+
+    def to_prometheus(self) -> str:
+        """Metrics in the Prometheus text exposition format."""
+        stages = list(self.stages.values())
+        lines = [
+            "# HELP scrape_stage_items_total Items processed by a stage.",
+            "# TYPE scrape_stage_items_total counter",
+        ]
+        lines.extend(
+            f'scrape_stage_items_total{{stage="{s.name}"}} {s.count}'
+            for s in stages
+        )
+        lines += [
+            "# HELP scrape_stage_bytes_total Bytes processed by a stage.",
+            "# TYPE scrape_stage_bytes_total counter",
+        ]
+        lines.extend(
+            f'scrape_stage_bytes_total{{stage="{s.name}"}} {s.bytes}'
+            for s in stages
+        )
+        lines += [
+            "# HELP scrape_stage_errors_total Errors in a stage, by type.",
+            "# TYPE scrape_stage_errors_total counter",
+        ]
+        for s in stages:
+            for kind, count in sorted(s.errors.items()):
+                kind = kind.replace("\\", "\\\\").replace('"', '\\"')
+                lines.append(
+                    f'scrape_stage_errors_total{{stage="{s.name}",'
+                    f'type="{kind}"}} {count}'
+                )
+        lines += [
+            "# HELP scrape_stage_seconds Time per item of a stage.",
+            "# TYPE scrape_stage_seconds histogram",
+        ]
+        for s in stages:
+            cumulative = 0
+            for bound, count in zip([*LATENCY_BUCKETS, "+Inf"], s.buckets):
+                cumulative += count
+                lines.append(
+                    f'scrape_stage_seconds_bucket{{stage="{s.name}",'
+                    f'le="{bound}"}} {cumulative}'
+                )
+            lines.append(
+                f'scrape_stage_seconds_sum{{stage="{s.name}"}} {s.seconds}'
+            )
+            lines.append(
+                f'scrape_stage_seconds_count{{stage="{s.name}"}} {s.count}'
+            )
+        rss = peak_rss()
+        if rss is not None:
+            lines += [
+                "# HELP scrape_peak_rss_bytes Peak resident set size.",
+                "# TYPE scrape_peak_rss_bytes gauge",
+                f"scrape_peak_rss_bytes {rss}",
+            ]
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: Path):
+        """Write the metrics to :param path:, in the Prometheus text format
+        if its suffix is .prom or .txt, as JSON otherwise. The file is
+        replaced at once, so that readers never see a partial file."""
+        if path.suffix in (".prom", ".txt"):
+            text = self.to_prometheus()
+        else:
+            text = json.dumps(self.to_dict(), indent=2) + "\n"
+        with open(tmp_path(path), "w", encoding="utf-8") as file:
+            file.write(text)
+        os.replace(tmp_path(path), path)
+
+
+class MetricsWriter:
+    """Writes :attr:`metrics` to :attr:`path` every :attr:`interval`
+    seconds from a background thread, and once more when stopped."""
+
+    def __init__(
+        self,
+        metrics: Metrics,
+        path: Path,
+        interval: float = METRICS_INTERVAL,
+    ):
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.metrics.write(self.path)
+            except (OSError, RuntimeError):
+                # Stages changed while being read, or transient I/O error
+                continue
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+        self.metrics.write(self.path)
+
+
+def peak_rss(children: bool = False) -> Optional[int]:
+    """Peak resident set size in bytes of this process, or of its largest
+    terminated child process if :param children:, None if unknown."""
+    if resource is None:
+        return None
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    max_rss = resource.getrusage(who).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def memory_summary() -> str:
+    rss, children_rss = peak_rss(), peak_rss(children=True)
+    if rss is None:
+        return "Peak memory: unknown"
+    return (
+        f"Peak memory: {rss / 1e6:.1f} MB "
+        f"(largest worker process: {children_rss / 1e6:.1f} MB)"
+    )
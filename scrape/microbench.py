@@ -0,0 +1,270 @@
+import argparse
+import gc
+import json
+import logging
+import platform
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from scrape.parsers import PARSERS, Parser, labels_outside
+from scrape.report import Report, Row
+from scrape.scraping import translate
+from scrape.util import (
+    MICROBENCH_MIN_TIME,
+    MICROBENCH_REPEAT,
+    REGRESSION_TOLERANCE,
+    check_non_negative_float,
+    check_positive,
+)
+
+# Function called with its arguments, prepared outside of the timings
+Case = namedtuple("Case", ["name", "func", "args"])
+
+
+def cases(parser: Parser, fixtures_dir: Path) -> List[Case]:
+    """Cases of each parser path of :param parser: on the recorded pages in
+    :param fixtures_dir:, each report page as a report of the first row of
+    the listing page."""
+    listing_html = (fixtures_dir / "listing.html").read_text("utf-8")
+    soup = parser.soup(listing_html, parser.listing_strainer)
+    post = soup.find(attrs={"class": "disinfo-db-post"})
+    row = parser.rows(listing_html)[0]
+    cases_ = [
+        Case("listing", parser.listing, (listing_html,)),
+        Case("Row.__init__", Row, (post,)),
+        Case(
+            "Row.get_strings_for_col",
+            Row.get_strings_for_col,
+            (post, "Outlets"),
+        ),
+    ]
+    for path in sorted(fixtures_dir.glob("report*.html")):
+        html = path.read_text("utf-8")
+        soup = parser.soup(html, parser.report_strainer)
+        if labels_outside(html, soup):
+            soup = parser.soup(html, None)
+        report = parser.report(row.id, html)
+        report.set_resolved({link: link for link in report.links})
+        cases_ += [
+            Case(f"report[{path.stem}]", parser.report, (row.id, html)),
+            Case(
+                f"Report.__init__[{path.stem}]", Report, (row.id, soup, None)
+            ),
+            Case(f"content_hash[{path.stem}]", parser.content_hash, (html,)),
+            Case(f"translate[{path.stem}]", translate, (row, report)),
+        ]
+    return cases_
+
+
+def measure(
+    case: Case,
+    min_time: float = MICROBENCH_MIN_TIME,
+    repeat: int = MICROBENCH_REPEAT,
+) -> Dict[str, float]:
+    """Time per call of :param case: (the best of :param repeat: timings of
+    at least :param min_time: seconds each), and memory of a single call as
+    traced by :mod:`tracemalloc`: peak, retained by the result, and number
+    of blocks allocated and not freed by the end of the call."""
+    func, args = case.func, case.args
+    func(*args)  # warm up caches, e.g. compiled regular expressions
+    # Disable the garbage collector during timings, as timeit does
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        number = 1
+        while True:
+            start = time.perf_counter()
+            for _ in range(number):
+                func(*args)
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+            number *= 2 if elapsed == 0 else max(2, int(min_time / elapsed))
+        best = elapsed
+        for _ in range(repeat - 1):
+            start = time.perf_counter()
+            for _ in range(number):
+                func(*args)
+            best = min(best, time.perf_counter() - start)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    tracemalloc.start()
+    try:
+        result = func(*args)
+        retained, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+    del result
+    allocations = sum(s.count for s in snapshot.statistics("filename"))
+    return {
+        "ns_per_op": best / number * 1e9,
+        "allocations": allocations,
+        "peak_kb": peak / 1e3,
+        "retained_kb": retained / 1e3,
+    }
+
+
+def run(
+    parsers: List[Parser],
+    fixtures_dir: Path,
+    pattern: str = "",
+    min_time: float = MICROBENCH_MIN_TIME,
+    repeat: int = MICROBENCH_REPEAT,
+) -> Dict[str, Dict[str, float]]:
+    """Measure the cases of :param parsers: whose name contains
+    :param pattern:, by "parser:case" name."""
+    results = {}
+    for parser in parsers:
+        for case in cases(parser, fixtures_dir):
+            name = f"{parser.name}:{case.name}"
+            if pattern in name:
+                results[name] = measure(case, min_time, repeat)
+    return results
+
+
+def regressions(
+    results: Dict[str, Dict[str, float]],
+    baseline: Dict[str, Dict[str, float]],
+    tolerance: float = REGRESSION_TOLERANCE,
+) -> List[str]:
+    """Names of the cases more than :param tolerance: slower than in
+    :param baseline:, in time per call, allocations or peak memory."""
+    return [
+        name
+        for name, result in results.items()
+        if name in baseline
+        and any(
+            result[key] > baseline[name][key] * (1 + tolerance)
+            for key in ("ns_per_op", "allocations", "peak_kb")
+        )
+    ]
+
+
+def summary(
+    results: Dict[str, Dict[str, float]],
+    baseline: Optional[Dict[str, Dict[str, float]]] = None,
+) -> str:
+    width = max([len(name) for name in results] + [4])
+    lines = [
+        f"{'case':<{width}} {'ns/op':>12} {'allocs':>8} {'peak KB':>9} "
+        f"{'kept KB':>9}" + ("" if baseline is None else f" {'vs base':>8}")
+    ]
+    for name, result in results.items():
+        line = (
+            f"{name:<{width}} {result['ns_per_op']:>12,.0f} "
+            f"{result['allocations']:>8} {result['peak_kb']:>9.1f} {result['retained_kb']:>9.1f}"
+        )
+        if baseline is not None:
+            if name in baseline:
+                ratio = result["ns_per_op"] / baseline[name]["ns_per_op"]
+                line += f" {ratio - 1:>+8.1%}"
+            else:
+                line += f" {'new':>8}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    available = [name for name, p in PARSERS.items() if p.available()]
+    parser = argparse.ArgumentParser(
+        description="Benchmark the parsing of the recorded pages, per "
+        "function: time per call, allocations, peak memory and memory kept "
+        "by the result."
+    )
+    parser.add_argument(
+        "--parser",
+        help="HTML parser backend, repeatable (default: all installed)",
+        choices=available,
+        action="append",
+        default=None,
+    )
+    parser.add_argument(
+        "-k",
+        metavar="PATTERN",
+        dest="pattern",
+        help="only run the cases whose name contains PATTERN",
+        default="",
+    )
+    parser.add_argument(
+        "--fixtures",
+        metavar="DIR",
+        help="directory of the recorded pages (default: tests/fixtures)",
+        type=lambda p: Path(p).absolute(),
+        default=Path(__file__).absolute().parent.parent / "tests" / "fixtures",
+    )
+    parser.add_argument(
+        "--min-time",
+        metavar="S",
+        help=f"minimum duration of a timing in seconds (default: {MICROBENCH_MIN_TIME:g})",
+        type=check_non_negative_float,
+        default=MICROBENCH_MIN_TIME,
+    )
+    parser.add_argument(
+        "--repeat",
+        metavar="N",
+        help=f"number of timings, the best is kept (default: {MICROBENCH_REPEAT})",
+        type=check_positive,
+        default=MICROBENCH_REPEAT,
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        metavar="FILE",
+        help="write the results to FILE as JSON, e.g. to use as a baseline",
+        type=Path,
+        default=None,
+    )
+    parser.add_argument(
+        "--baseline",
+        metavar="FILE",
+        help="compare with the results saved in FILE, exit with status 1 on "
+        "regressions",
+        type=Path,
+        default=None,
+    )
+    parser.add_argument(
+        "--tolerance",
+        metavar="F",
+        help="fraction of slowdown (or memory increase) over the baseline "
+        f"reported as a regression (default: {REGRESSION_TOLERANCE:g})",
+        type=check_non_negative_float,
+        default=REGRESSION_TOLERANCE,
+    )
+    args = parser.parse_args()
+    baseline = None
+    if args.baseline is not None:
+        try:
+            baseline = json.loads(args.baseline.read_text("utf-8"))["results"]
+        except (OSError, ValueError, KeyError) as error:
+            parser.error(f"cannot read baseline {args.baseline}: {error}")
+
+    # The edge cases log missing data on every call
+    logging.disable(logging.WARNING)
+    results = run(
+        [PARSERS[name] for name in args.parser or available],
+        args.fixtures,
+        args.pattern,
+        args.min_time,
+        args.repeat,
+    )
+    print(summary(results, baseline))
+    if args.output is not None:
+        config = {
+            "python": platform.python_version(),
+            "min_time": args.min_time,
+            "repeat": args.repeat,
+        }
+        output = json.dumps({"config": config, "results": results}, indent=2)
+        args.output.write_text(output + "\n", encoding="utf-8")
+    if baseline is not None:
+        slower = regressions(results, baseline, args.tolerance)
+        if slower:
+            print(f"Regressions over {args.tolerance:.0%}:")
+            print("\n".join(f"  {name}" for name in slower))
+            sys.exit(1)
@@ -0,0 +1,277 @@
+import argparse
+import random
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from scrape.util import check_non_negative, check_non_negative_float
+
+LISTING_PATH = "/disinformation-cases"
+SITEMAP_PATH = "/sitemap_index.xml"
+# Largest page size served, as the site caps the page size
+MAX_PER_PAGE = 100
+# Date of the newest entry, one entry per day before
+NEWEST_DATE = date(2021, 2, 18)
+
+
+def listing_page(base: str, total: int, offset: int, per_page: int) -> str:
+    """Listing page in the markup of the euvsdisinfo.eu database, see the
+    recorded pages in tests/fixtures."""
+    rows = []
+    for i in range(offset, min(offset + per_page, total)):
+        day = NEWEST_DATE - timedelta(days=i // 10)
+        rows.append(
+            '<tr class="disinfo-db-post">\n'
+            f'  <td data-column="Date">{day:%d.%m.%Y}</td>\n'
+            f'  <td data-column="Title"><a href="{base}/report/{i}/">'
+            f"Report {i}</a></td>\n"
+            f'  <td data-column="Outlets"><span>Outlet {i % 13}</span> '
+            "<span>TASS - Russian</span></td>\n"
+            '  <td data-column="Country">Russia, Germany</td>\n'
+            "</tr>\n"
+        )
+    return (
+        '<!DOCTYPE html>\n<html lang="en">\n<body>\n'
+        f'<div class="disinfo-db-results"><span>{total}</span> results '
+        "found</div>\n"
+        '<table class="disinfo-db-table">\n<tbody>\n'
+        f"{''.join(rows)}</tbody>\n</table>\n</body>\n</html>\n"
+    )
+
+
+def report_page(base: str, i: int, links: int) -> str:
+    """Report page in the markup of the euvsdisinfo.eu database, with
+    :param links: links in the summary and disproof, some of them shared
+    with other reports."""
+    summary = " ".join(
+        f'<a href="{base}/link/{i * links + n if n % 2 else n}">link</a>'
+        for n in range(links)
+    )
+    return (
+        '<!DOCTYPE html>\n<html lang="en">\n<body>\n<main>\n'
+        f'<div class="b-report__header"><h1>Report {i}</h1></div>\n'
+        '<ul class="b-report__details-list">\n'
+        "  <li><b>Language/target audience:</b> Russian, German</li>\n"
+        f"  <li><b>Keywords:</b> Keyword {i % 17}, Alexei Navalny</li>\n"
+        "</ul>\n"
+        '<div class="b-report__summary"><h3>Summary</h3>\n'
+        '  <div class="b-report__summary-text">'
+        f"<p>Summary of report {i}, see {summary}.</p></div>\n"
+        "</div>\n"
+        '<div class="b-report__disproof"><h3>Disproof</h3>\n'
+        '  <div class="b-report__disproof-text">'
+        f'<p>A recurring <a href="{base}/link/{i % 7}">narrative</a>.</p>'
+        "</div>\n</div>\n"
+        f'<div class="b-catalog__link"><a href="{base}/publication/{i}">'
+        f'{base}/publication/{i}</a> <a href="{base}/archive/{i}">'
+        "(Archived)</a></div>\n"
+        "</main>\n</body>\n</html>\n"
+    )
+
+
+def sitemap_index(base: str) -> str:
+    """Sitemap index listing the sitemap of reports, and one of pages."""
+    sitemaps = "".join(
+        f"<sitemap><loc>{base}/{name}-sitemap.xml</loc></sitemap>\n"
+        for name in ("page", "report")
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+        f"{sitemaps}</sitemapindex>\n"
+    )
+
+
+def report_sitemap(base: str, total: int) -> str:
+    """Sitemap of the report pages, last modified on their date."""
+    urls = "".join(
+        f"<url><loc>{base}/report/{i}/</loc>"
+        f"<lastmod>{NEWEST_DATE - timedelta(days=i // 10)}T12:00:00+00:00"
+        "</lastmod></url>\n"
+        for i in range(total)
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+        f"{urls}</urlset>\n"
+    )
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "MockServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send(
+        self,
+        status: int,
+        body: str = "",
+        headers: Optional[Dict[str, str]] = None,
+        content_type: str = "text/html",
+    ):
+        headers = {} if headers is None else headers
+        content = body.encode("utf-8")
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(content)
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        server = self.server
+        time.sleep(server.delay())
+        if random.random() < server.error_rate:
+            self.send(503, headers={"Retry-After": "1"})
+            return
+        url = urlparse(self.path)
+        path = url.path.rstrip("/")
+        if path == LISTING_PATH:
+            query = parse_qs(url.query)
+            offset = int(query.get("offset", ["0"])[0])
+            per_page = min(int(query.get("per_page", ["10"])[0]), MAX_PER_PAGE)
+            self.send(
+                200,
+                listing_page(server.url, server.entries, offset, per_page),
+            )
+        elif path == SITEMAP_PATH:
+            self.send(200, sitemap_index(server.url), content_type="text/xml")
+        elif path == "/report-sitemap.xml":
+            self.send(
+                200,
+                report_sitemap(server.url, server.entries),
+                content_type="text/xml",
+            )
+        elif path.startswith("/report/"):
+            i = int(path.split("/")[-1])
+            if i >= server.entries:
+                self.send(404)
+            else:
+                self.send(200, report_page(server.url, i, server.links))
+        elif path.startswith("/link/"):
+            # Redirect, as most links go through a shortener or to HTTPS
+            self.send(
+                301, headers={"Location": f"{server.url}/final{url.path}"}
+            )
+        else:
+            self.send(200 if path.startswith("/final/") else 404)
+
+
+class MockServer(ThreadingHTTPServer):
+    """Local stand-in for euvsdisinfo.eu serving :attr:`entries` entries,
+    each linking to :attr:`links` redirecting links.
+
+    Each response is delayed by :attr:`latency` seconds plus or minus up to
+    :attr:`jitter` seconds, and is an error (503) with probability
+    :attr:`error_rate`.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: Tuple[str, int] = ("127.0.0.1", 0),
+        entries: int = 1000,
+        links: int = 4,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+    ):
+        super().__init__(address, MockHandler)
+        self.entries = entries
+        self.links = links
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def listing_url(self) -> str:
+        return self.url + LISTING_PATH
+
+    def delay(self) -> float:
+        return max(
+            0.0, self.latency + random.uniform(-self.jitter, self.jitter)
+        )
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--entries",
+        metavar="N",
+        help="number of entries served (default: %(default)s)",
+        type=check_non_negative,
+        default=1000,
+    )
+    parser.add_argument(
+        "--links",
+        metavar="N",
+        help="number of links in the summary of each entry (default: %(default)s)",
+        type=check_non_negative,
+        default=4,
+    )
+    parser.add_argument(
+        "--latency",
+        metavar="S",
+        help="delay of each response, in seconds (default: %(default)s)",
+        type=check_non_negative_float,
+        default=0.05,
+    )
+    parser.add_argument(
+        "--jitter",
+        metavar="S",
+        help="maximum random variation of the delay, in seconds (default: %(default)s)",
+        type=check_non_negative_float,
+        default=0.02,
+    )
+    parser.add_argument(
+        "--error-rate",
+        metavar="P",
+        help="probability of an error response (default: %(default)s)",
+        type=check_non_negative_float,
+        default=0.0,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Serve a local stand-in for the euvsdisinfo.eu database."
+    )
+    parser.add_argument(
+        "--port",
+        metavar="PORT",
+        help="port to listen on, 0 for any free port (default: %(default)s)",
+        type=check_non_negative,
+        default=0,
+    )
+    add_arguments(parser)
+    args = parser.parse_args()
+    server = MockServer(
+        ("127.0.0.1", args.port),
+        args.entries,
+        args.links,
+        args.latency,
+        args.jitter,
+        args.error_rate,
+    )
+    # First line of output, read by the benchmark
+    print(server.listing_url, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
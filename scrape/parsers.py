@@ -0,0 +1,174 @@
+import hashlib
+import logging
+import re
+from collections import namedtuple
+from typing import Dict, List, Optional, Tuple
+
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4.builder import builder_registry
+
+from scrape.report import (
+    KEYWORDS_LABEL,
+    LANGUAGES_LABEL,
+    MalformedDataError,
+    Report,
+    Row,
+    get_row,
+)
+
+logger = logging.getLogger(__name__)
+
+# Total number of entries (None if missing), number of rows on the page,
+# well-formed rows
+Listing = namedtuple("Listing", ["total", "size", "rows"])
+
+# Containers of the data of a report, whose content is hashed
+CONTENT_CLASSES = re.compile(r"^b-(report|catalog)__")
+CONTENT_STRAINER = SoupStrainer(attrs={"class": CONTENT_CLASSES})
+
+
+def labels_outside(html, soup: BeautifulSoup) -> bool:
+    """Whether labels of report data in :param html: are missing from
+    :param soup:, built from the report containers only."""
+    return any(
+        label in html and soup.find(string=label) is None
+        for label in (KEYWORDS_LABEL, LANGUAGES_LABEL)
+    )
+
+
+def content_hash(soup: BeautifulSoup) -> str:
+    """Hash of the text and links of the report containers in
+    :param soup:, and of the elements of its labels, insensitive to
+    whitespace and to markup changes that keep the text and links."""
+    elements = soup.find_all(attrs={"class": CONTENT_CLASSES})
+    for label in (KEYWORDS_LABEL, LANGUAGES_LABEL):
+        string = soup.find(string=label)
+        if string is not None:
+            elements.append(string.parent.parent)
+    digest = hashlib.sha256()
+    for element in elements:
+        text = re.sub(r"\s+", " ", " ".join(element.stripped_strings))
+        hrefs = " ".join(a.get("href", "") for a in element.find_all("a"))
+        digest.update(f"{text}\n{hrefs}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class Parser:
+    """Parses listing and report pages into :class:`Row` and :class:`Report`
+    with the BeautifulSoup tree builder :attr:`features`, building only the
+    elements matched by the strainers (the whole page if None).
+    Trees are decomposed once parsed: they contain reference cycles, and
+    would otherwise only be freed by the garbage collector."""
+
+    name: str = "html.parser"
+    features: str = "html.parser"
+    listing_strainer: Optional[SoupStrainer] = None
+    report_strainer: Optional[SoupStrainer] = None
+
+    def soup(self, html, strainer: Optional[SoupStrainer]) -> BeautifulSoup:
+        return BeautifulSoup(html, self.features, parse_only=strainer)
+
+    def listing(self, html) -> Listing:
+        """Parse the listing page :param html:, skipping malformed rows."""
+        soup = self.soup(html, self.listing_strainer)
+        results = soup.find(attrs={"class": "disinfo-db-results"})
+        total = None
+        if results is not None:
+            total = int(results.find("span").contents[0])
+        posts = soup.find_all(attrs={"class": "disinfo-db-post"})
+        rows = [get_row(post) for post in posts]
+        soup.decompose()
+        return Listing(total, len(posts), [r for r in rows if r is not None])
+
+    def rows(self, html) -> List[Row]:
+        return self.listing(html).rows
+
+    def report(self, id_: str, html) -> Report:
+        """Parse the report page :param html: without resolving links."""
+        soup = self.soup(html, self.report_strainer)
+        try:
+            report = Report(id_, soup, req=None)
+            report.content_hash = content_hash(soup)
+            return report
+        finally:
+            soup.decompose()
+
+    def content_hash(self, html) -> str:
+        """Hash of the content of the report page :param html:, see
+        :func:`content_hash`, building only the report containers."""
+        soup = self.soup(html, CONTENT_STRAINER)
+        if labels_outside(html, soup):
+            soup.decompose()
+            soup = self.soup(html, None)
+        try:
+            return content_hash(soup)
+        finally:
+            soup.decompose()
+
+    @classmethod
+    def available(cls) -> bool:
+        return builder_registry.lookup(cls.features) is not None
+
+
+class LxmlParser(Parser):
+    """Builds trees with lxml, restricted to the listing rows and to the
+    report and catalog containers of report pages."""
+
+    name = "lxml"
+    features = "lxml"
+    listing_strainer = SoupStrainer(
+        attrs={"class": ["disinfo-db-post", "disinfo-db-results"]}
+    )
+    report_strainer = SoupStrainer(
+        attrs={"class": re.compile(r"^b-(report|catalog)__")}
+    )
+
+    def report(self, id_: str, html) -> Report:
+        soup = self.soup(html, self.report_strainer)
+        if labels_outside(html, soup):
+            # Label outside of the containers, fall back to the whole page
+            soup.decompose()
+            soup = self.soup(html, None)
+        try:
+            report = Report(id_, soup, req=None)
+            report.content_hash = content_hash(soup)
+            return report
+        finally:
+            soup.decompose()
+
+
+PARSERS: Dict[str, Parser] = {
+    parser.name: parser for parser in (Parser(), LxmlParser())
+}
+DEFAULT_PARSER = "lxml" if LxmlParser.available() else "html.parser"
+
+
+def get_parser(name: str = DEFAULT_PARSER) -> Parser:
+    parser = PARSERS[name]
+    if not parser.available():
+        raise ValueError(f"Parser '{name}' is not installed")
+    return parser
+
+
+def parse_report(parser: Parser, id_: str, html) -> Optional[Report]:
+    """Wrapper for :meth:`Parser.report`, return None on error.
+    Logs the cause of the error where it occurs, as it is lost when the
+    error is sent back from a worker process.
+    """
+    try:
+        return parser.report(id_, html)
+    except MalformedDataError as mde:
+        logger.warning(f"WARNING: {repr(mde)} from {repr(mde.__cause__)}")
+    return None
+
+
+def parse_changed(
+    parser: Parser, id_: str, html, known_hash: Optional[str]
+) -> Tuple[str, Optional[Report]]:
+    """Hash the report page :param html:, and only parse it (with
+    :func:`parse_report`) if its hash differs from :param known_hash:.
+    Return the hash and the report, None if unchanged or malformed."""
+    hash_ = parser.content_hash(html)
+    if hash_ == known_hash:
+        return hash_, None
+    return hash_, parse_report(parser, id_, html)
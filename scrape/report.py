@@ -1,15 +1,19 @@
 import logging
 import urllib.error
 import urllib.parse
+from collections import defaultdict
 from datetime import date, datetime
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import requests
 import urllib3
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, Tag
 
 logger = logging.getLogger(__name__)
 
+KEYWORDS_LABEL = "Keywords:"
+LANGUAGES_LABEL = "Language/target audience:"
+
 
 class Row:
     date: date
@@ -21,21 +25,35 @@ class Row:
     def __init__(self, row):
         # Get basic data from database row
         try:
-            date_str = self.get_data_column(row, "Date").contents[0].strip()
+            columns = self.get_data_columns(row)
+            date_str = self.unique(columns, "Date").contents[0].strip()
             self.date = datetime.strptime(date_str, "%d.%m.%Y").date()
-            title_link = self.get_data_column(row, "Title").find("a")
+            title_link = self.unique(columns, "Title").find("a")
             self.title = title_link.contents[0].strip()
             self.id = title_link["href"]
 
-            self.outlets = self.get_strings_for_col(row, "Outlets")
-            self.countries = self.get_strings_for_col(
-                row, "Country", separator=","
+            self.outlets = self.get_strings(self.unique(columns, "Outlets"))
+            self.countries = self.get_strings(
+                self.unique(columns, "Country"), separator=","
             )
         except Exception as exception:
             raise MalformedDataError(
                 "Malformed row error", self.id
             ) from exception
 
+    @classmethod
+    def get_data_columns(cls, soup: BeautifulSoup) -> Dict[str, List[Tag]]:
+        """Map the name of each data column to its elements, in one pass."""
+        data_columns = defaultdict(list)
+        for data_col in soup.find_all(None, attrs={"data-column": True}):
+            data_columns[data_col["data-column"]].append(data_col)
+        return data_columns
+
+    @staticmethod
+    def unique(data_columns: Dict[str, List[Tag]], data_col) -> Tag:
+        assert len(data_columns[data_col]) == 1
+        return data_columns[data_col][0]
+
     @classmethod
     def get_data_column(cls, soup: BeautifulSoup, data_col):
         data_columns = soup.find_all(None, attrs={"data-column": data_col})
@@ -46,7 +64,10 @@ class Row:
     def get_strings_for_col(
         cls, soup: BeautifulSoup, col_name: str, separator=None
     ) -> List[str]:
-        data_col = cls.get_data_column(soup, col_name)
+        return cls.get_strings(cls.get_data_column(soup, col_name), separator)
+
+    @staticmethod
+    def get_strings(data_col: Tag, separator=None) -> List[str]:
         strings = [str(s).strip() for s in data_col.strings]
         if separator is not None:
             strings = [
@@ -65,10 +86,18 @@ class Report:
     summary_links_resolved: List[str] = []
     disproof_links: List[str] = []
     disproof_links_resolved: List[str] = []
+    summary_hrefs: List[str] = []
+    disproof_hrefs: List[str] = []
     languages: List[str] = []
     publications: List[Tuple[str, str]] = []
+    # Hash of the content of the page, see parsers.content_hash
+    content_hash: Optional[str] = None
 
     def __init__(self, id_, report, req=requests):
+        """Parse :param report:, resolving links with :param req:.
+        If :param req: is None, links are left unresolved, see
+        :meth:`set_resolved`.
+        """
         self.id = id_
 
         # Get keywords, summary, disproof from report page
@@ -77,7 +106,7 @@ class Report:
                 self.keywords = [
                     k.strip()
                     for k in report.find(
-                        text="Keywords:"
+                        text=KEYWORDS_LABEL
                     ).parent.next.next.split(",")
                 ]
             except AttributeError:
@@ -88,11 +117,13 @@ class Report:
                 )
                 self.summary = summary_container.text.strip()
                 links = [a["href"] for a in summary_container.find_all("a")]
+                self.summary_hrefs = links
                 self.summary_links = [self.url_encode(link) for link in links]
-                self.summary_links_resolved = [
-                    self.url_encode(self.resolve_link(req, link))
-                    for link in links
-                ]
+                if req is not None:
+                    self.summary_links_resolved = [
+                        self.url_encode(self.resolve_link(req, link))
+                        for link in links
+                    ]
             except AttributeError:
                 self.warn_missing("summary")
             try:
@@ -101,11 +132,13 @@ class Report:
                 )
                 self.disproof = disproof_container.text.strip()
                 links = [a["href"] for a in disproof_container.find_all("a")]
+                self.disproof_hrefs = links
                 self.disproof_links = [self.url_encode(link) for link in links]
-                self.disproof_links_resolved = [
-                    self.url_encode(self.resolve_link(req, link))
-                    for link in links
-                ]
+                if req is not None:
+                    self.disproof_links_resolved = [
+                        self.url_encode(self.resolve_link(req, link))
+                        for link in links
+                    ]
             except AttributeError:
                 self.warn_missing("disproof")
         except Exception as exception:
@@ -114,11 +147,9 @@ class Report:
         # Get data on publications from report page
         try:
             try:
+                languages = report.find(text=LANGUAGES_LABEL).next
                 self.languages = [
-                    lang.strip()
-                    for lang in report.find(
-                        text="Language/target audience:"
-                    ).next.split(",")
+                    lang.strip() for lang in languages.split(",")
                 ]
             except AttributeError:
                 self.warn_missing("languages")
@@ -133,6 +164,29 @@ class Report:
         except Exception as exception:
             self.warn_missing(repr(exception))
 
+    @classmethod
+    def empty(cls, id_: str) -> "Report":
+        """Report of :param id_: without any data, for entries scraped from
+        the listing only."""
+        report = cls.__new__(cls)
+        report.id = id_
+        return report
+
+    @property
+    def links(self) -> List[str]:
+        """Links in summary and disproof, in order of appearance."""
+        return self.summary_hrefs + self.disproof_hrefs
+
+    def set_resolved(self, resolved: Dict[str, str]):
+        """Fill in resolved links from the mapping :param resolved: of each
+        link in :attr:`links` to the result of :meth:`resolve_link`."""
+        self.summary_links_resolved = [
+            self.url_encode(resolved[link]) for link in self.summary_hrefs
+        ]
+        self.disproof_links_resolved = [
+            self.url_encode(resolved[link]) for link in self.disproof_hrefs
+        ]
+
     def warn_missing(self, name: str):
         self.warn(f"Missing data '{name}' for {self.id}")
 
@@ -185,7 +239,10 @@ def get_report(session, row: Row) -> Optional[Tuple[Row, Report]]:
     """
     try:
         report = BeautifulSoup(session.get(row.id).text, "html.parser")
-        return row, Report(row.id, report, req=session)
+        try:
+            return row, Report(row.id, report, req=session)
+        finally:
+            report.decompose()
     except MalformedDataError as mde:
         logger.warning(f"WARNING: {repr(mde)} from {repr(mde.__cause__)}")
     return None
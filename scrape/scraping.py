@@ -1,53 +1,258 @@
+import asyncio
 import functools
 import logging
-from csv import DictWriter
+import zlib
+from collections import defaultdict, deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from csv import DictReader
+from datetime import date
 from itertools import islice
-from multiprocessing.dummy import Pool
 from pathlib import Path
-from typing import Collection, Generator, Iterator, List, Optional, Tuple
+from typing import (
+    AsyncGenerator,
+    AsyncIterable,
+    Callable,
+    Collection,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
 import pandas as pd
 from bs4 import BeautifulSoup
 
-from scrape.report import Report, Row, get_report, get_row
+from scrape.archive import (
+    is_listing,
+    latest_pages,
+    listing_offset,
+    parse_archived_report,
+    parse_listing,
+)
+from scrape.cache import LinkCache, ReportIndex, ReportVersion
+from scrape.fetch import Fetcher
+from scrape.journal import Journal
+from scrape.links import LinkResolver
+from scrape.metrics import Metrics
+from scrape.parsers import (
+    Listing,
+    Parser,
+    get_parser,
+    parse_changed,
+    parse_report,
+)
+from scrape.report import MalformedDataError, Report, Row
+from scrape.store import SqliteWriter
 from scrape.util import (
     ANNOTATIONS_FILENAME,
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_FLUSH_INTERVAL,
+    DEFAULT_PREFETCH,
+    KEY_FIELDS,
+    LIST_FIELDS,
+    LISTING_FIELDS,
+    PER_PAGE_CANDIDATES,
     POSTS_FILENAME,
     PUBLICATIONS_FILENAME,
+    RESOLVED_FIELDS,
     URL,
     Annotation,
     Post,
     Publication,
-    stringify,
+    str2list,
 )
+from scrape.writer import BatchWriter, OutputWriter
 
 # file deepcode ignore BinaryWrite:
 
 logger = logging.getLogger(__name__)
 
+UNRESOLVED = "Unresolved"  # link not in the link cache
+
+# Entry that could not be scraped, recorded in the journal
+Failed = namedtuple("Failed", ["id", "reason"])
+
+
+async def all_rows(
+    fetcher: Fetcher,
+    prefetch: int = DEFAULT_PREFETCH,
+    parser: Parser = get_parser(),
+    stop: Optional[Callable[[Listing], bool]] = None,
+    url: str = URL,
+) -> AsyncGenerator[Row, None]:
+    """Asynchronous generator, yields all rows in order of the listing at
+    :param url:.
+    After a first page determining the page size and the number of entries,
+    up to :param prefetch: listing pages are fetched concurrently; if the
+    number of entries is unknown, pages are fetched one at a time until a
+    short page.
+    If :param stop: is given, stops after the first page for which it is
+    true, see :func:`seen_before`; pages are then fetched one at a time, as
+    the next one is likely not needed.
+    """
+    per_page, first = await get_first_page(fetcher, parser, url)
+    for row in first.rows:
+        yield row
+    if first.size < per_page or (stop is not None and stop(first)):
+        return
+
+    if stop is not None:
+        prefetch = 1
+
+    async def get_page(offset: int) -> Listing:
+        return await get_listing(fetcher, parser, offset, per_page, url)
+
+    total = per_page if first.total is None else first.total
+    offsets = iter(range(per_page, total, per_page))
+    window: Deque[asyncio.Future] = deque()
+    page = first
+    try:
+        while True:
+            for offset in islice(offsets, prefetch - len(window)):
+                window.append(asyncio.ensure_future(get_page(offset)))
+            if len(window) == 0:
+                break
+            page = await window.popleft()
+            for row in page.rows:
+                yield row
+            if stop is not None and stop(page):
+                return
+        # Pick up entries added since the first page, one page at a time
+        offset = max(total, per_page)
+        while page.size == per_page:
+            page = await get_page(offset)
+            for row in page.rows:
+                yield row
+            if stop is not None and stop(page):
+                return
+            offset += per_page
+    finally:
+        for future in window:
+            future.cancel()
+
+
+def in_shard(id_: str, shard: Optional[Tuple[int, int]]) -> bool:
+    """Whether entry :param id_: belongs to :param shard: (index, count),
+    assigned by a hash of the id, stable across runs and machines unlike
+    listing offsets. All entries belong to shard None."""
+    if shard is None:
+        return True
+    index, count = shard
+    return zlib.crc32(id_.encode("utf-8")) % count == index
+
+
+async def known_rows(
+    rows: AsyncIterable[Row], known_ids: Collection[str]
+) -> AsyncGenerator[Row, None]:
+    """Asynchronous generator, yields the :param rows: of :param known_ids:."""
+    async for row in rows:
+        if row.id in known_ids:
+            yield row
+
+
+async def shard_rows(
+    rows: AsyncIterable[Row], shard: Optional[Tuple[int, int]]
+) -> AsyncGenerator[Row, None]:
+    """Asynchronous generator, yields the :param rows: in :param shard:."""
+    async for row in rows:
+        if in_shard(row.id, shard):
+            yield row
+
+
+def seen_before(
+    known_ids: Collection[str],
+    newest: Optional[date],
+    shard: Optional[Tuple[int, int]] = None,
+) -> Callable[[Listing], bool]:
+    """Stopping criterion for :func:`all_rows`, true for a page of rows
+    that are all known, or all older than :param newest:. As the listing is
+    ordered newest first, the following pages are known as well.
+    Only rows in :param shard: are considered, see :func:`in_shard`."""
+
+    def stop(page: Listing) -> bool:
+        rows = [row for row in page.rows if in_shard(row.id, shard)]
+        if len(rows) == 0:
+            return False
+        elif all(row.id in known_ids for row in rows):
+            logger.info("Stopping at a page of known entries")
+            return True
+        elif newest is not None and all(row.date < newest for row in rows):
+            logger.info(f"Stopping at a page older than {newest}")
+            return True
+        return False
+
+    return stop
+
+
+def found_all(wanted_ids: Collection[str]) -> Callable[[Listing], bool]:
+    """Stopping criterion for :func:`all_rows`, true once the rows of all
+    :param wanted_ids: are listed."""
+    remaining = set(wanted_ids)
+
+    def stop(page: Listing) -> bool:
+        remaining.difference_update(row.id for row in page.rows)
+        return len(remaining) == 0
+
+    return stop
 
-def all_rows(session) -> Generator:
-    """Generator, yields all rows"""
-    offset = 0
-    while True:
-        html = session.get(URL, params={"offset": offset, "per_page": 100})
-        soup = BeautifulSoup(html.text, "html.parser")
-        all_posts = soup.find_all(attrs={"class": "disinfo-db-post"})
-        if len(all_posts) == 0:
-            return
-        for post in all_posts:
-            yield post
-            offset += 1
 
+async def get_first_page(
+    fetcher: Fetcher, parser: Parser, url: str = URL
+) -> Tuple[int, Listing]:
+    """Get the first listing page with the largest page size the server
+    accepts, return the page size and the parsed page. Raise
+    :class:`MalformedDataError` if no page size gives any row."""
+    for per_page in PER_PAGE_CANDIDATES:
+        page = await get_listing(fetcher, parser, 0, per_page, url)
+        if page.size == 0:
+            continue
+        # Without the number of entries, a short page may be capped as well,
+        # the next page tells
+        expected = per_page if page.total is None else page.total
+        if page.size < min(per_page, expected):
+            per_page = page.size  # capped by the server
+        logger.info(f"Using {per_page} rows per listing page")
+        return per_page, page
+    raise MalformedDataError("Empty listing error", url)
 
-def get_len_total_entries(session) -> int:
-    html = session.get(URL)
+
+async def get_listing(
+    fetcher: Fetcher,
+    parser: Parser,
+    offset: int,
+    per_page: int,
+    url: str = URL,
+) -> Listing:
+    """Get and parse the listing page at :param offset:. Overload statuses
+    are retried by :param fetcher:; raise :class:`requests.HTTPError` if the
+    page still cannot be fetched, rather than skip its rows."""
+    with fetcher.metrics.stage("listing").measure() as stage:
+        response = await fetcher.get(
+            url, params={"offset": offset, "per_page": per_page}
+        )
+        stage.add_bytes(len(response.content))
+        if not response.ok:
+            stage.error(f"HTTP {response.status_code}")
+            response.raise_for_status()
+    with fetcher.metrics.stage("rows").measure() as stage:
+        stage.add_bytes(len(response.content))
+        return await fetcher.parse(parser.listing, response.text)
+
+
+def get_len_total_entries(session, url: str = URL) -> int:
+    html = session.get(url)
     soup = BeautifulSoup(html.text, "html.parser")
-    return int(
-        soup.find(attrs={"class": "disinfo-db-results"})
-        .find("span")
-        .contents[0]
-    )
+    try:
+        return int(
+            soup.find(attrs={"class": "disinfo-db-results"})
+            .find("span")
+            .contents[0]
+        )
+    finally:
+        soup.decompose()
 
 
 def get_scraped_ids(out_dir: Path) -> Collection[str]:
@@ -55,6 +260,48 @@ def get_scraped_ids(out_dir: Path) -> Collection[str]:
     return set(read["id"])  # for efficient membership test
 
 
+def get_newest_date(out_dir: Path) -> Optional[date]:
+    read = pd.read_csv(out_dir / POSTS_FILENAME, usecols=["date"])
+    return None if read.empty else date.fromisoformat(read["date"].max())
+
+
+def read_csv(path: Path) -> Iterator[Dict[str, str]]:
+    with open(path, encoding="utf-8", newline="") as file:
+        yield from DictReader(file)
+
+
+def parse_lists(row: Dict[str, str], name: str) -> Dict[str, object]:
+    """Split the list fields of a :param row: of resource :param name:."""
+    return {
+        field: (str2list(value) if value else [])
+        if field in LIST_FIELDS[name]
+        else value
+        for field, value in row.items()
+    }
+
+
+def read_entries(
+    out_dir: Path,
+) -> Iterator[Tuple[Post, Annotation, List[Publication]]]:
+    """Generator, yields the entries of the output files in
+    :param out_dir:, in order."""
+    annotations = {
+        row["id"]: Annotation(**parse_lists(row, "annotations"))
+        for row in read_csv(out_dir / ANNOTATIONS_FILENAME)
+    }
+    publications: Dict[str, List[Publication]] = defaultdict(list)
+    for row in read_csv(out_dir / PUBLICATIONS_FILENAME):
+        publications[row["id"]].append(Publication(**row))
+    for row in read_csv(out_dir / POSTS_FILENAME):
+        fields = parse_lists(row, "posts")
+        fields["date"] = date.fromisoformat(row["date"])
+        post = Post(**fields)
+        if post.id not in annotations:
+            logger.warning(f"Skipping {post.id} without annotation")
+            continue
+        yield post, annotations[post.id], publications[post.id]
+
+
 def translate(
     row: Row, report: Report
 ) -> Tuple[Post, Annotation, List[Publication]]:
@@ -85,64 +332,429 @@ def translate(
     return post, annotation, publications
 
 
-def get(session, ignore_ids, row_html):
-    row = get_row(row_html)
-    if row.id in ignore_ids:
+async def get_report_async(
+    fetcher: Fetcher, resolver: LinkResolver, parser: Parser, row: Row
+) -> Optional[Tuple[Row, Report]]:
+    """Asynchronous counterpart of :func:`get_report`, resolving the links
+    of the report with :param resolver:."""
+    html, _, _ = await fetch_report(fetcher, row)
+    _, report = await parse_fetched(fetcher, parser, row, html)
+    if report is None:
+        return None
+    return await resolve_parsed(fetcher, resolver, row, report)
+
+
+async def fetch_report(
+    fetcher: Fetcher, row: Row, known: Optional[ReportVersion] = None
+) -> Optional[Tuple[str, Optional[str], Optional[str]]]:
+    """Fetch the report page of :param row:, return the page and its ETag
+    and Last-Modified validators. If the :param known: version has
+    validators, the page is only sent if modified, None otherwise."""
+    headers = {}
+    if known is not None and known.etag is not None:
+        headers["If-None-Match"] = known.etag
+    if known is not None and known.last_modified is not None:
+        headers["If-Modified-Since"] = known.last_modified
+    with fetcher.metrics.stage("fetch").measure() as stage:
+        response = await fetcher.get(row.id, headers=headers)
+        stage.add_bytes(len(response.content))
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+        return (
+            response.text,
+            response.headers.get("ETag"),
+            response.headers.get("Last-Modified"),
+        )
+
+
+async def parse_fetched(
+    fetcher: Fetcher,
+    parser: Parser,
+    row: Row,
+    html: str,
+    known: Optional[ReportVersion] = None,
+) -> Tuple[str, Optional[Report]]:
+    """Parse the report page :param html: of :param row:, return its
+    content hash and the report, None if malformed. If :param known: is
+    given, the page is only parsed if its hash changed (None otherwise),
+    see :func:`parse_changed`."""
+    with fetcher.metrics.stage("parse").measure() as stage:
+        stage.add_bytes(len(html))
+        if known is not None:
+            hash_, report = await fetcher.parse(
+                parse_changed, parser, row.id, html, known.hash
+            )
+            if hash_ == known.hash:
+                return hash_, None
+        else:
+            report = await fetcher.parse(parse_report, parser, row.id, html)
+            hash_ = None if report is None else report.content_hash
+        if report is None:
+            stage.error(MalformedDataError.__name__)
+        return hash_, report
+
+
+async def parse_versioned(
+    fetcher: Fetcher,
+    parser: Parser,
+    index: Optional[ReportIndex],
+    row: Row,
+    html: str,
+    etag: Optional[str],
+    last_modified: Optional[str],
+    known: Optional[ReportVersion],
+) -> Optional[Tuple[Row, Report]]:
+    """Parse the report page :param html: of :param row:, recording its
+    version in :param index:. Return None if the content did not change
+    since the :param known: version, raise :class:`MalformedDataError` if
+    the report is malformed."""
+    hash_, report = await parse_fetched(fetcher, parser, row, html, known)
+    if index is not None and hash_ is not None:
+        index.put(row.id, ReportVersion(hash_, etag, last_modified))
+    if known is not None and hash_ == known.hash:
         return None
-    return get_report(session, row)
+    if report is None:
+        raise MalformedDataError("Malformed report error", row.id)
+    return row, report
+
+
+async def resolve_parsed(
+    fetcher: Fetcher, resolver: LinkResolver, row: Row, report: Report
+) -> Tuple[Row, Report]:
+    with fetcher.metrics.stage("resolve").measure():
+        await resolver.resolve_reports([report])
+        return row, report
+
+
+async def extract_async(
+    fetcher: Fetcher,
+    rows: AsyncIterable[Row],
+    ignore_ids: Collection[str],
+    resolver: Optional[LinkResolver] = None,
+    parser: Parser = get_parser(),
+    max_pending: Optional[int] = None,
+    index: Optional[ReportIndex] = None,
+    refresh: Collection[str] = (),
+    resolve_links: bool = True,
+) -> AsyncGenerator[Tuple[Row, Report], None]:
+    """Asynchronous generator, yields (row, report) pairs in the order of
+    :param rows: (each id once), or :class:`Failed` for rows that could not
+    be scraped. The version of each report is recorded in :param index:.
+    The reports of :param refresh: known to the index are fetched
+    conditionally, and only yielded if their content changed.
+
+    Reports go through three stages, connected by queues of at most
+    :param max_pending: items (default: :attr:`Fetcher.concurrency`):
+    fetching pages with :attr:`Fetcher.concurrency` workers, parsing them
+    with :attr:`Fetcher.parse_workers` workers in the process pool, and
+    resolving their links with :attr:`Fetcher.concurrency` workers, unless
+    :param resolve_links: is False. A slow stage holds back the previous
+    ones, rather than accumulating pages. Rows completed ahead of a slow one
+    wait for it, up to twice as many rows as the stages hold.
+    """
+    if resolver is None:
+        resolver = LinkResolver(fetcher)
+    if max_pending is None:
+        max_pending = fetcher.concurrency
+    pending: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+    fetched: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+    parsed: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+    done: asyncio.Queue = asyncio.Queue()
+    order: Deque[str] = deque()  # ids of the rows in flight
+    window = asyncio.Semaphore(
+        2 * (3 * max_pending + 2 * fetcher.concurrency + fetcher.parse_workers)
+    )
+
+    async def produce():
+        seen = set()
+        try:
+            async for row in rows:
+                if row.id in ignore_ids or row.id in seen:
+                    continue
+                seen.add(row.id)
+                await window.acquire()
+                order.append(row.id)
+                await pending.put((row,))
+        except Exception as exception:
+            done.put_nowait(exception)  # re-raised below
+            return
+        await pending.put(None)
+
+    async def fetch(row: Row):
+        known = None
+        if index is not None and row.id in refresh:
+            known = index.get(row.id)
+        fetched = await fetch_report(fetcher, row, known)
+        if fetched is None:
+            await done.put(row.id)  # not modified
+            return None
+        return (row, *fetched, known)
+
+    async def parse(row: Row, html: str, *validators):
+        result = await parse_versioned(
+            fetcher, parser, index, row, html, *validators
+        )
+        if result is None:
+            await done.put(row.id)  # content not changed
+        return result
+
+    async def resolve(row: Row, report: Report):
+        return await resolve_parsed(fetcher, resolver, row, report)
+
+    tasks = [
+        asyncio.ensure_future(produce()),
+        asyncio.ensure_future(
+            run_stage(fetch, pending, fetched, done, fetcher.concurrency)
+        ),
+        asyncio.ensure_future(
+            run_stage(
+                parse,
+                fetched,
+                parsed if resolve_links else done,
+                done,
+                fetcher.parse_workers,
+            )
+        ),
+    ]
+    if resolve_links:
+        tasks.append(
+            asyncio.ensure_future(
+                run_stage(resolve, parsed, done, done, fetcher.concurrency)
+            )
+        )
+    try:
+        async for o in in_order(done, order, window):
+            yield o
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(
+            *tasks, *resolver.cancel(), return_exceptions=True
+        )
+
+
+async def in_order(
+    done: asyncio.Queue, order: Deque[str], window: asyncio.Semaphore
+) -> AsyncGenerator[Union[Tuple[Row, Report], Failed], None]:
+    """Asynchronous generator, yields the results (or :class:`Failed`) put
+    in :param done: in the order of the ids in :param order:, releasing
+    :param window: for each row. Rows without result are put as their id,
+    the end as None, and exceptions are raised."""
+    outcomes: Dict[str, object] = {}
+    while True:
+        o = await done.get()
+        if o is None:
+            return
+        elif isinstance(o, Exception):
+            raise o
+        elif isinstance(o, str):
+            outcomes[o] = None
+        else:
+            outcomes[o.id if isinstance(o, Failed) else o[0].id] = o
+        while order and order[0] in outcomes:
+            outcome = outcomes.pop(order.popleft())
+            window.release()
+            if outcome is not None:
+                yield outcome
+
+
+async def run_stage(
+    func,
+    source: asyncio.Queue,
+    sink: asyncio.Queue,
+    failures: asyncio.Queue,
+    workers: int,
+):
+    """Apply :param func: to the items of :param source: with
+    :param workers: concurrent workers, putting the results other than None
+    in :param sink:, and :class:`Failed` in :param failures: on errors.
+    Items are tuples of arguments, whose first element is the row; the end
+    of the items is marked with None.
+    """
+
+    async def work():
+        while True:
+            args = await source.get()
+            if args is None:
+                await source.put(None)  # for the other workers
+                return
+            try:
+                result = await func(*args)
+            except Exception as exception:
+                logger.warning(f"WARNING: {repr(exception)} for {args[0].id}")
+                await failures.put(Failed(args[0].id, repr(exception)))
+                continue
+            if result is not None:
+                await sink.put(result)
+
+    await asyncio.gather(*(work() for _ in range(workers)))
+    await sink.put(None)
+
+
+async def listed_async(
+    rows: AsyncIterable[Row], ignore_ids: Collection[str]
+) -> AsyncGenerator[Tuple[Row, Report], None]:
+    """Asynchronous generator, yields (row, empty report) pairs, without
+    fetching the reports."""
+    async for row in rows:
+        if row.id not in ignore_ids:
+            yield row, Report.empty(row.id)
+
+
+def project(
+    entry: Tuple[Post, Annotation, List[Publication]],
+    fields: Collection[str],
+) -> Tuple[Post, Annotation, List[Publication]]:
+    """Empty the fields of :param entry: not in :param fields:, dropping its
+    publications if none of their fields is."""
+
+    def empty(record, resource: str):
+        return record._replace(
+            **{
+                field: [] if field in LIST_FIELDS.get(resource, ()) else ""
+                for field in record._fields
+                if field not in fields and field not in KEY_FIELDS
+            }
+        )
+
+    post, annotation, publications = entry
+    if not set(Publication._fields).difference(KEY_FIELDS) & set(fields):
+        publications = []
+    return (
+        empty(post, "posts"),
+        empty(annotation, "annotations"),
+        [empty(publication, "publications") for publication in publications],
+    )
 
 
 def extract(
-    session,
-    rows_html,
+    fetcher: Fetcher,
+    rows: AsyncIterable[Row],
     ignore_ids: Collection[str],
     progress_rows,
     progress_reports,
+    resolver: Optional[LinkResolver] = None,
+    parser: Parser = get_parser(),
+    max_pending: Optional[int] = None,
+    index: Optional[ReportIndex] = None,
+    refresh: Collection[str] = (),
+    fields: Optional[Collection[str]] = None,
+) -> Iterator[Union[Tuple[Post, Annotation, List[Publication]], Failed]]:
+    """Scrape the entries of :param rows:, see :func:`extract_async`.
+    If :param fields: is given, only these fields are filled in, skipping
+    the stages not needed for them: fetching the reports if all are known
+    from the listing, resolving links if no resolved link is requested."""
+    if fields is not None and set(fields) <= set(LISTING_FIELDS):
+        agen = listed_async(progress_rows(rows), ignore_ids)
+    else:
+        agen = extract_async(
+            fetcher,
+            progress_rows(rows),
+            ignore_ids,
+            resolver,
+            parser,
+            max_pending,
+            index,
+            refresh,
+            resolve_links=fields is None
+            or any(field in fields for field in RESOLVED_FIELDS),
+        )
+    for item in progress_reports(fetcher.iterate(agen)):
+        if isinstance(item, Failed):
+            yield item
+        elif fields is None:
+            yield translate(*item)
+        else:
+            yield project(translate(*item), fields)
+
+
+def from_archive(
+    path: Path,
+    cache: Optional[LinkCache] = None,
+    workers: Optional[int] = None,
+    parser: Parser = get_parser(),
+    url: str = URL,
 ) -> Iterator[Tuple[Post, Annotation, List[Publication]]]:
-    with Pool() as pool:
-        for row, report in progress_reports(
-            o
-            for o in pool.imap_unordered(
-                functools.partial(get, session, ignore_ids),
-                progress_rows(rows_html),
-            )
-            if o is not None
+    """Rebuild entries from the archive at :param path: only, parsing pages
+    with a pool of :param workers: processes. Listing pages are those of
+    the listing at :param url:. Links are resolved from :param cache: where
+    possible, and marked as unresolved otherwise."""
+    pages = latest_pages(path)
+    listings = sorted(
+        (page for page in pages if is_listing(page, url)), key=listing_offset
+    )
+    with ProcessPoolExecutor(workers) as pool:
+        rows: Dict[str, Row] = {}
+        for page_rows in pool.map(
+            functools.partial(parse_listing, parser),
+            (pages[url] for url in listings),
         ):
-            yield translate(row, report)
+            for row in page_rows:
+                rows.setdefault(row.id, row)
+        ids = [id_ for id_ in rows if id_ in pages]
+        missing = len(rows) - len(ids)
+        if missing > 0:
+            logger.warning(f"No archived report for {missing} rows")
+
+        reports = pool.map(
+            functools.partial(parse_archived_report, parser),
+            ids,
+            (pages.pop(id_) for id_ in ids),
+            chunksize=16,
+        )
+        for id_, report in zip(ids, reports):
+            resolved = {}
+            for link in report.links:
+                result = (
+                    cache.get(link, expire=False)
+                    if cache is not None
+                    else None
+                )
+                resolved[link] = UNRESOLVED if result is None else result
+            report.set_resolved(resolved)
+            yield translate(rows[id_], report)
 
 
 def write(
     out_dir: Path,
     overwrite: bool,
     num_entries: Optional[int],
-    gen: Iterator[Tuple[Post, Annotation, List[Publication]]],
+    gen: Iterator[Union[Tuple[Post, Annotation, List[Publication]], Failed]],
+    journal: Optional[Journal] = None,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+    database: Optional[Path] = None,
+    metrics: Optional[Metrics] = None,
 ):
-    mode = "w" if overwrite else "a"
-    encoding = "utf-8"
-    with open(
-        out_dir / POSTS_FILENAME, mode, encoding=encoding
-    ) as posts_file, open(
-        out_dir / ANNOTATIONS_FILENAME, mode, encoding=encoding
-    ) as annotations_file, open(
-        out_dir / PUBLICATIONS_FILENAME, mode, encoding=encoding
-    ) as publications_file:
-        posts_writer = DictWriter(posts_file, Post._fields)
-        annotations_writer = DictWriter(annotations_file, Annotation._fields)
-        publications_writer = DictWriter(
-            publications_file, Publication._fields
+    """Write the entries of :param gen: to the output files, or upsert them
+    into the SQLite :param database: if given, committing them to
+    :param journal: by batches, along with the failed entries.
+    When overwriting, the output is only replaced if all entries are
+    written, see :class:`OutputWriter` and :class:`SqliteWriter`."""
+    writer: BatchWriter
+    if database is not None:
+        writer = SqliteWriter(
+            database, overwrite, journal, batch_size, flush_interval, metrics
         )
-        if overwrite:
-            posts_writer.writeheader()
-            annotations_writer.writeheader()
-            publications_writer.writeheader()
-
-        for post, annotation, publications in islice(gen, num_entries):
-            for publication in publications:
-                publications_writer.writerow(stringify(publication._asdict()))
-            publications_file.flush()
-
-            annotations_writer.writerow(stringify(annotation._asdict()))
-            annotations_file.flush()
-
-            posts_writer.writerow(stringify(post._asdict()))
-            posts_file.flush()
+    else:
+        writer = OutputWriter(
+            out_dir, overwrite, journal, batch_size, flush_interval, metrics
+        )
+    complete = True  # no entry partially written
+    try:
+        written = 0
+        for item in gen if num_entries != 0 else ():
+            if isinstance(item, Failed):
+                writer.fail(item.id, item.reason)
+                continue
+            complete = False
+            writer.add(*item)
+            complete = True
+            written += 1
+            if written == num_entries:
+                break
+    except BaseException:
+        writer.close(commit=complete, replace=False)
+        raise
+    writer.close()
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import zlib
+from collections import namedtuple
+from datetime import datetime, timezone
+from typing import (
+    Collection,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+from xml.etree.ElementTree import XMLPullParser
+
+import requests
+
+from scrape.fetch import Fetcher
+from scrape.util import REPORT_PATH, RETRY_STATUSES, SITEMAP_URL
+
+logger = logging.getLogger(__name__)
+
+# URL of a page, and time of its last modification (POSIX timestamp), None
+# if not given
+SitemapEntry = namedtuple("SitemapEntry", ["loc", "lastmod"])
+
+# Size of the chunks of a sitemap fed to the parser
+CHUNK_SIZE = 1 << 16
+
+
+def parse_lastmod(text: Optional[str]) -> Optional[float]:
+    """Timestamp of the W3C datetime :param text: (a date, or a date and
+    time), in UTC if no timezone is given, None if malformed."""
+    if not text:
+        return None
+    text = text.strip().replace("Z", "+00:00")
+    try:
+        lastmod = datetime.fromisoformat(text)
+    except ValueError:
+        logger.warning(f"WARNING: malformed lastmod {repr(text)}")
+        return None
+    if lastmod.tzinfo is None:
+        lastmod = lastmod.replace(tzinfo=timezone.utc)
+    return lastmod.timestamp()
+
+
+def parse_sitemap(
+    chunks: Iterable[bytes],
+) -> Tuple[List[SitemapEntry], List[str]]:
+    """Parse a sitemap from its :param chunks: incrementally, keeping only
+    the entries. Return the entries of a URL set, and the URLs of the
+    sitemaps of a sitemap index."""
+    parser = XMLPullParser(events=("end",))
+    entries: List[SitemapEntry] = []
+    sitemaps: List[str] = []
+    for chunk in chunks:
+        parser.feed(chunk)
+        for _, element in parser.read_events():
+            # Ignore the namespace, some sitemaps omit it
+            tag = element.tag.rpartition("}")[2]
+            if tag not in ("url", "sitemap"):
+                continue
+            fields = {
+                child.tag.rpartition("}")[2]: (child.text or "").strip()
+                for child in element
+            }
+            element.clear()
+            if not fields.get("loc"):
+                continue
+            elif tag == "sitemap":
+                sitemaps.append(fields["loc"])
+            else:
+                entries.append(
+                    SitemapEntry(
+                        fields["loc"], parse_lastmod(fields.get("lastmod"))
+                    )
+                )
+    parser.close()
+    return entries, sitemaps
+
+
+def read_sitemap(
+    session: requests.Session, url: str
+) -> Union[Tuple[List[SitemapEntry], List[str]], requests.Response]:
+    """Stream the sitemap at :param url: into :func:`parse_sitemap`,
+    decompressing it if gzipped. Return the response on overload statuses,
+    to be retried by :meth:`Fetcher.submit_request`."""
+    with session.get(url, stream=True) as response:
+        if response.status_code in RETRY_STATUSES:
+            return response
+        response.raise_for_status()
+        chunks = response.iter_content(CHUNK_SIZE)
+        if url.endswith(".gz"):
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            chunks = (decompressor.decompress(chunk) for chunk in chunks)
+        return parse_sitemap(chunks)
+
+
+async def fetch_sitemap(
+    fetcher: Fetcher, url: str
+) -> Tuple[List[SitemapEntry], List[str]]:
+    with fetcher.metrics.stage("sitemap").measure() as stage:
+        result = await fetcher.submit_request(
+            url, read_sitemap, fetcher.session, url
+        )
+        if isinstance(result, requests.Response):
+            stage.error(f"HTTP {result.status_code}")
+            result.raise_for_status()
+        return result
+
+
+async def sitemap_entries(
+    fetcher: Fetcher, url: str = SITEMAP_URL
+) -> List[SitemapEntry]:
+    """Entries of report pages in the sitemap at :param url:, following the
+    sitemaps of a sitemap index, only those of reports if any."""
+    entries, sitemaps = await fetch_sitemap(fetcher, url)
+    while sitemaps:
+        reports = [s for s in sitemaps if "report" in s.rsplit("/", 1)[-1]]
+        results = await asyncio.gather(
+            *(fetch_sitemap(fetcher, s) for s in reports or sitemaps)
+        )
+        sitemaps = []
+        for more_entries, more_sitemaps in results:
+            entries.extend(more_entries)
+            sitemaps.extend(more_sitemaps)
+    return [entry for entry in entries if REPORT_PATH in entry.loc]
+
+
+def queued_ids(
+    entries: Iterable[SitemapEntry],
+    done: Collection[str],
+    checked: Dict[str, float],
+) -> Tuple[Set[str], Set[str]]:
+    """Ids of the reports of :param entries: to scrape: new ones, not in
+    :param done:, and edited ones, modified since they were last
+    :param checked: (or never checked)."""
+    new, edited = set(), set()
+    for loc, lastmod in entries:
+        if loc not in done:
+            new.add(loc)
+        elif loc not in checked or (
+            lastmod is not None and lastmod > checked[loc]
+        ):
+            edited.add(loc)
+    return new, edited
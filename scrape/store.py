@@ -0,0 +1,256 @@
+import logging
+import sqlite3
+from collections import defaultdict
+from datetime import date
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from scrape.journal import Journal
+from scrape.metrics import Metrics
+from scrape.util import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_FLUSH_INTERVAL,
+    LIST_FIELDS,
+    Annotation,
+    Post,
+    Publication,
+)
+from scrape.writer import BatchWriter
+
+logger = logging.getLogger(__name__)
+
+
+def list_table(resource: str, field: str) -> str:
+    return f"{resource}_{field}"
+
+
+class Database:
+    """SQLite database of entries, with a table per resource of the data
+    package, and a table per list field holding one row per element.
+
+    The database is in write-ahead logging mode, so that readers do not
+    block the scraper, nor the scraper the readers.
+    """
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        # Sync on each commit, before the commit is journaled
+        self.connection.execute("PRAGMA synchronous = FULL")
+        self.connection.executescript(
+            "CREATE TABLE IF NOT EXISTS posts ("
+            " id TEXT PRIMARY KEY,"
+            " date TEXT NOT NULL,"
+            " title TEXT NOT NULL"
+            ");"
+            "CREATE INDEX IF NOT EXISTS posts_date ON posts (date);"
+            "CREATE TABLE IF NOT EXISTS annotations ("
+            " id TEXT PRIMARY KEY,"
+            " summary TEXT NOT NULL,"
+            " disproof TEXT NOT NULL"
+            ");"
+            "CREATE TABLE IF NOT EXISTS publications ("
+            " id TEXT NOT NULL,"
+            " position INTEGER NOT NULL,"
+            " publication TEXT NOT NULL,"
+            " archive TEXT,"
+            " PRIMARY KEY (id, position)"
+            ");"
+        )
+        for resource, fields in LIST_FIELDS.items():
+            for field in fields:
+                table = list_table(resource, field)
+                self.connection.executescript(
+                    f"CREATE TABLE IF NOT EXISTS {table} ("
+                    " id TEXT NOT NULL,"
+                    " position INTEGER NOT NULL,"
+                    " value TEXT NOT NULL,"
+                    " PRIMARY KEY (id, position)"
+                    ");"
+                    f"CREATE INDEX IF NOT EXISTS {table}_value"
+                    f" ON {table} (value);"
+                )
+
+    @property
+    def tables(self) -> List[str]:
+        return ["posts", "annotations", "publications"] + [
+            list_table(resource, field)
+            for resource, fields in LIST_FIELDS.items()
+            for field in fields
+        ]
+
+    def _set_list(self, table: str, id_: str, values: List[str]):
+        self.connection.execute(f"DELETE FROM {table} WHERE id = ?", (id_,))
+        self.connection.executemany(
+            f"INSERT INTO {table} VALUES (?, ?, ?)",
+            [(id_, position, value) for position, value in enumerate(values)],
+        )
+
+    def upsert(
+        self,
+        post: Post,
+        annotation: Annotation,
+        publications: List[Publication],
+    ):
+        """Insert an entry, or update the entry with the same id."""
+        self.connection.execute(
+            "INSERT INTO posts VALUES (?, ?, ?) ON CONFLICT (id) DO UPDATE"
+            " SET date = excluded.date, title = excluded.title",
+            (post.id, post.date.isoformat(), post.title),
+        )
+        self.connection.execute(
+            "INSERT INTO annotations VALUES (?, ?, ?) ON CONFLICT (id)"
+            " DO UPDATE SET summary = excluded.summary,"
+            " disproof = excluded.disproof",
+            (annotation.id, annotation.summary, annotation.disproof),
+        )
+        self.connection.execute(
+            "DELETE FROM publications WHERE id = ?", (post.id,)
+        )
+        self.connection.executemany(
+            "INSERT INTO publications VALUES (?, ?, ?, ?)",
+            [
+                (post.id, position, p.publication, p.archive or None)
+                for position, p in enumerate(publications)
+            ],
+        )
+        for resource, entry in (("posts", post), ("annotations", annotation)):
+            for field in LIST_FIELDS[resource]:
+                self._set_list(
+                    list_table(resource, field), post.id, getattr(entry, field)
+                )
+
+    def delete_except(self, ids: Set[str]):
+        """Delete all entries but :param ids:."""
+        self.connection.execute("CREATE TEMP TABLE kept (id TEXT PRIMARY KEY)")
+        self.connection.executemany(
+            "INSERT INTO kept VALUES (?)", [(id_,) for id_ in ids]
+        )
+        for table in self.tables:
+            deleted = self.connection.execute(
+                f"DELETE FROM {table} WHERE id NOT IN (SELECT id FROM kept)"
+            ).rowcount
+            if table == "posts" and deleted > 0:
+                logger.info(f"Deleted {deleted} entries no longer listed")
+        self.connection.execute("DROP TABLE kept")
+
+    def ids(self) -> Set[str]:
+        return {
+            id_ for id_, in self.connection.execute("SELECT id FROM posts")
+        }
+
+    def newest(self) -> Optional[date]:
+        (newest,) = self.connection.execute(
+            "SELECT max(date) FROM posts"
+        ).fetchone()
+        return None if newest is None else date.fromisoformat(newest)
+
+    def _lists(self, resource: str) -> Dict[str, Dict[str, List[str]]]:
+        """Map each list field of :param resource: to the values of each
+        entry, in one query per field."""
+        lists = {}
+        for field in LIST_FIELDS[resource]:
+            values = defaultdict(list)
+            for id_, value in self.connection.execute(
+                f"SELECT id, value FROM {list_table(resource, field)}"
+                " ORDER BY id, position"
+            ):
+                values[id_].append(value)
+            lists[field] = values
+        return lists
+
+    def entries(
+        self,
+    ) -> Iterator[Tuple[Post, Annotation, List[Publication]]]:
+        """Generator, yields all entries, newest first."""
+        post_lists = self._lists("posts")
+        annotation_lists = self._lists("annotations")
+        publications = defaultdict(list)
+        for id_, publication, archive in self.connection.execute(
+            "SELECT id, publication, archive FROM publications"
+            " ORDER BY id, position"
+        ):
+            publications[id_].append(Publication(id_, publication, archive))
+        for id_, date_, title, summary, disproof in self.connection.execute(
+            "SELECT posts.id, date, title, summary, disproof"
+            " FROM posts JOIN annotations USING (id)"
+            " ORDER BY date DESC, posts.rowid"
+        ):
+            post = Post(
+                date=date.fromisoformat(date_),
+                id=id_,
+                title=title,
+                **{f: post_lists[f][id_] for f in LIST_FIELDS["posts"]},
+            )
+            annotation = Annotation(
+                id=id_,
+                summary=summary,
+                disproof=disproof,
+                **{
+                    f: annotation_lists[f][id_]
+                    for f in LIST_FIELDS["annotations"]
+                },
+            )
+            yield post, annotation, publications[id_]
+
+    def commit(self):
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SqliteWriter(BatchWriter):
+    """Upserts entries into a :class:`Database` with group commits, each
+    batch in a transaction. When overwriting, entries that were not written
+    (by this run, or by the interrupted run the :param journal: resumes)
+    are deleted once all entries are written."""
+
+    def __init__(
+        self,
+        path: Path,
+        overwrite: bool,
+        journal: Optional[Journal] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        metrics: Optional[Metrics] = None,
+    ):
+        super().__init__(journal, batch_size, flush_interval, metrics)
+        self.database = Database(path)
+        self.overwrite = overwrite
+        self.written: Set[str] = (
+            set() if journal is None else set(journal.done)
+        )
+
+    def write_entry(
+        self,
+        post: Post,
+        annotation: Annotation,
+        publications: List[Publication],
+    ):
+        self.database.upsert(post, annotation, publications)
+        if self.overwrite:
+            self.written.add(post.id)
+
+    def flush(self) -> Dict[str, int]:
+        self.database.commit()
+        return {}
+
+    def close(self, commit: bool = True, replace: bool = True):
+        if not commit:
+            self.database.connection.rollback()
+        super().close(commit, replace)
+        if self.overwrite and replace:
+            self.database.delete_except(self.written)
+            self.database.commit()
+            if self.journal is not None:
+                self.journal.seal()
+                self.journal.publish()
+        self.database.close()
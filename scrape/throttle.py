@@ -0,0 +1,264 @@
+import logging
+import threading
+import time
+from itertools import count
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+import requests
+import requests.adapters
+
+from scrape.util import (
+    BACKOFF,
+    DEFAULT_RETRIES,
+    LATENCY_TOLERANCE,
+    MAX_BACKOFF,
+    RETRY_STATUSES,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def retry_after(response: requests.Response) -> Optional[float]:
+    """Delay requested by the Retry-After header, in seconds, if any."""
+    value = response.headers.get("Retry-After", "")
+    return min(float(value), MAX_BACKOFF) if value.isdigit() else None
+
+
+class HostThrottle:
+    """Limits the requests to a single host, with a token bucket refilled at
+    :attr:`rate` requests per second and an adaptive concurrency limit.
+
+    The concurrency limit follows an AIMD scheme: it grows with each
+    response while latency stays within :data:`LATENCY_TOLERANCE` times the
+    lowest latency seen (doubling every round trip until the first back off,
+    then by one), and is halved on errors, overload statuses or rising
+    latency. Overload statuses also pause the host, as long as requested by
+    the Retry-After header or with an exponential back off.
+    """
+
+    rate: Optional[float]
+    max_concurrency: int
+    limit: float = 1.0
+    in_flight: int = 0
+    requests: int = 0
+    backoffs: int = 0
+
+    def __init__(self, max_concurrency: int, rate: Optional[float] = None):
+        """:param rate: of None or 0 means no limit."""
+        self.max_concurrency = max_concurrency
+        self.rate = rate or None
+        self.tokens = float(max_concurrency)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.stable_at = 0.0
+        self.slow_start = True
+        self.overloaded = 0  # consecutive overload statuses
+        self.latency: Optional[float] = None  # moving average
+        self.baseline: Optional[float] = None
+        self.condition = threading.Condition()
+        # Called on the next release, by waiters outside of the condition
+        self.wakers: List[Callable[[], None]] = []
+
+    def _delay(self, now: float) -> float:
+        """Time to wait before the next request may start."""
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.rate is not None:
+            self.tokens = min(
+                self.tokens + (now - self.updated) * self.rate,
+                float(self.max_concurrency),
+            )
+            self.updated = now
+            if self.tokens < 1:
+                return (1 - self.tokens) / self.rate
+        return 0.0
+
+    def _start(self):
+        self.in_flight += 1
+        self.requests += 1
+        if self.rate is not None:
+            self.tokens -= 1
+
+    def acquire(self):
+        """Block until a request may start."""
+        with self.condition:
+            while True:
+                if self.in_flight >= int(self.limit):
+                    self.condition.wait()
+                    continue
+                delay = self._delay(time.monotonic())
+                if delay <= 0:
+                    break
+                self.condition.wait(delay)
+            self._start()
+
+    def try_acquire(
+        self, wake: Optional[Callable[[], None]] = None
+    ) -> Optional[float]:
+        """Start a request if one may start now and return 0, otherwise
+        return the time to wait before trying again, None if until a request
+        in flight is released, which calls :param wake: (from the thread
+        releasing it)."""
+        with self.condition:
+            if self.in_flight >= int(self.limit):
+                if wake is not None:
+                    self.wakers.append(wake)
+                return None
+            delay = self._delay(time.monotonic())
+            if delay > 0:
+                return delay
+            self._start()
+            return 0.0
+
+    def cancel(self):
+        """Give back a request acquired but not sent."""
+        with self.condition:
+            self.in_flight -= 1
+            self._notify()
+
+    def _notify(self):
+        self.condition.notify_all()
+        wakers, self.wakers = self.wakers, []
+        for wake in wakers:
+            wake()
+
+    def release(
+        self,
+        latency: float,
+        status: Optional[int],
+        pause: Optional[float] = None,
+    ):
+        """Record the outcome of a request that took :param latency:
+        seconds, with :param status: None if no response was received.
+        Pause the host for :param pause: seconds on overload statuses."""
+        with self.condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if status in RETRY_STATUSES:
+                self.overloaded += 1
+                if pause is None:
+                    pause = min(
+                        BACKOFF * 2 ** (self.overloaded - 1), MAX_BACKOFF
+                    )
+                self.paused_until = max(self.paused_until, now + pause)
+                self._decrease(now)
+            elif status is None:
+                self._decrease(now)
+            else:
+                self.overloaded = 0
+                self._observe(latency)
+                if self.latency > LATENCY_TOLERANCE * self.baseline:
+                    self._decrease(now)
+                elif self.limit < self.max_concurrency:
+                    self.limit += 1 if self.slow_start else 1 / self.limit
+                    self.limit = min(self.limit, self.max_concurrency)
+            self._notify()
+
+    def _observe(self, latency: float):
+        if self.latency is None:
+            self.latency = self.baseline = latency
+        else:
+            self.latency = 0.8 * self.latency + 0.2 * latency
+            # Let the baseline drift up if the host becomes slower for good
+            self.baseline = min(self.baseline * 1.01, latency)
+
+    def _decrease(self, now: float):
+        # At most once per round trip, requests in flight were sent under
+        # the same conditions
+        if now < self.stable_at:
+            return
+        self.limit = max(self.limit / 2, 1.0)
+        self.slow_start = False
+        self.backoffs += 1
+        self.stable_at = now + (self.latency or 0.0)
+
+
+class Throttle:
+    """Collection of :class:`HostThrottle`, one per host."""
+
+    def __init__(self, max_concurrency: int, rate: Optional[float]):
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self.hosts: Dict[str, HostThrottle] = {}
+        self.lock = threading.Lock()
+        self.retries = 0
+        # Per thread: host acquired for the next request, whether overload
+        # statuses are retried by the caller, and the host that sent one
+        self.local = threading.local()
+
+    def host(self, url: str) -> HostThrottle:
+        netloc = urlparse(url).netloc
+        with self.lock:
+            if netloc not in self.hosts:
+                self.hosts[netloc] = HostThrottle(
+                    self.max_concurrency, self.rate
+                )
+            return self.hosts[netloc]
+
+    def summary(self) -> str:
+        requests_ = sum(h.requests for h in self.hosts.values())
+        backoffs = sum(h.backoffs for h in self.hosts.values())
+        summary = (
+            f"Throttle: {requests_} requests to {len(self.hosts)} hosts, "
+            f"{backoffs} back offs, {self.retries} retries"
+        )
+        if self.hosts:
+            netloc, busiest = max(
+                self.hosts.items(), key=lambda item: item[1].requests
+            )
+            summary += f" (concurrency for {netloc}: {int(busiest.limit)})"
+        return summary
+
+
+class ThrottledAdapter(requests.adapters.HTTPAdapter):
+    """Transport adapter sending all requests, including redirects, through
+    a :class:`Throttle`, and retrying requests answered with an overload
+    status up to :attr:`retries` times.
+
+    Requests sent from :meth:`Fetcher.submit_request` are acquired and
+    retried by the fetcher on its event loop instead, so that waiting for a
+    host does not hold a thread.
+    """
+
+    def __init__(
+        self,
+        throttle: Throttle,
+        retries: int = DEFAULT_RETRIES,
+        **kwargs,
+    ):
+        self.throttle = throttle
+        self.retries = retries
+        super().__init__(**kwargs)
+
+    def send(self, request: requests.PreparedRequest, **kwargs):
+        host = self.throttle.host(request.url)
+        local = self.throttle.local
+        for attempt in count():
+            if getattr(local, "acquired", None) is host:
+                local.acquired = None
+            else:
+                host.acquire()
+            start = time.monotonic()
+            try:
+                response = super().send(request, **kwargs)
+            except Exception:
+                host.release(time.monotonic() - start, None)
+                raise
+            host.release(
+                time.monotonic() - start,
+                response.status_code,
+                retry_after(response),
+            )
+            if (
+                response.status_code not in RETRY_STATUSES
+                or attempt >= self.retries
+            ):
+                return response
+            if getattr(local, "deferred", False):
+                local.overloaded = host
+                return response
+            response.close()
+            with self.throttle.lock:
+                self.throttle.retries += 1
+            logger.debug(f"Retrying {request.url} ({response.status_code})")
@@ -1,18 +1,115 @@
 import argparse
 from collections import namedtuple
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Tuple
 
 URL = "https://euvsdisinfo.eu/disinformation-cases"
+# Sitemap (index) listing the report pages, with their last modification
+SITEMAP_URL = "https://euvsdisinfo.eu/sitemap_index.xml"
+REPORT_PATH = "/report/"
 
 DATA_DIR = Path(__file__).absolute().parent.parent / "data"
 POSTS_FILENAME = "posts.csv"
 PUBLICATIONS_FILENAME = "publications.csv"
 ANNOTATIONS_FILENAME = "annotations.csv"
 SCHEMA_FILENAME = "datapackage.json"
+OUTPUT_FILENAMES = (
+    POSTS_FILENAME,
+    ANNOTATIONS_FILENAME,
+    PUBLICATIONS_FILENAME,
+)
+PARQUET_SCHEMA_FILENAME = "datapackage-parquet.json"
+# Fields holding lists, joined with LIST_SEPARATOR in the CSV files
+LIST_FIELDS = {
+    "posts": ("countries", "keywords", "languages", "outlets"),
+    "annotations": (
+        "summary_links",
+        "summary_links_resolved",
+        "disproof_links",
+        "disproof_links_resolved",
+    ),
+}
+JOURNAL_FILENAME = ".journal.jsonl"
+# Content hash and HTTP validators of each report scraped
+REPORT_INDEX_FILENAME = ".reports.sqlite"
+# SQLite output, with its own journal
+DATABASE_FILENAME = "euvsdisinfo.sqlite"
+DATABASE_JOURNAL_FILENAME = ".journal-sqlite.jsonl"
+# Suffix of files written by overwriting runs, until they are complete
+TMP_SUFFIX = ".tmp"
+# Number of entries written to the output files per commit, and maximum
+# time between commits (in seconds)
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_FLUSH_INTERVAL = 10.0
+# Delay before retrying a failed entry (in seconds), doubling with each
+# attempt up to the maximum
+RETRY_FAILED_AFTER = 3600
+MAX_RETRY_FAILED_AFTER = 7 * 24 * 3600
+
+CACHE_DIR = Path(__file__).absolute().parent.parent / ".cache"
+LINK_CACHE_FILENAME = "links.sqlite"
+ARCHIVE_FILENAME = "pages.archive"
+# Time-to-live of cached link resolutions (in seconds), by outcome
+LINK_CACHE_TTL = {
+    "ok": 30 * 24 * 3600,
+    "status": 24 * 3600,
+    "error": 6 * 3600,
+}
 
 LIST_SEPARATOR: str = "+"
 
+# Maximum number of requests in flight
+DEFAULT_CONCURRENCY = 32
+# Maximum number of requests in flight to the same host when resolving links
+DEFAULT_PER_HOST = 4
+# Maximum number of listing pages fetched ahead
+DEFAULT_PREFETCH = 8
+# Listing page sizes to try, largest first
+PER_PAGE_CANDIDATES = (1000, 500, 200, 100)
+# Maximum number of requests per second to the same host
+DEFAULT_RATE = 20.0
+# Statuses signalling an overloaded host, retried after backing off
+RETRY_STATUSES = (429, 502, 503, 504)
+DEFAULT_RETRIES = 3
+# First and maximum pause after an overload status (in seconds)
+BACKOFF = 1.0
+MAX_BACKOFF = 60.0
+# Back off when latency exceeds the lowest latency seen by this factor
+LATENCY_TOLERANCE = 2.0
+# Upper bounds of the buckets of the time per item histograms (in seconds),
+# from 0.5 ms to 93 s, in steps of sqrt(2)
+LATENCY_BUCKETS = tuple(
+    float(f"{0.0005 * 2 ** (i / 2):.3g}") for i in range(36)
+)
+# Interval between two writes of the metrics file (in seconds)
+METRICS_INTERVAL = 5.0
+# Interval between two probes of the watch mode (in seconds), varied by up
+# to WATCH_JITTER of it, and number of rows of the listing page probed
+WATCH_INTERVAL = 900.0
+WATCH_JITTER = 0.1
+PROBE_PAGE_SIZE = 10
+FRESHNESS_FILENAME = "freshness.json"
+# Metadata of the published articles, read by apps/publications
+ARTICLES_FILENAME = "out.csv"
+ARTICLES_JOURNAL_FILENAME = ".journal-articles.jsonl"
+# Maximum number of seconds to wait for a response from a publisher
+ARTICLE_TIMEOUT = 30.0
+# Status table of the links of the publications, links checked more than
+# LIVENESS_MAX_AGE ago (in seconds) are re-checked
+LIVENESS_FILENAME = "liveness.sqlite"
+LIVENESS_MAX_AGE = 7 * 24 * 3600
+LIVENESS_CONCURRENCY = 128
+# Maximum number of links waiting for their host to be checked
+LIVENESS_PENDING = 4096
+LIVENESS_TIMEOUT = 10.0
+# Statuses of servers refusing HEAD requests, checked again with GET
+HEAD_REFUSED_STATUSES = (403, 405, 501)
+# Minimum duration of a timing of the micro-benchmarks (in seconds), number
+# of timings, and slowdown over the baseline reported as a regression
+MICROBENCH_MIN_TIME = 0.05
+MICROBENCH_REPEAT = 5
+REGRESSION_TOLERANCE = 0.1
+
 Post = namedtuple(
     "Post",
     [
@@ -38,6 +135,28 @@ Annotation = namedtuple(
     ],
 )
 Publication = namedtuple("Publication", ["id", "publication", "archive"])
+Article = namedtuple(
+    "Article",
+    [
+        "url",
+        "title",
+        "date",
+        "language",
+        "authors",
+        "twitter",
+        "facebook",
+        "id",
+    ],
+)
+# Fields of the output files, see --fields
+FIELDS = tuple(
+    dict.fromkeys(Post._fields + Annotation._fields + Publication._fields)
+)
+# Fields known from the listing alone, and fields requiring link resolution
+LISTING_FIELDS = ("date", "id", "title", "countries", "outlets")
+RESOLVED_FIELDS = ("summary_links_resolved", "disproof_links_resolved")
+# Fields always written, as they identify the entries and order them
+KEY_FIELDS = ("date", "id")
 
 
 def list2str(lst: List[str]) -> str:
@@ -64,6 +183,10 @@ def stringify(dictionary: dict) -> Dict[str, str]:
     return {k: to_string(v) for k, v in dictionary.items()}
 
 
+def tmp_path(path: Path) -> Path:
+    return path.with_name(path.name + TMP_SUFFIX)
+
+
 def check_non_negative(string: str) -> int:
     value = int(string)
     if value < 0:
@@ -71,3 +194,50 @@ def check_non_negative(string: str) -> int:
             f"argument must be positive (was {value})"
         )
     return value
+
+
+def check_positive(string: str) -> int:
+    value = int(string)
+    if value <= 0:
+        raise argparse.ArgumentTypeError(
+            f"argument must be strictly positive (was {value})"
+        )
+    return value
+
+
+def check_shard(string: str) -> Tuple[int, int]:
+    """Parse a shard "i/N", 1 <= i <= N, into a (0-based index, count)."""
+    try:
+        index, count = map(int, string.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"argument must be of the form i/N (was {string})"
+        )
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(
+            f"shard must be between 1 and {count} (was {index})"
+        )
+    return index - 1, count
+
+
+def check_fields(string: str) -> Tuple[str, ...]:
+    """Parse comma-separated field names, adding :data:`KEY_FIELDS`."""
+    fields = [field.strip() for field in string.split(",") if field.strip()]
+    unknown = [field for field in fields if field not in FIELDS]
+    if unknown:
+        raise argparse.ArgumentTypeError(
+            f"unknown fields {', '.join(unknown)} (choose from "
+            f"{', '.join(FIELDS)})"
+        )
+    return tuple(
+        field for field in FIELDS if field in KEY_FIELDS + tuple(fields)
+    )
+
+
+def check_non_negative_float(string: str) -> float:
+    value = float(string)
+    if value < 0:
+        raise argparse.ArgumentTypeError(
+            f"argument must be positive (was {value})"
+        )
+    return value
@@ -0,0 +1,219 @@
+import argparse
+import json
+import logging
+import os
+import random
+import signal
+import subprocess
+import sys
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional
+
+import requests
+
+from scrape.parsers import Parser, get_parser
+from scrape.util import (
+    DATA_DIR,
+    DATABASE_FILENAME,
+    FRESHNESS_FILENAME,
+    POSTS_FILENAME,
+    PROBE_PAGE_SIZE,
+    URL,
+    WATCH_INTERVAL,
+    WATCH_JITTER,
+    check_non_negative_float,
+    tmp_path,
+)
+
+logger = logging.getLogger(__name__)
+
+# Number of entries listed, and ids of the newest ones
+Probe = namedtuple("Probe", ["total", "ids"])
+
+
+def probe(
+    session: requests.Session, parser: Parser = get_parser(), url: str = URL
+) -> Probe:
+    """Probe the listing for changes with a single small page."""
+    response = session.get(
+        url, params={"offset": 0, "per_page": PROBE_PAGE_SIZE}
+    )
+    response.raise_for_status()
+    listing = parser.listing(response.text)
+    if listing.total is None:
+        raise ValueError("Number of entries not found")
+    return Probe(listing.total, [row.id for row in listing.rows])
+
+
+def now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+class Freshness:
+    """Manifest of the freshness of the output files, written to
+    :attr:`path` as JSON after each probe, for other processes to poll.
+
+    Records when the listing was last probed, when a change was last
+    detected, when the output files were last brought up to date, and the
+    probe they are up to date with.
+    """
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.manifest: dict = {
+            "checked_at": None,
+            "changed_at": None,
+            "scraped_at": None,
+            "status": None,
+            "total": None,
+            "ids": None,
+        }
+        if path.exists():
+            with open(path, encoding="utf-8") as file:
+                self.manifest.update(json.load(file))
+
+    @property
+    def scraped(self) -> Optional[Probe]:
+        """Probe the output files are up to date with, None if unknown."""
+        if self.manifest["ids"] is None:
+            return None
+        return Probe(self.manifest["total"], self.manifest["ids"])
+
+    def update(self, **fields):
+        self.manifest.update(fields)
+        with open(tmp_path(self.path), "w", encoding="utf-8") as file:
+            json.dump(self.manifest, file, indent=2)
+            file.write("\n")
+        os.replace(tmp_path(self.path), self.path)
+
+
+def scrape_command(out_dir: Path, args: List[str]) -> List[str]:
+    """Command scraping the new entries into :param out_dir: with the
+    scraper arguments :param args:, incrementally once it has output."""
+    scraped = any(
+        (out_dir / name).exists()
+        for name in (POSTS_FILENAME, DATABASE_FILENAME)
+    )
+    mode = "--incremental" if scraped else "--fresh"
+    return [sys.executable, "-m", "scrape", str(out_dir), mode, "-np", *args]
+
+
+def aggregate(out_dir: Path):
+    """Build the aggregates of the dashboard from the posts file in
+    :param out_dir:. On failure, the dashboard aggregates the posts itself
+    at startup."""
+    command = [sys.executable, "-m", "analysis.aggregate", str(out_dir)]
+    status = subprocess.run(command).returncode
+    if status != 0:
+        logger.warning(f"Aggregation failed with status {status}")
+
+
+def watch(
+    out_dir: Path,
+    args: List[str],
+    interval: float = WATCH_INTERVAL,
+    jitter: float = WATCH_JITTER,
+    stopped: Optional[threading.Event] = None,
+):
+    """Probe the listing every :param interval: seconds, varied by up to
+    :param jitter: of it, and scrape the new entries into :param out_dir:
+    whenever the probe differs from the one the files are up to date with,
+    until :param stopped: is set."""
+    stopped = stopped or threading.Event()
+    freshness = Freshness(out_dir / FRESHNESS_FILENAME)
+    parser = get_parser()
+    with requests.Session() as session:
+        while not stopped.is_set():
+            try:
+                current = probe(session, parser)
+            except (requests.RequestException, ValueError) as error:
+                logger.warning(f"Probe failed: {repr(error)}")
+                freshness.update(checked_at=now(), status="probe failed")
+            else:
+                if current == freshness.scraped:
+                    logger.info(f"No change ({current.total} entries)")
+                    freshness.update(checked_at=now(), status="ok")
+                else:
+                    logger.info(f"Change detected ({current.total} entries)")
+                    freshness.update(
+                        checked_at=now(),
+                        changed_at=now(),
+                        status="scraping",
+                    )
+                    # In a separate process, releasing its memory
+                    command = scrape_command(out_dir, args)
+                    status = subprocess.run(command).returncode
+                    if status == 0:
+                        freshness.update(
+                            scraped_at=now(),
+                            status="ok",
+                            total=current.total,
+                            ids=current.ids,
+                        )
+                        if (out_dir / POSTS_FILENAME).exists():
+                            aggregate(out_dir)
+                    else:
+                        logger.warning(f"Scrape failed with status {status}")
+                        freshness.update(status="scrape failed", ids=None)
+            delay = interval * random.uniform(1 - jitter, 1 + jitter)
+            stopped.wait(delay)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Keep the output files up to date: probe the first "
+        "listing page periodically, and scrape the new entries "
+        "incrementally whenever it changed. The state is written to "
+        f"DIR/{FRESHNESS_FILENAME}."
+    )
+    parser.add_argument(
+        "dir",
+        metavar="DIR",
+        help="output directory",
+        type=lambda p: Path(p).absolute(),
+        default=DATA_DIR,
+        nargs="?",
+    )
+    parser.add_argument(
+        "--interval",
+        metavar="S",
+        help=f"number of seconds between two probes (default: {WATCH_INTERVAL:g})",
+        type=check_non_negative_float,
+        default=WATCH_INTERVAL,
+    )
+    parser.add_argument(
+        "--jitter",
+        metavar="F",
+        help=f"maximum random variation of the interval, as a fraction of it (default: {WATCH_JITTER:g})",
+        type=check_non_negative_float,
+        default=WATCH_JITTER,
+    )
+    parser.add_argument(
+        "scrape_args",
+        metavar="-- ARGS",
+        help="arguments of the scraper, e.g. -- --sqlite",
+        nargs=argparse.REMAINDER,
+    )
+    args = parser.parse_args()
+    scrape_args = args.scrape_args
+    if scrape_args[:1] == ["--"]:
+        scrape_args = scrape_args[1:]
+    for arg in ("-f", "--fresh", "--refresh-changed", "--sitemap"):
+        if arg in scrape_args:
+            parser.error(f"argument {arg}: not allowed in watch mode")
+    if args.jitter > 1:
+        parser.error("argument --jitter: must be at most 1")
+
+    logging.basicConfig(format="%(asctime)s %(message)s", level=logging.INFO)
+    stopped = threading.Event()
+    # Stop after the current scrape
+    signal.signal(signal.SIGTERM, lambda *_: stopped.set())
+    try:
+        watch(args.dir, scrape_args, args.interval, args.jitter, stopped)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,242 @@
+import logging
+import os
+import time
+from abc import ABC, abstractmethod
+from csv import DictWriter
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from scrape.journal import Journal
+from scrape.metrics import Metrics
+from scrape.util import (
+    ANNOTATIONS_FILENAME,
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_FLUSH_INTERVAL,
+    OUTPUT_FILENAMES,
+    POSTS_FILENAME,
+    PUBLICATIONS_FILENAME,
+    TMP_SUFFIX,
+    Annotation,
+    Post,
+    Publication,
+    stringify,
+    tmp_path,
+)
+
+logger = logging.getLogger(__name__)
+
+# Size of the write buffer of each output file, holding a batch or more
+BUFFER_SIZE = 1 << 20
+
+
+def finish_replace(out_dir: Path, journal_path: Path, resume: bool = False):
+    """Complete the replacement of the output files in :param out_dir: by
+    an overwriting run interrupted while renaming its files. The files of an
+    overwriting run interrupted before are kept to be continued if
+    :param resume:, see :class:`Journal`, and discarded otherwise."""
+    tmp_journal = tmp_path(journal_path)
+    tmp_outputs = [tmp_path(out_dir / name) for name in OUTPUT_FILENAMES]
+    if tmp_journal.exists() and Journal.is_sealed(tmp_journal):
+        logger.warning(f"Completing the replacement of files in {out_dir}")
+        for path in tmp_outputs:
+            if path.exists():
+                os.replace(path, out_dir / path.name[: -len(TMP_SUFFIX)])
+        os.replace(tmp_journal, journal_path)
+    elif resume and tmp_journal.exists():
+        logger.warning(f"Resuming the interrupted replacement in {out_dir}")
+    else:
+        for path in tmp_outputs + [tmp_journal]:
+            if path.exists():
+                logger.warning(f"Discarding {path} of an interrupted run")
+                path.unlink()
+
+
+class BatchWriter(ABC):
+    """Writes entries with group commits.
+
+    Entries are committed to the :attr:`journal` together once
+    :attr:`batch_size` entries are written or :attr:`flush_interval`
+    seconds have passed since the last commit. Subclasses write the entries
+    in :meth:`write_entry`, and make them durable in :meth:`flush`.
+    Writes and commits are measured in the "write" stage of :param metrics:.
+    """
+
+    batch_size: int
+    flush_interval: float
+
+    def __init__(
+        self,
+        journal: Optional[Journal] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        metrics: Optional[Metrics] = None,
+    ):
+        self.journal = journal
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.batch: List[str] = []
+        self.newest: Optional[date] = None
+        self.committed_at = time.monotonic()
+        self.stage = (metrics or Metrics()).stage("write")
+
+    @abstractmethod
+    def write_entry(
+        self,
+        post: Post,
+        annotation: Annotation,
+        publications: List[Publication],
+    ):
+        """Write an entry, made durable by the next :meth:`flush`."""
+
+    @abstractmethod
+    def flush(self) -> Dict[str, int]:
+        """Make the entries written durable, return the sizes of the output
+        files (by name) to record in the journal."""
+
+    def key(
+        self,
+        post: Post,
+        annotation: Annotation,
+        publications: List[Publication],
+    ) -> Tuple[str, Optional[date]]:
+        """Id of an entry recorded in the journal, and its date if any."""
+        return post.id, post.date
+
+    def add(self, *entry):
+        """Write the :param entry: (see :meth:`write_entry`), committing the
+        batch if full or due."""
+        with self.stage.measure():
+            self.write_entry(*entry)
+            id_, date_ = self.key(*entry)
+            self.batch.append(id_)
+            if date_ is not None and (
+                self.newest is None or self.newest < date_
+            ):
+                self.newest = date_
+            if (
+                len(self.batch) >= self.batch_size
+                or time.monotonic() - self.committed_at >= self.flush_interval
+            ):
+                self.commit()
+
+    def fail(self, id_: str, reason: str):
+        if self.journal is not None:
+            self.journal.fail(id_, reason)
+
+    def commit(self):
+        """Write the batch to disk, and record it in the journal."""
+        sizes = self.flush()
+        if self.journal is not None:
+            self.journal.commit(self.batch, sizes, self.newest)
+        self.batch = []
+        self.newest = None
+        self.committed_at = time.monotonic()
+
+    def close(self, commit: bool = True, replace: bool = True):
+        """Close the writer, committing the last batch if :param commit:,
+        that is if no entry was partially written. :param replace: is
+        False if the entries written are incomplete."""
+        if commit:
+            self.commit()
+
+
+class OutputWriter(BatchWriter):
+    """Writes entries to the CSV output files with group commits.
+
+    Rows are buffered until committed. When overwriting, rows are written
+    to temporary files, which replace the output files once all entries are
+    written; the temporary files of an interrupted run are continued if the
+    fresh :param journal: resumes it.
+    """
+
+    def __init__(
+        self,
+        out_dir: Path,
+        overwrite: bool,
+        journal: Optional[Journal] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        metrics: Optional[Metrics] = None,
+    ):
+        super().__init__(journal, batch_size, flush_interval, metrics)
+        self.out_dir = out_dir
+        self.overwrite = overwrite
+        # Continuing the temporary files of an interrupted overwriting run
+        resumed = (
+            overwrite and journal is not None and journal.sizes is not None
+        )
+        if journal is not None and (resumed or not overwrite):
+            journal.recover(out_dir)
+
+        def open_output(name: str):
+            path = out_dir / name
+            return open(
+                tmp_path(path) if overwrite else path,
+                "w" if overwrite and not resumed else "a",
+                encoding="utf-8",
+                buffering=BUFFER_SIZE,
+            )
+
+        self.posts_file = open_output(POSTS_FILENAME)
+        self.annotations_file = open_output(ANNOTATIONS_FILENAME)
+        self.publications_file = open_output(PUBLICATIONS_FILENAME)
+        self.posts_writer = DictWriter(self.posts_file, Post._fields)
+        self.annotations_writer = DictWriter(
+            self.annotations_file, Annotation._fields
+        )
+        self.publications_writer = DictWriter(
+            self.publications_file, Publication._fields
+        )
+        if overwrite and not resumed:
+            self.posts_writer.writeheader()
+            self.annotations_writer.writeheader()
+            self.publications_writer.writeheader()
+        # Sizes of the output files at the last flush, by name
+        self.sizes: Dict[str, int] = {
+            Path(f.name).name: os.fstat(f.fileno()).st_size for f in self.files
+        }
+
+    @property
+    def files(self):
+        return self.posts_file, self.annotations_file, self.publications_file
+
+    def write_entry(
+        self,
+        post: Post,
+        annotation: Annotation,
+        publications: List[Publication],
+    ):
+        for publication in publications:
+            self.publications_writer.writerow(stringify(publication._asdict()))
+        self.annotations_writer.writerow(stringify(annotation._asdict()))
+        self.posts_writer.writerow(stringify(post._asdict()))
+
+    def flush(self) -> Dict[str, int]:
+        sizes = {}
+        for file in self.files:
+            file.flush()
+            if self.journal is not None:
+                os.fsync(file.fileno())
+            name = Path(file.name).name
+            sizes[name] = os.fstat(file.fileno()).st_size
+            self.stage.add_bytes(sizes[name] - self.sizes[name])
+        self.sizes = sizes
+        if self.overwrite:
+            return {name[: -len(TMP_SUFFIX)]: s for name, s in sizes.items()}
+        return sizes
+
+    def close(self, commit: bool = True, replace: bool = True):
+        """When overwriting, the output files are replaced by the files
+        written only if :param replace:."""
+        super().close(commit, replace)
+        for file in self.files:
+            file.close()
+        if self.overwrite and replace:
+            if self.journal is not None:
+                self.journal.seal()
+            for file in self.files:
+                path = Path(file.name)
+                os.replace(path, path.with_name(path.name[: -len(TMP_SUFFIX)]))
+            if self.journal is not None:
+                self.journal.publish()
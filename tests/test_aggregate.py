@@ -0,0 +1,68 @@
+import pandas as pd
+import pytest
+
+from analysis.aggregate import aggregate, data_version, load, save
+
+
+def test_aggregate(tmp_path):
+    path = tmp_path / "posts.csv"
+    path.write_text(
+        "date,id,title,countries,keywords,languages,outlets\n"
+        "2021-03-02,c,C,Russia+Germany,,Russian+German,\n"
+        "2021-03-02,b,B,Russia,,Russian,\n"
+        "2021-01-05,a,A,,,,\n"
+    )
+    aggregates = aggregate(path)
+    assert aggregates.version == data_version(path)
+
+    # One row per language and country of each entry
+    entries = aggregates.entries
+    assert list(entries.columns) == [
+        "date",
+        "id",
+        "title",
+        "country",
+        "language",
+    ]
+    assert len(entries) == 4 + 1 + 1
+    assert entries.loc["2021-01-05", "country"] == ""
+    assert entries.loc["2021-03-02", "language"].tolist() == [
+        "Russian",
+        "Russian",
+        "German",
+        "German",
+        "Russian",
+    ]
+
+    date_language = aggregates.date_language
+    assert list(date_language.columns) == ["Other", "German", "Russian"]
+    assert date_language.loc["2021-03-02"].tolist() == [0, 2, 3]
+    assert date_language.loc["2021-01-05"].tolist() == [1, 0, 0]
+
+    counts = aggregates.counts_by_date
+    assert list(counts.columns) == ["country", "count", "month"]
+    assert counts["count"].sum() == len(entries)
+    # A count of 0 for each country and month (month ends in the range, so
+    # not the last month), months without entries too
+    zeros = counts[counts["count"] == 0]
+    assert len(zeros) == 2 * 3
+    assert set(zeros["month"]) == {"2021-01", "2021-02"}
+    assert counts["month"].is_monotonic_increasing
+
+    save(aggregates, tmp_path / "aggregates.npz")
+    loaded = load(tmp_path / "aggregates.npz", aggregates.version)
+    assert loaded.version == aggregates.version
+    pd.testing.assert_frame_equal(
+        loaded.date_language, date_language, check_index_type=False
+    )
+    pd.testing.assert_frame_equal(
+        loaded.counts_by_date.reset_index(drop=True),
+        counts.reset_index(drop=True),
+        check_dtype=False,
+    )
+    pd.testing.assert_frame_equal(
+        loaded.entries, entries, check_dtype=False, check_index_type=False
+    )
+
+    with pytest.raises(ValueError):
+        load(tmp_path / "aggregates.npz", "other")
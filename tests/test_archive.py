@@ -0,0 +1,47 @@
+import threading
+
+import requests
+
+from scrape.archive import HtmlArchive
+from scrape.cache import LinkCache
+from scrape.fetch import Fetcher
+from scrape.links import LinkResolver
+from scrape.mock import MockServer
+from scrape.scraping import all_rows, extract, from_archive, write
+from scrape.util import OUTPUT_FILENAMES
+
+
+def test_rebuild_from_archive(tmp_path):
+    server = MockServer(entries=30, links=3)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    archive_path = tmp_path / "pages.archive"
+    cache_path = tmp_path / "links.sqlite"
+    scraped, rebuilt = tmp_path / "scraped", tmp_path / "rebuilt"
+    scraped.mkdir()
+    rebuilt.mkdir()
+    try:
+        with HtmlArchive(archive_path) as archive, LinkCache(
+            cache_path
+        ) as cache, requests.Session() as session, Fetcher(
+            session, 8, archive, 2, rate=0
+        ) as fetcher:
+            entries = extract(
+                fetcher,
+                all_rows(fetcher, url=server.listing_url),
+                (),
+                progress_rows=lambda rows: rows,
+                progress_reports=lambda reports: reports,
+                resolver=LinkResolver(fetcher, cache=cache),
+            )
+            write(scraped, True, None, entries)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # Offline, the server is down
+    with LinkCache(cache_path) as cache:
+        entries = from_archive(archive_path, cache, 2, url=server.listing_url)
+        write(rebuilt, True, None, entries)
+    for name in OUTPUT_FILENAMES:
+        assert (rebuilt / name).read_text() == (scraped / name).read_text()
+    assert len((rebuilt / OUTPUT_FILENAMES[0]).read_text().splitlines()) > 30
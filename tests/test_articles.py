@@ -0,0 +1,59 @@
+import csv
+
+from scrape.articles import ArticleWriter, Target, read_targets, social_links
+from scrape.journal import Journal
+from scrape.util import ARTICLES_FILENAME, PUBLICATIONS_FILENAME, Article
+
+
+def test_social_links():
+    html = (
+        '<html><head><meta name="twitter:site" content="@outlet">'
+        "</head><body>"
+        '<a href="https://twitter.com/intent/tweet?url=x">Share</a>'
+        '<a href="https://www.facebook.com/sharer.php?u=x">Share</a>'
+        '<a href="https://www.facebook.com/outlet.news/">Facebook</a>'
+        '<a href="https://twitter.com/other">Twitter</a>'
+        "</body></html>"
+    )
+    assert social_links(html) == (
+        "https://twitter.com/outlet",
+        "https://www.facebook.com/outlet.news",
+    )
+    assert social_links("<p>No profiles</p>") == ("", "")
+
+
+def test_read_targets(tmp_path):
+    (tmp_path / PUBLICATIONS_FILENAME).write_text(
+        "id,publication,archive\n"
+        "a,https://x.org/1,\n"
+        "b,https://x.org/1,\n"
+        "b,not a link,\n"
+        "c,http://y.org/2,\n"
+    )
+    assert read_targets(tmp_path) == [
+        Target("https://x.org/1", ["a", "b"]),
+        Target("http://y.org/2", ["c"]),
+    ]
+
+
+def test_writer_resumes(tmp_path):
+    path = tmp_path / ARTICLES_FILENAME
+    target = Target("https://x.org/1", ["a", "b"])
+    articles = [
+        Article(target.id, "T", "2021-02-18", "en", "", "", "", id_)
+        for id_ in target.report_ids
+    ]
+    with Journal(tmp_path / "journal.jsonl") as journal:
+        writer = ArticleWriter(path, journal, batch_size=1)
+        writer.add(target, articles)
+        writer.close()
+    # Rows written after the last commit are discarded when resuming
+    with open(path, "a") as file:
+        file.write("https://y.org/2,partial")
+    with Journal(tmp_path / "journal.jsonl") as journal:
+        assert journal.ignored_ids() == {target.id}
+        ArticleWriter(path, journal).close()
+    with open(path, newline="") as file:
+        rows = list(csv.DictReader(file))
+    assert [row["id"] for row in rows] == ["a", "b"]
+    assert rows[0]["title"] == "T"
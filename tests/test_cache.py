@@ -0,0 +1,41 @@
+from scrape.cache import LinkCache
+
+DAY = 24 * 3600
+
+
+def test_ttl_and_prune(tmp_path):
+    path = tmp_path / "links.sqlite"
+    with LinkCache(path) as cache:
+        cache.put("http://a", "http://final/a")  # ok, kept 30 days
+        cache.put("http://b", "404")  # status, kept 1 day
+        cache.put("http://c", "ConnectionError")  # error, kept 6 hours
+        cache.put("http://d", "http://final/d")
+        cache.connection.execute(
+            "UPDATE links SET resolved_at = resolved_at - ? WHERE url = ?",
+            (31 * DAY, "http://d"),
+        )
+        cache.connection.execute(
+            "UPDATE links SET resolved_at = resolved_at - ? WHERE url != ?",
+            (2 * DAY, "http://d"),
+        )
+        assert cache.get("http://a") == "http://final/a"
+        assert cache.get("http://b") is None
+        assert cache.get("http://c") is None
+        assert cache.get("http://d") is None
+        assert cache.get("http://b", expire=False) == "404"
+        assert (cache.hits, cache.misses) == (2, 3)
+
+    with LinkCache(path, ttl={"status": 3 * DAY}) as cache:
+        assert cache.get("http://b") == "404"
+
+    # Bypassed for lookups, still updated
+    with LinkCache(path, read=False) as cache:
+        assert cache.get("http://a") is None
+        cache.put("http://e", "http://final/e")
+
+    with LinkCache(path) as cache:
+        assert cache.get("http://e") == "http://final/e"
+        assert cache.prune() == 3
+        assert cache.get("http://a") == "http://final/a"
+        for url in ("http://b", "http://c", "http://d"):
+            assert cache.get(url, expire=False) is None
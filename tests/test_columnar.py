@@ -0,0 +1,33 @@
+import json
+from datetime import date
+
+import pytest
+
+from scrape.util import PARQUET_SCHEMA_FILENAME
+
+pytest.importorskip("pyarrow")
+
+from scrape.columnar import convert, read_table  # noqa: E402
+
+POSTS = """date,id,title,countries,keywords,languages,outlets
+2021-02-17,https://euvsdisinfo.eu/report/a/,A,Ukraine+EU,,Russian,TASS+RT
+2021-02-18,https://euvsdisinfo.eu/report/b/,B,Ukraine,ECHR,,
+"""
+
+
+def test_convert(tmp_path):
+    (tmp_path / "posts.csv").write_text(POSTS, encoding="utf-8")
+    convert(tmp_path)
+
+    posts = read_table(tmp_path, "posts", ["date", "countries", "outlets"])
+    assert list(posts.columns) == ["date", "countries", "outlets"]
+    assert posts.date[0] == date(2021, 2, 17)
+    assert list(posts.countries[0]) == ["Ukraine", "EU"]
+    assert list(posts.outlets[1]) == []
+
+    with open(tmp_path / PARQUET_SCHEMA_FILENAME) as file:
+        descriptor = json.load(file)
+    posts_resource = descriptor["resources"][0]
+    assert posts_resource["path"] == "posts.parquet"
+    fields = {f["name"]: f["type"] for f in posts_resource["schema"]["fields"]}
+    assert fields["keywords"] == "array" and fields["title"] == "string"
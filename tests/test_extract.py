@@ -0,0 +1,95 @@
+import asyncio
+import threading
+
+import pytest
+import requests
+
+from scrape.fetch import Fetcher
+from scrape.mock import MockServer
+from scrape.scraping import Failed, all_rows, extract_async, run_stage
+
+
+@pytest.fixture
+def server():
+    server = MockServer(entries=40, links=2, latency=0.005, jitter=0.005)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def fetcher():
+    with requests.Session() as session, Fetcher(
+        session, concurrency=8, parse_workers=2, rate=0
+    ) as fetcher:
+        yield fetcher
+
+
+def listed(fetcher, server):
+    async def collect():
+        return [row async for row in all_rows(fetcher, url=server.listing_url)]
+
+    return fetcher.run(collect())
+
+
+async def iterate(items):
+    for item in items:
+        yield item
+
+
+def test_order(server, fetcher):
+    rows = listed(fetcher, server)
+    assert [row.id for row in rows] == [
+        f"{server.url}/report/{i}/" for i in range(40)
+    ]
+    results = list(fetcher.iterate(extract_async(fetcher, iterate(rows), ())))
+    assert [row.id for row, _ in results] == [row.id for row in rows]
+    assert all(report.summary_links_resolved for _, report in results)
+
+
+def test_failed(server, fetcher):
+    rows = listed(fetcher, server)
+    server.entries = 30  # the last reports are not found
+    results = list(fetcher.iterate(extract_async(fetcher, iterate(rows), ())))
+    assert [o.id if isinstance(o, Failed) else o[0].id for o in results] == [
+        row.id for row in rows
+    ]
+    failed = [o for o in results if isinstance(o, Failed)]
+    assert len(failed) == 10 and "HTTPError" in failed[0].reason
+
+
+def test_run_stage_raising():
+    async def func(row):
+        if row.id == "b":
+            raise ValueError("b")
+        return row.id
+
+    async def stage():
+        source, sink, failures = (asyncio.Queue() for _ in range(3))
+        for id_ in ("a", "b", "c", None):
+            await source.put(None if id_ is None else (Failed(id_, ""),))
+        await run_stage(func, source, sink, failures, 2)
+        return sink, failures
+
+    sink, failures = asyncio.run(asyncio.wait_for(stage(), 5))
+    assert sorted(sink.get_nowait() for _ in range(2)) == ["a", "c"]
+    assert sink.get_nowait() is None
+    assert failures.get_nowait() == Failed("b", "ValueError('b')")
+
+
+def test_close_early(server):
+    with requests.Session() as session, Fetcher(
+        session, concurrency=8, parse_workers=2, rate=0
+    ) as fetcher:
+        rows = all_rows(fetcher, url=server.listing_url)
+        gen = fetcher.iterate(extract_async(fetcher, rows, ()))
+        next(gen)
+        gen.close()
+        pending = [
+            task for task in asyncio.all_tasks(fetcher.loop) if not task.done()
+        ]
+    assert pending == []
+    assert fetcher.loop.is_closed()
+    assert fetcher.executor._shutdown
+    assert fetcher.parse_executor._shutdown_thread
@@ -0,0 +1,27 @@
+import argparse
+from datetime import date
+
+import pytest
+
+from scrape.scraping import project
+from scrape.util import Annotation, Post, Publication, check_fields
+
+
+def test_check_fields():
+    assert check_fields("outlets, title") == ("date", "id", "title", "outlets")
+    with pytest.raises(argparse.ArgumentTypeError):
+        check_fields("title,link")
+
+
+def test_project():
+    entry = (
+        Post(date(2021, 2, 18), "x", "X", ["EU"], ["k"], ["en"], ["RT"]),
+        Annotation("x", "summary", "disproof", ["a"], ["a"], [], []),
+        [Publication("x", "x/1", "x/2")],
+    )
+    post, annotation, publications = project(entry, check_fields("keywords"))
+    assert post == Post(date(2021, 2, 18), "x", "", [], ["k"], [], [])
+    assert annotation == Annotation("x", "", "", [], [], [], [])
+    assert publications == []
+    _, _, publications = project(entry, check_fields("archive"))
+    assert publications == [Publication("x", "", "x/2")]
@@ -0,0 +1,90 @@
+import time
+from datetime import date
+
+from scrape.journal import Journal
+from scrape.scraping import read_entries
+from scrape.util import RETRY_FAILED_AFTER, Annotation, Post, Publication
+from scrape.writer import OutputWriter, finish_replace
+
+
+def entry(id_):
+    return (
+        Post(date(2021, 2, 17), id_, id_, [], [], [], []),
+        Annotation(id_, "", "", [], [], [], []),
+        [Publication(id_, f"{id_}/pub", "")],
+    )
+
+
+def test_recover_and_retry(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    output = tmp_path / "posts.csv"
+    output.write_text("header\n")
+    with Journal(path) as journal:
+        journal.commit(["a", "b"], {"posts.csv": len("header\n")})
+        journal.fail("c", "HTTPError()")
+    with open(output, "a") as file:
+        file.write("partial")  # interrupted batch
+
+    with Journal(path) as journal:
+        assert journal.done == {"a", "b"}
+        assert journal.ignored_ids() == {"a", "b", "c"}
+        assert journal.is_due("c", time.time() + RETRY_FAILED_AFTER)
+        journal.recover(tmp_path)
+        assert output.read_text() == "header\n"
+        journal.fail("c", "HTTPError()")
+
+    with Journal(path) as journal:
+        assert journal.failed["c"][0] == 2
+        assert not journal.is_due("c", time.time() + RETRY_FAILED_AFTER)
+
+    with Journal(path, fresh=True) as journal:
+        assert journal.done == set() and journal.sizes is None
+        journal.commit(["d"], {"posts.csv": 0})
+        journal.seal()
+        journal.publish()
+    with Journal(path) as journal:
+        assert journal.done == {"d"}
+
+
+def test_resume_fresh(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    with Journal(path, fresh=True) as journal:
+        writer = OutputWriter(tmp_path, True, journal, batch_size=1)
+        writer.add(*entry("a"))
+        writer.posts_file.write("partial")  # interrupted batch
+        writer.close(commit=False, replace=False)
+
+    finish_replace(tmp_path, path, resume=True)
+    with Journal(path, fresh=True, resume=True) as journal:
+        assert journal.done == {"a"}
+        writer = OutputWriter(tmp_path, True, journal)
+        writer.add(*entry("b"))
+        writer.close()
+    assert [e[0].id for e in read_entries(tmp_path)] == ["a", "b"]
+    with Journal(path) as journal:
+        assert journal.done == {"a", "b"}
+
+    with Journal(path, fresh=True) as journal:
+        writer = OutputWriter(tmp_path, True, journal)
+        writer.add(*entry("c"))
+        writer.close(replace=False)
+    finish_replace(tmp_path, path)  # not resumed, discarded
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_restart(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    with Journal(path) as journal:
+        journal.commit(["a"], {})
+        journal.fail("b", "HTTPError()")
+        journal.fail("b", "HTTPError()")
+        journal.restart()
+        assert journal.done == set() and journal.failed["b"][0] == 2
+        writer = OutputWriter(tmp_path, True, journal)
+        writer.add(*entry("c"))
+        writer.close()
+        journal.fail("d", "HTTPError()")  # appended to the new journal
+
+    with Journal(path) as journal:
+        assert journal.done == {"c"}
+        assert journal.failed["b"][0] == 2 and "d" in journal.failed
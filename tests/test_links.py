@@ -0,0 +1,60 @@
+import asyncio
+import random
+import threading
+import time
+from collections import Counter
+
+import requests
+
+from scrape.fetch import Fetcher
+from scrape.links import LinkResolver
+from scrape.report import Report
+
+
+def report(id_, summary, disproof):
+    report = Report.empty(id_)
+    report.summary_hrefs = summary
+    report.disproof_hrefs = disproof
+    return report
+
+
+def resolved(links):
+    return [
+        Report.url_encode(link.replace("short", "final")) for link in links
+    ]
+
+
+def test_resolve_once_in_order(monkeypatch):
+    calls = Counter()
+    lock = threading.Lock()
+
+    def resolve_link(session, url):
+        with lock:
+            calls[url] += 1
+        time.sleep(random.uniform(0, 0.01))  # complete out of order
+        return url.replace("short", "final")
+
+    monkeypatch.setattr(Report, "resolve_link", staticmethod(resolve_link))
+    links = [f"http://short{i % 3}/{i}" for i in range(12)]
+    reports = [
+        report("a", links[:6], links[6:]),
+        report("b", links[::-1], ["http://short0/0"]),
+        report("c", [], links[3:9]),
+    ]
+    with requests.Session() as session, Fetcher(
+        session, concurrency=8, parse_workers=0, rate=0
+    ) as fetcher:
+        resolver = LinkResolver(fetcher, per_host=2)
+
+        async def resolve():
+            # One report at a time, concurrently, as extract_async does
+            await asyncio.gather(
+                *(resolver.resolve_reports([r]) for r in reports)
+            )
+
+        fetcher.run(resolve())
+    assert calls == Counter(links)  # each distinct link once
+    assert resolver.requested == 30 and resolver.resolved == 12
+    for r in reports:
+        assert r.summary_links_resolved == resolved(r.summary_hrefs)
+        assert r.disproof_links_resolved == resolved(r.disproof_hrefs)
@@ -0,0 +1,107 @@
+import asyncio
+import threading
+from datetime import date
+
+import pytest
+import requests
+
+from scrape import scraping
+from scrape.fetch import Fetcher
+from scrape.mock import MockServer
+from scrape.parsers import Listing
+from scrape.report import MalformedDataError, Row
+from scrape.scraping import in_shard, seen_before
+
+
+def test_all_rows_without_total(monkeypatch):
+    entries = list(range(25))
+
+    async def get_listing(fetcher, parser, offset, per_page, url):
+        # Page size capped at 10, number of entries not shown
+        rows = entries[offset : offset + min(per_page, 10)]
+        return Listing(None, len(rows), rows)
+
+    async def collect():
+        return [row async for row in scraping.all_rows(None)]
+
+    monkeypatch.setattr(scraping, "get_listing", get_listing)
+    assert asyncio.run(collect()) == entries
+
+
+def test_listing_error():
+    server = MockServer(entries=25, error_rate=1.0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    async def collect(fetcher):
+        return [row async for row in scraping.all_rows(fetcher, url=url)]
+
+    url = server.listing_url
+    try:
+        with requests.Session() as session, Fetcher(
+            session, parse_workers=0
+        ) as fetcher:
+            fetcher.retries = 0
+            with pytest.raises(requests.HTTPError):
+                fetcher.run(collect(fetcher))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_empty_listing(monkeypatch):
+    async def get_listing(fetcher, parser, offset, per_page, url):
+        return Listing(0, 0, [])
+
+    async def collect():
+        return [row async for row in scraping.all_rows(None)]
+
+    monkeypatch.setattr(scraping, "get_listing", get_listing)
+    with pytest.raises(MalformedDataError):
+        asyncio.run(collect())
+
+
+def row(id_, day):
+    row = Row.__new__(Row)
+    row.id, row.date = id_, date(2021, 2, day)
+    return row
+
+
+def page(*rows):
+    return Listing(None, len(rows), list(rows))
+
+
+def test_seen_before():
+    stop = seen_before({"a", "b", "c"}, date(2021, 2, 10))
+    assert stop(page(row("a", 12), row("b", 11)))  # all known
+    assert not stop(page(row("x", 12), row("a", 11)))  # a new entry
+    assert stop(page(row("x", 9), row("y", 8)))  # older than the newest
+    assert not stop(page())
+
+    # Only the rows of the shard count
+    ids = [f"http://r/{i}" for i in range(20)]
+    theirs = [id_ for id_ in ids if not in_shard(id_, (0, 2))]
+    ours = [id_ for id_ in ids if in_shard(id_, (0, 2))]
+    assert theirs and ours
+    stop = seen_before(set(ours), None, shard=(0, 2))
+    assert stop(page(*(row(id_, 12) for id_ in ids)))
+    stop = seen_before(set(theirs), None, shard=(0, 2))
+    assert not stop(page(*(row(id_, 12) for id_ in ids)))
+
+
+def test_incremental_requests(monkeypatch):
+    entries = [row(f"http://r/{i}", 12) for i in range(100)]
+    offsets = []
+
+    async def get_listing(fetcher, parser, offset, per_page, url):
+        offsets.append(offset)
+        rows = entries[offset : offset + min(per_page, 10)]
+        return Listing(len(entries), len(rows), rows)
+
+    async def collect(stop):
+        return [row async for row in scraping.all_rows(None, stop=stop)]
+
+    monkeypatch.setattr(scraping, "get_listing", get_listing)
+    known = {row.id for row in entries[15:]}
+    rows = asyncio.run(collect(seen_before(known, None)))
+    # Stops at the third page, the first one of known entries only
+    assert len(rows) == 30 and offsets == [0, 10, 20]
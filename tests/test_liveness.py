@@ -0,0 +1,68 @@
+import asyncio
+import time
+
+import pytest
+import requests
+
+from scrape import liveness
+from scrape.cache import LivenessTable
+from scrape.fetch import Fetcher
+from scrape.liveness import check_async, read_links, stale_links
+from scrape.util import PUBLICATIONS_FILENAME
+
+
+def test_read_links(tmp_path):
+    path = tmp_path / PUBLICATIONS_FILENAME
+    path.write_text(
+        "id,publication,archive\n"
+        "a,https://x.org/1,https://archive.org/x.org/1\n"
+        "b,https://x.org/1,\n"
+        "c,not a link,http://y.org/2\n"
+    )
+    assert list(read_links(path)) == [
+        "https://x.org/1",
+        "https://archive.org/x.org/1",
+        "http://y.org/2",
+    ]
+
+
+def test_stale_links(tmp_path):
+    with LivenessTable(tmp_path / "liveness.sqlite") as table:
+        table.put("https://x.org/1", "200", "https://x.org/1/")
+        table.put("https://x.org/2", "404", "https://x.org/2")
+        status = table.get("https://x.org/1")
+        assert status[:2] == ("200", "https://x.org/1/")
+        assert table.counts() == {"200": 1, "404": 1}
+        checked = table.checked()
+    checked["https://x.org/2"] = time.time() - 10
+    urls = ["https://x.org/1", "https://x.org/2", "https://x.org/3"]
+    assert list(stale_links(urls, checked, 5)) == urls[1:]
+    assert list(stale_links(urls, checked, 0)) == urls
+
+
+def test_check_raising(monkeypatch):
+    def check_link(session, url):
+        if url.endswith("/3"):
+            raise ValueError(url)
+        time.sleep(0.01)
+        return "200", url
+
+    async def collect(fetcher, urls):
+        return [o async for o in check_async(fetcher, urls, max_pending=4)]
+
+    monkeypatch.setattr(liveness, "check_link", check_link)
+    urls = [f"https://x.org/{i}" for i in range(10)]
+    with requests.Session() as session, Fetcher(
+        session, parse_workers=0, rate=0
+    ) as fetcher:
+        # Raised by the consumer, rather than waiting forever for the end
+        with pytest.raises(ValueError):
+            fetcher.run(asyncio.wait_for(collect(fetcher, urls), 10))
+        assert len(fetcher.run(collect(fetcher, urls[:3]))) == 3
+
+        def failing_urls():
+            yield from urls[:3]
+            raise OSError("cannot read the links")
+
+        with pytest.raises(OSError):
+            fetcher.run(asyncio.wait_for(collect(fetcher, failing_urls()), 10))
@@ -0,0 +1,34 @@
+from datetime import date
+
+from scrape.merge import merge
+from scrape.scraping import in_shard, write
+from scrape.util import Annotation, Post, Publication
+
+
+def entry(id_, day):
+    return (
+        Post(date(2021, 2, day), id_, id_.upper(), ["EU"], [], [], ["RT"]),
+        Annotation(id_, "summary", "disproof", ["a", "b"], [], [], []),
+        [Publication(id_, f"{id_}/1", ""), Publication(id_, f"{id_}/2", "")],
+    )
+
+
+def test_shards_and_merge(tmp_path):
+    ids = [f"https://euvsdisinfo.eu/report/{i}/" for i in range(100)]
+    shards = [[id_ for id_ in ids if in_shard(id_, (i, 3))] for i in range(3)]
+    assert sorted(sum(shards, [])) == sorted(ids)
+    assert all(len(shard) > 0 for shard in shards)
+
+    for name, entries in {
+        "a": [entry("x", 18), entry("z", 16)],
+        "b": [entry("y", 17), entry("x", 18)],  # duplicate entry
+    }.items():
+        (tmp_path / name).mkdir()
+        write(tmp_path / name, True, None, iter(entries))
+
+    merged = merge([tmp_path / "a", tmp_path / "b"])
+    assert [post.id for post, _, _ in merged] == ["x", "y", "z"]
+    post, annotation, publications = merged[0]
+    assert post == entry("x", 18)[0]
+    assert annotation.summary_links == ["a", "b"]
+    assert [p.publication for p in publications] == ["x/1", "x/2"]
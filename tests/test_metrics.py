@@ -0,0 +1,34 @@
+import json
+
+import pytest
+
+from scrape.metrics import Metrics
+
+
+def test_stage_metrics(tmp_path):
+    metrics = Metrics()
+    stage = metrics.stage("fetch")
+    for seconds in [0.01] * 98 + [1.0, 2.0]:
+        stage.observe(seconds)
+    with pytest.raises(ValueError):
+        with stage.measure():
+            raise ValueError
+    stage.error("HTTP 404")
+
+    assert stage.count == 101
+    assert 0.009 < stage.percentile(50) <= 0.0113
+    assert 1.0 <= stage.percentile(99) <= 2.0
+    assert stage.errors == {"ValueError": 1, "HTTP 404": 1}
+
+    metrics.write(tmp_path / "metrics.json")
+    with open(tmp_path / "metrics.json") as file:
+        fetch = json.load(file)["stages"]["fetch"]
+    assert fetch["count"] == 101 and sum(fetch["buckets"].values()) == 101
+
+    metrics.write(tmp_path / "metrics.prom")
+    lines = (tmp_path / "metrics.prom").read_text().splitlines()
+    assert 'scrape_stage_items_total{stage="fetch"} 101' in lines
+    assert 'scrape_stage_seconds_bucket{stage="fetch",le="+Inf"} 101' in lines
+    assert (
+        'scrape_stage_errors_total{stage="fetch",type="HTTP 404"} 1' in lines
+    )
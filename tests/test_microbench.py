@@ -0,0 +1,60 @@
+from pathlib import Path
+
+from scrape.microbench import cases, measure, regressions, summary
+from scrape.parsers import PARSERS
+
+FIXTURES_DIR = Path(__file__).absolute().parent / "fixtures"
+
+
+def test_cases():
+    names = [case.name for case in cases(PARSERS["html.parser"], FIXTURES_DIR)]
+    assert names[:3] == ["listing", "Row.__init__", "Row.get_strings_for_col"]
+    assert "Report.__init__[report-three-links]" in names
+    assert "translate[report-missing-summary]" in names
+
+
+def test_measure():
+    case = cases(PARSERS["html.parser"], FIXTURES_DIR)[1]
+    result = measure(case, min_time=0.001, repeat=2)
+    assert result["ns_per_op"] > 0
+    assert result["allocations"] > 0
+    assert result["peak_kb"] >= result["retained_kb"] > 0
+
+
+def test_regressions():
+    baseline = {
+        "a": {
+            "ns_per_op": 100.0,
+            "allocations": 5,
+            "peak_kb": 1.0,
+            "retained_kb": 0.0,
+        },
+        "b": {
+            "ns_per_op": 100.0,
+            "allocations": 5,
+            "peak_kb": 1.0,
+            "retained_kb": 0.0,
+        },
+    }
+    results = {
+        "a": {
+            "ns_per_op": 105.0,
+            "allocations": 5,
+            "peak_kb": 1.0,
+            "retained_kb": 0.0,
+        },
+        "b": {
+            "ns_per_op": 100.0,
+            "allocations": 5,
+            "peak_kb": 2.0,
+            "retained_kb": 0.0,
+        },
+        "c": {
+            "ns_per_op": 900.0,
+            "allocations": 5,
+            "peak_kb": 9.0,
+            "retained_kb": 0.0,
+        },
+    }
+    assert regressions(results, baseline, tolerance=0.1) == ["b"]
+    assert "+5.0%" in summary(results, baseline)
@@ -0,0 +1,98 @@
+from pathlib import Path
+
+import pytest
+
+from scrape import mock
+from scrape.parsers import PARSERS, Parser, parse_changed
+from scrape.scraping import translate
+
+FIXTURES_DIR = Path(__file__).absolute().parent / "fixtures"
+REPORTS = sorted(p.name for p in FIXTURES_DIR.glob("report*.html"))
+
+
+def read_fixture(name: str) -> str:
+    return (FIXTURES_DIR / name).read_text(encoding="utf-8")
+
+
+def parse(parser: Parser, report_name: str):
+    """Parse the listing fixture and :param report_name:, as a report of the
+    first row, with links resolved to themselves."""
+    row = parser.rows(read_fixture("listing.html"))[0]
+    report = parser.report(row.id, read_fixture(report_name))
+    report.set_resolved({link: link for link in report.links})
+    return translate(row, report)
+
+
+@pytest.fixture(params=[p for p in PARSERS if PARSERS[p].available()])
+def parser(request) -> Parser:
+    return PARSERS[request.param]
+
+
+def test_listing(parser):
+    listing = parser.listing(read_fixture("listing.html"))
+    assert listing.total == 10921
+    assert listing.size == 5
+    assert [row.id.split("/")[-2] for row in listing.rows] == [
+        "german-special-services-helped-navalny",
+        "echrs-decisions-are-not-binding-for-russia-navalny-is-mentally-ill",
+        "no-outlets",
+    ]
+    assert listing.rows[2].title == "Entry & without outlets"
+    assert listing.rows[2].outlets == []
+    assert listing.rows[2].countries == ["Ukraine", "EU"]
+
+
+def test_report(parser):
+    post, annotation, publications = parse(parser, "report.html")
+    assert post.keywords == ["Alexei Navalny", "Vladimir Putin"]
+    assert post.languages == ["Russian", "German"]
+    assert annotation.summary_links == [
+        "https%3A//example.org/navalny",
+        "https%3A//example.org/redirect%3Fto%3Da%2Bb",
+    ]
+    assert len(annotation.disproof_links) == 2
+    assert [(p.publication, p.archive) for p in publications] == [
+        ("https://tass.ru/politika/123", "https://archive.ph/abcde"),
+        ("https://tass.ru/politika/456", None),
+    ]
+
+
+def test_report_edge_cases(parser):
+    post, _, _ = parse(parser, "report-labels-outside.html")
+    assert post.keywords == ["novichok", "ECHR", "Alexei Navalny"]
+    post, annotation, _ = parse(parser, "report-missing-keywords.html")
+    assert post.keywords == []
+    assert annotation.summary_links == []
+    post, annotation, _ = parse(parser, "report-missing-summary.html")
+    assert annotation.summary == ""
+    assert len(annotation.disproof_links_resolved) == 2
+    _, _, publications = parse(parser, "report-three-links.html")
+    assert len(publications) == 1  # stops at the malformed entry
+
+
+@pytest.mark.parametrize("report_name", REPORTS)
+def test_parsers_identical(report_name):
+    expected = parse(PARSERS["html.parser"], report_name)
+    for parser in PARSERS.values():
+        if parser.available():
+            assert parse(parser, report_name) == expected
+
+
+@pytest.mark.parametrize("report_name", REPORTS)
+def test_content_hash(parser, report_name):
+    html = read_fixture(report_name)
+    hash_ = parser.report("id", html).content_hash
+    assert parser.content_hash(html) == hash_
+    assert parser.content_hash(html.replace("\n", "\n  ")) == hash_
+    assert parse_changed(parser, "id", html, hash_) == (hash_, None)
+    edited = html.replace("Navalny", "Nawalny")
+    assert edited == html or parser.content_hash(edited) != hash_
+
+
+def test_mock_pages(parser):
+    listing = parser.listing(mock.listing_page("http://mock", 25, 20, 10))
+    assert listing.total == 25 and listing.size == 5
+    row = listing.rows[0]
+    assert row.id == "http://mock/report/20/" and len(row.outlets) == 2
+    report = parser.report(row.id, mock.report_page("http://mock", 20, 4))
+    assert len(report.links) == 5 and len(report.keywords) == 2
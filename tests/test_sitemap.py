@@ -0,0 +1,77 @@
+import threading
+
+import pytest
+import requests
+
+from scrape import mock
+from scrape.fetch import Fetcher
+from scrape.sitemap import (
+    parse_lastmod,
+    parse_sitemap,
+    queued_ids,
+    sitemap_entries,
+)
+
+
+def chunks(text: str, size: int = 7):
+    data = text.encode("utf-8")
+    return (data[i : i + size] for i in range(0, len(data), size))
+
+
+def test_parse_sitemap():
+    index, sitemaps = parse_sitemap(chunks(mock.sitemap_index("http://m")))
+    assert index == []
+    assert sitemaps == [
+        "http://m/page-sitemap.xml",
+        "http://m/report-sitemap.xml",
+    ]
+    entries, sitemaps = parse_sitemap(
+        chunks(mock.report_sitemap("http://m", 25))
+    )
+    assert sitemaps == [] and len(entries) == 25
+    assert entries[0].loc == "http://m/report/0/"
+    assert entries[0].lastmod == parse_lastmod("2021-02-18T12:00:00Z")
+    assert entries[0].lastmod > entries[-1].lastmod
+
+    # Without namespace nor lastmod
+    entries, _ = parse_sitemap([b"<urlset><url><loc> a </loc></url></urlset>"])
+    assert entries == [("a", None)]
+
+
+def test_parse_lastmod():
+    assert parse_lastmod("2021-02-18") == 1613606400
+    assert parse_lastmod("2021-02-18T01:00:00+01:00") == 1613606400
+    assert parse_lastmod("yesterday") is None
+    assert parse_lastmod(None) is None
+
+
+def test_queued_ids():
+    entries = [("new", 10.0), ("edited", 10.0), ("same", 10.0), ("old", None)]
+    checked = {"edited": 5.0, "same": 20.0, "old": 5.0}
+    assert queued_ids(entries, {"edited", "same", "old"}, checked) == (
+        {"new"},
+        {"edited"},
+    )
+
+
+def test_sitemap_overload():
+    server = mock.MockServer(entries=25, error_rate=1.0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = server.url + mock.SITEMAP_PATH
+    try:
+        with requests.Session() as session, Fetcher(
+            session, parse_workers=0, rate=0
+        ) as fetcher:
+            # Retried once the host is no longer paused (Retry-After: 1)
+            threading.Timer(0.2, setattr, (server, "error_rate", 0.0)).start()
+            entries = fetcher.run(sitemap_entries(fetcher, url))
+            assert len(entries) == 25
+            assert fetcher.throttle.retries > 0
+
+            server.error_rate = 1.0
+            fetcher.retries = 0
+            with pytest.raises(requests.HTTPError):
+                fetcher.run(sitemap_entries(fetcher, url))
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,35 @@
+from datetime import date
+
+from scrape.store import Database, SqliteWriter
+from scrape.util import Annotation, Post, Publication
+
+
+def entry(id_, title, outlets):
+    return (
+        Post(date(2021, 2, 17), id_, title, ["Ukraine"], [], [], outlets),
+        Annotation(id_, "summary", "disproof", ["a"], ["b"], [], []),
+        [Publication(id_, f"{id_}/pub", "")],
+    )
+
+
+def test_upsert_and_overwrite(tmp_path):
+    path = tmp_path / "test.sqlite"
+    writer = SqliteWriter(path, overwrite=False)
+    writer.add(*entry("x", "X", ["TASS", "RT"]))
+    writer.add(*entry("y", "Y", []))
+    writer.add(*entry("x", "X2", ["RT"]))  # updated entry
+    writer.close()
+
+    with Database(path) as database:
+        entries = {post.id: post for post, _, _ in database.entries()}
+        assert entries["x"].title == "X2" and entries["x"].outlets == ["RT"]
+        assert entries["y"].outlets == []
+        assert database.newest() == date(2021, 2, 17)
+
+    writer = SqliteWriter(path, overwrite=True)
+    writer.add(*entry("y", "Y", []))
+    writer.close()
+    with Database(path) as database:
+        ((post, annotation, publications),) = list(database.entries())
+        assert post.id == "y" and annotation.summary_links == ["a"]
+        assert publications == [Publication("y", "y/pub", None)]
@@ -0,0 +1,50 @@
+from scrape.throttle import HostThrottle
+
+
+def respond(throttle: HostThrottle, latency: float, status=200, pause=None):
+    throttle.acquire()
+    throttle.release(latency, status, pause)
+
+
+def test_slow_start_then_halve():
+    throttle = HostThrottle(max_concurrency=8)
+    for _ in range(10):
+        respond(throttle, 0.1)
+    assert throttle.limit == 8  # capped
+
+    respond(throttle, 0.1, status=503, pause=0)
+    assert throttle.limit == 4
+    assert throttle.backoffs == 1
+    assert not throttle.slow_start
+
+    respond(throttle, 0.1)
+    assert 4 < throttle.limit < 5  # additive increase
+
+
+def test_rising_latency():
+    throttle = HostThrottle(max_concurrency=8)
+    for _ in range(4):
+        respond(throttle, 0.1)
+    for _ in range(10):
+        respond(throttle, 1.0)
+    assert throttle.backoffs > 0
+    assert throttle.limit < 5
+
+
+def test_pause():
+    throttle = HostThrottle(max_concurrency=8)
+    respond(throttle, 0.1, status=429, pause=30)
+    assert throttle._delay(throttle.updated) > 29
+
+
+def test_try_acquire():
+    throttle = HostThrottle(max_concurrency=8, rate=1)
+    assert throttle.try_acquire() == 0
+    woken = []
+    # Concurrency limit of 1, woken once released
+    assert throttle.try_acquire(lambda: woken.append(True)) is None
+    throttle.cancel()
+    assert woken == [True] and throttle.wakers == []
+    assert throttle.in_flight == 0
+    respond(throttle, 0.1, status=429, pause=30)
+    assert throttle.try_acquire() > 29
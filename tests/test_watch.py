@@ -0,0 +1,25 @@
+import threading
+
+import requests
+
+from scrape.mock import MockServer
+from scrape.watch import Freshness, Probe, probe
+
+
+def test_probe_and_freshness(tmp_path):
+    server = MockServer(entries=25)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        with requests.Session() as session:
+            current = probe(session, url=server.listing_url)
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert current.total == 25 and len(current.ids) == 10
+    assert current.ids[0] == f"{server.url}/report/0/"
+
+    freshness = Freshness(tmp_path / "freshness.json")
+    assert freshness.scraped is None
+    freshness.update(status="ok", total=current.total, ids=current.ids)
+    assert Freshness(tmp_path / "freshness.json").scraped == current
+    assert current != Probe(26, current.ids)